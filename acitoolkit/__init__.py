@@ -24,10 +24,10 @@ _about_exports = [
 
 from .acicounters import (  # noqa
     AtomicCounter, AtomicCountersOnGoing, AtomicNode, AtomicPath,
-    InterfaceStats,
+    CounterFamily, CounterSample, InterfaceStats, InterfaceStatsCollector,
 )
-from .aciHealthScore import HealthScore  # noqa
-from .aciFaults import (Faults)  # noqa
+from .aciHealthScore import HealthScore, HealthScoreIndex  # noqa
+from .aciFaults import Faults, FaultStore  # noqa
 from .aciSearch import AciSearch, Searchable  # noqa
 from .acisession import EventHandler, Login, Session, Subscriber  # noqa
 from .aciTable import Table  # noqa
@@ -51,7 +51,7 @@ from .aciConcreteLib import (  # noqa
     ConcreteAccCtrlRule, ConcreteArp, ConcreteBD, ConcreteContext, ConcreteEp,
     ConcreteFilter, ConcreteFilterEntry, ConcreteLoopback, ConcreteOverlay,
     ConcretePortChannel, ConcreteSVI, ConcreteVpc, ConcreteVpcIf,
-    ConcreteTunnel, ConcreteCdp
+    ConcreteTunnel, ConcreteCdp, PolicyLookup
 )
 # Dependent on aciconcretelib
 from .aciphysobject import (  # noqa
@@ -22,8 +22,8 @@
 """
 This is a library of all the Concrete classes that are on a switch.
 """
-import copy
 import re
+import threading
 from operator import itemgetter
 
 from .acibaseobject import BaseACIPhysObject
@@ -33,6 +33,64 @@ from .aciTable import Table
 from .acitoolkit import Context, EPG
 
 
+class PolicyLookup(object):
+    """
+    Holds the EPG name of every pcTag and the tenant and context of every
+    scope so that the concrete objects of all of the switches of a
+    collection can be resolved from a single download of the EPGs and
+    contexts.  The EPGs and contexts are retrieved the first time they
+    are needed.
+    """
+
+    def __init__(self, session):
+        """
+        :param session: APIC session used to retrieve the EPGs and contexts
+        """
+        self.session = session
+        self._epg_names = None
+        self._contexts = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """
+        Retrieve the EPGs and contexts if not already done
+        """
+        with self._lock:
+            if self._epg_names is not None:
+                return
+            contexts = {}
+            for context in Context.get(self.session):
+                if context.scope not in contexts:
+                    contexts[context.scope] = (context.tenant, context.name)
+            epg_names = {}
+            for epg in EPG.get(self.session):
+                epg_names[epg.class_id] = epg.name
+            self._contexts = contexts
+            self._epg_names = epg_names
+
+    def get_epg_name(self, pc_tag):
+        """
+        Get the name of the EPG with a pcTag
+
+        :param pc_tag: string containing the pcTag
+        :returns: string containing the EPG name or '' if not found
+        """
+        if self._epg_names is None:
+            self._load()
+        return self._epg_names.get(pc_tag, '')
+
+    def get_context(self, scope):
+        """
+        Get the tenant and context with a scope
+
+        :param scope: string containing the scope
+        :returns: tuple of the tenant name and context name or None if not found
+        """
+        if self._epg_names is None:
+            self._load()
+        return self._contexts.get(scope)
+
+
 class CommonConcreteObject(BaseACIPhysObject):
     """
     Intermediate abstract class that provides common methods for physical
@@ -1553,15 +1611,16 @@ class ConcreteAccCtrlRule(CommonConcreteObject):
         result = []
 
         rule_data = top.get_class('actrlRule')
-        epgs = EPG.get(top.session)
-        contexts = Context.get(top.session)
+        policy_lookup = top.policy_lookup
+        if policy_lookup is None:
+            policy_lookup = PolicyLookup(top.session)
 
         for actrl_rule in rule_data:
             rule = cls()
             rule._populate_from_attributes(actrl_rule['actrlRule']['attributes'])
             # get the context name by reading the context
-            rule._get_tenant_context(contexts)
-            rule._get_epg_names(epgs)
+            rule._get_tenant_context(policy_lookup)
+            rule._get_epg_names(policy_lookup)
             rule._get_pod_node()
             rule._set_name()
             result.append(rule)
@@ -1623,44 +1682,34 @@ class ConcreteAccCtrlRule(CommonConcreteObject):
                     'any_any_any': '12'}
         self.attr['relative_priority'] = prio_map.get(self.attr['priority'], 'unknown')
 
-    def _get_tenant_context(self, contexts):
+    def _get_tenant_context(self, policy_lookup):
         """
         This will map from scope to tenant name
         and context
+
+        :param policy_lookup: PolicyLookup instance
         """
-        # contexts = ACI.Context.get(session)
-        for context in contexts:
-            if self.attr['scope'] == context.scope:
-                self.attr['context'] = context.name
-                self.attr['tenant'] = context.tenant
-                return
-        self.attr['context'] = ''
-        self.attr['tenant'] = ''
+        context = policy_lookup.get_context(self.attr['scope'])
+        if context is None:
+            self.attr['tenant'], self.attr['context'] = '', ''
+        else:
+            self.attr['tenant'], self.attr['context'] = context
 
-    def _get_epg_names(self, epgs):
+    def _get_epg_names(self, policy_lookup):
         """
         This will derive source and destination EPG
         names from dclass and sclass - if possible
 
+        :param policy_lookup: PolicyLookup instance
         """
-        self.attr['s_epg'] = ''
-        self.attr['d_epg'] = ''
         if self.attr['dclass'] == 'any':
             self.attr['d_epg'] = 'any'
+        else:
+            self.attr['d_epg'] = policy_lookup.get_epg_name(self.attr['dclass'])
         if self.attr['sclass'] == 'any':
             self.attr['s_epg'] = 'any'
-
-        # if no lookup needed then return
-        if self.attr['sclass'] == 'any' and self.attr['dclass'] == 'any':
-            return
-
-        # get all the EPG
-        # epgs = ACI.EPG.get(session)
-        for epg in epgs:
-            if epg.class_id == self.attr['dclass']:
-                self.attr['d_epg'] = epg.name
-            if epg.class_id == self.attr['sclass']:
-                self.attr['s_epg'] = epg.name
+        else:
+            self.attr['s_epg'] = policy_lookup.get_epg_name(self.attr['sclass'])
 
     def _get_pod_node(self):
         """
@@ -2087,11 +2136,17 @@ class ConcreteEp(CommonConcreteObject):
             result.append(end_point)
 
         # all the EP info has been gathered - now clean up
-        rem_ep = []
+        # index the MAC to IP relations by the dn of their MAC endpoint
+        rels_by_mac = {}
+        for rel in top.get_class('epmRsMacEpToIpEpAtt'):
+            mac_dn = rel['epmRsMacEpToIpEpAtt']['attributes']['dn'].split('/rsmacEpToIpEpAtt-')[0]
+            rels_by_mac.setdefault(mac_dn, []).append(rel)
+
+        rem_ep = set()
         new_ep_list = []
         for end_point in result:
             if end_point.attr['address_family'] == 'mac':
-                rel_data = top.get_subtree('epmRsMacEpToIpEpAtt', end_point.attr['dn'])
+                rel_data = rels_by_mac.get(end_point.attr['dn'], [])
                 for rel in rel_data:
                     ip_add = str(rel['epmRsMacEpToIpEpAtt']['attributes']['tDn'].
                                  split('/ip-[')[1].split(']')[0])
@@ -2113,12 +2168,13 @@ class ConcreteEp(CommonConcreteObject):
                         # we have an IP address for this MAC
                         if end_point.attr['ip']:
                             # one already exists, must be new one
-                            new_ep = copy.deepcopy(end_point)
+                            new_ep = cls()
+                            new_ep.attr = dict(end_point.attr)
                             new_ep.attr['ip'] = ip_add
                             new_ep_list.append(new_ep)
                         else:
                             end_point.attr['ip'] = ip_add
-                        rem_ep.append((ip_add, ip_ctx, ip_bd))
+                        rem_ep.add((ip_add, ip_ctx, ip_bd))
                     else:
                         print ('unexpected context or bd mismatch', ip_add, ip_ctx, ip_bd)
         result.extend(new_ep_list)
@@ -173,12 +173,12 @@ class Faults(BaseACIObject):
         """
         url = self._get_subscription_urls(fault_filter=fault_filter)
         event = session.get_event(url)
-        for class_name in self._get_apic_classes_in_faults():
-            if class_name in event['imdata'][0]:
-                break
         faults = event['imdata']
         fault_objects = []
         for fault in faults:
+            for class_name in self._get_apic_classes_in_faults():
+                if class_name in fault:
+                    break
             obj = self()
             attribute_data = fault[class_name]['attributes']
             obj._populate_from_attributes(attribute_data)
@@ -190,7 +190,7 @@ class Faults(BaseACIObject):
                 fault_objects.append(obj.get_faults_by_filter(fault_filter=fault_filter))
             else:
                 fault_objects.append(obj)
-            return fault_objects
+        return fault_objects
 
     def _populate_from_attributes(self, attributes):
         """Fills in an Fault object with the desired attributes.
@@ -259,3 +259,198 @@ class Faults(BaseACIObject):
         except ValidationError as e:
             print('JSON configuration validation failed: %s', e.message)
             os._exit(1)
+
+
+class FaultStore(object):
+    """
+    In-memory store of the faults received from the faultInfo subscription.
+
+    The faults are indexed by severity, domain, type, lifecycle and by
+    every DN prefix of the object they are raised on, so queries such as
+    the critical faults of a tenant only look at the faults that match.
+    Events carrying a partial set of attributes update the stored fault
+    and a fault is removed from the store when it is deleted.
+    """
+    indexed_attributes = ('severity', 'domain', 'type', 'lc')
+
+    def __init__(self):
+        self._faults = {}
+        self._indexes = dict((attribute, {}) for attribute in self.indexed_attributes)
+        self._dn_index = {}
+        self._fault_filter = None
+
+    def __len__(self):
+        return len(self._faults)
+
+    def __contains__(self, dn):
+        return dn in self._faults
+
+    @staticmethod
+    def _get_dn_prefixes(dn):
+        """
+        Get the DNs of the object the fault is raised on and of all of its
+        ancestors.  Slashes within brackets are not considered.
+
+        :param dn: String containing the DN of the fault
+        :returns: list of strings containing the DN prefixes
+        """
+        prefixes = []
+        depth = 0
+        for index, char in enumerate(dn):
+            if char == '[':
+                depth += 1
+            elif char == ']':
+                depth -= 1
+            elif char == '/' and depth == 0:
+                prefixes.append(dn[:index])
+        return prefixes
+
+    @staticmethod
+    def _add_to_index(index, key, dn):
+        if key not in index:
+            index[key] = set()
+        index[key].add(dn)
+
+    @staticmethod
+    def _remove_from_index(index, key, dn):
+        dns = index.get(key)
+        if dns is not None:
+            dns.discard(dn)
+            if not dns:
+                del index[key]
+
+    def _index_fault(self, fault):
+        for attribute in self.indexed_attributes:
+            self._add_to_index(self._indexes[attribute], getattr(fault, attribute), fault.dn)
+
+    def _unindex_fault(self, fault):
+        for attribute in self.indexed_attributes:
+            self._remove_from_index(self._indexes[attribute], getattr(fault, attribute), fault.dn)
+
+    def add_fault(self, attributes):
+        """
+        Add a fault to the store or update the stored fault from the
+        attributes of a faultInst or faultDelegate.
+
+        :param attributes: Dictionary containing the fault attributes
+        :returns: Faults object or None if the fault has been deleted
+        """
+        dn = str(attributes['dn'])
+        fault = self._faults.get(dn)
+        if attributes.get('status') == 'deleted':
+            if fault is not None:
+                self.remove_fault(dn)
+            return None
+        if fault is None:
+            fault = Faults()
+            fault.dn = dn
+            fault.lc = None
+            fault.code = None
+            self._faults[dn] = fault
+            for prefix in self._get_dn_prefixes(dn):
+                self._add_to_index(self._dn_index, prefix, dn)
+        else:
+            self._unindex_fault(fault)
+        for attribute in ('type', 'subject', 'severity', 'domain', 'descr', 'cause', 'rule', 'lc', 'code'):
+            if attribute in attributes:
+                setattr(fault, attribute, attributes[attribute])
+        self._index_fault(fault)
+        return fault
+
+    def remove_fault(self, dn):
+        """
+        Remove a fault from the store
+
+        :param dn: String containing the DN of the fault
+        """
+        fault = self._faults.pop(dn)
+        self._unindex_fault(fault)
+        for prefix in self._get_dn_prefixes(dn):
+            self._remove_from_index(self._dn_index, prefix, dn)
+
+    def add_event(self, event):
+        """
+        Apply a faultInfo subscription event to the store
+
+        :param event: Dictionary containing the event
+        """
+        for fault in event['imdata']:
+            for class_name in Faults._get_apic_classes_in_faults():
+                if class_name in fault:
+                    self.add_fault(fault[class_name]['attributes'])
+                    break
+
+    def subscribe(self, session, fault_filter=None, only_new=False):
+        """
+        Subscribe to the faults.  Unless only_new is set, the existing faults
+        are queued as events and loaded by process_events.
+
+        :param session:  the instance of Session used for APIC communication
+        :param fault_filter: fault_filter is used to filter the attributes of a fault. given in a hash format
+                             with domain, types, severity
+        :param only_new: Boolean indicating whether to get only the new faults. Default is False.
+        """
+        self._fault_filter = fault_filter
+        return Faults.subscribe_faults(session, fault_filter=fault_filter, only_new=only_new)
+
+    def process_events(self, session):
+        """
+        Apply all of the pending fault events to the store
+
+        :param session:  the instance of Session used for APIC communication
+        :returns: Integer containing the number of events applied
+        """
+        url = Faults._get_subscription_urls(fault_filter=self._fault_filter)
+        count = 0
+        while session.has_events(url):
+            self.add_event(session.get_event(url))
+            count += 1
+        return count
+
+    def get(self, dn):
+        """
+        Get a fault by DN
+
+        :param dn: String containing the DN of the fault
+        :returns: Faults object or None
+        """
+        return self._faults.get(dn)
+
+    def get_faults(self, severity=None, domain=None, type=None, lifecycle=None, tenant=None, dn_prefix=None):
+        """
+        Get the faults matching all of the given criteria.  The index
+        entries are intersected starting from the smallest one.
+
+        :param severity: String containing the severity i.e. 'critical'
+        :param domain: String containing the domain i.e. 'tenant'
+        :param type: String containing the type i.e. 'config'
+        :param lifecycle: String containing the lifecycle i.e. 'raised', 'soaking', 'retaining'
+        :param tenant: String containing the name of the tenant
+        :param dn_prefix: String containing the DN of an object.  Only the faults raised\
+                          on this object or on the objects below it are returned.
+        :returns: list of Faults objects
+        """
+        candidates = []
+        for attribute, value in (('severity', severity), ('domain', domain), ('type', type), ('lc', lifecycle)):
+            if value is not None:
+                candidates.append(self._indexes[attribute].get(value, set()))
+        if tenant is not None:
+            candidates.append(self._dn_index.get('uni/tn-%s' % tenant, set()))
+        if dn_prefix is not None:
+            candidates.append(self._dn_index.get(dn_prefix.rstrip('/'), set()))
+        if not candidates:
+            return list(self._faults.values())
+        candidates.sort(key=len)
+        dns = candidates[0]
+        for other in candidates[1:]:
+            dns = dns.intersection(other)
+        return [self._faults[dn] for dn in dns]
+
+    def get_counts(self, attribute):
+        """
+        Get the number of faults for every value of an indexed attribute
+
+        :param attribute: String containing one of 'severity', 'domain', 'type' or 'lc'
+        :returns: Dictionary of the number of faults keyed by attribute value
+        """
+        return dict((value, len(dns)) for value, dns in self._indexes[attribute].items())
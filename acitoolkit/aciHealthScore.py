@@ -30,7 +30,10 @@
 """
 ACI Toolkit module for Health Scores
 """
-import json
+import heapq
+import logging
+
+import six
 
 
 class HealthScore(object):
@@ -68,7 +71,7 @@ class HealthScore(object):
         :return: list of HealthScore objects
         """
         resp = session.get(url)
-        scores = json.loads(resp.text)['imdata']
+        scores = resp.json()['imdata']
         objects = []
         for score in scores:
             obj = HealthScore()
@@ -128,3 +131,172 @@ class HealthScore(object):
         url = '/api/node/mo/{}/health.json'.format(dn)
         obj = cls._get_by_url(session, url)[0]
         return obj
+
+
+class HealthScoreIndex(object):
+    """
+    Index of the health scores of all of the objects in the APIC keyed by
+    the DN of the object that the score belongs to.
+
+    The scores are loaded with a single paginated healthInst class query
+    and kept current from a healthInst class subscription, so the health
+    of any number of objects can be looked up without querying the APIC
+    for every object.
+    """
+    def __init__(self, page_size=10000):
+        """
+        :param page_size: Integer containing the number of healthInst objects\
+                          requested in each page of the class query
+        """
+        self.page_size = page_size
+        self._scores = {}
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, dn):
+        return dn in self._scores
+
+    @staticmethod
+    def _get_url(subscription=False):
+        url = HealthScore._get_url()
+        if subscription:
+            url += '?subscription=yes'
+        return url
+
+    @staticmethod
+    def _get_parent_dn(dn):
+        """
+        Get the DN of the object that the healthInst belongs to
+
+        :param dn: String containing the DN of the healthInst
+        :returns: String containing the DN of the parent object
+        """
+        if dn.endswith('/health'):
+            return dn[:-len('/health')]
+        return dn.rpartition('/')[0]
+
+    def _add_score(self, attributes, scores=None):
+        """
+        Add or update the health score from the healthInst attributes.
+        Events only carry the attributes that changed so these are
+        applied to the current score if there is one.
+
+        :param attributes: Dictionary containing the healthInst attributes
+        :param scores: Optional dictionary of the scores to update instead of the index
+        """
+        if scores is None:
+            scores = self._scores
+        parent_dn = self._get_parent_dn(str(attributes['dn']))
+        score = scores.get(parent_dn)
+        if score is None:
+            score = HealthScore()
+            score.dn = attributes['dn']
+            scores[parent_dn] = score
+        score.chng = attributes.get('chng', score.chng)
+        score.cur = attributes.get('cur', score.cur)
+        score.prev = attributes.get('prev', score.prev)
+        score.lastchanged = attributes.get('updTs', score.lastchanged)
+
+    def load(self, session):
+        """
+        Load all of the health scores from the APIC, replacing the
+        current contents of the index.  The index is only replaced once
+        every page has been loaded.
+
+        :param session: the instance of Session used for APIC communication
+        :returns: Integer containing the number of health scores loaded
+        :raises: ValueError if a page could not be retrieved
+        """
+        scores = {}
+        class_name = HealthScore._get_apic_classes()[0]
+        page_number = 0
+        while True:
+            # The pages only split a consistent list if the APIC sorts the objects
+            url = '{0}?order-by={1}.dn&page={2}&page-size={3}'.format(self._get_url(), class_name,
+                                                                     page_number, self.page_size)
+            resp = session.get(url)
+            if not resp.ok:
+                logging.error('Could not get %s. Received response: %s', url, resp.text)
+                raise ValueError('Could not get page %s of %s' % (page_number, class_name))
+            data = resp.json()
+            for score in data['imdata']:
+                if class_name in score:
+                    self._add_score(score[class_name]['attributes'], scores)
+            page_number += 1
+            # Stop at the last page or if the APIC returned everything in one page
+            if len(data['imdata']) != self.page_size:
+                break
+            if 'totalCount' in data and page_number * self.page_size >= int(data['totalCount']):
+                break
+        self._scores = scores
+        return len(scores)
+
+    def subscribe(self, session, only_new=True):
+        """
+        Subscribe to the healthInst changes to keep the index current.
+
+        :param session: the instance of Session used for APIC communication
+        :param only_new: Boolean indicating whether to only get the changes\
+                         made after the subscription.  Default is True.
+        """
+        resp = session.subscribe(self._get_url(subscription=True), only_new=only_new)
+        if resp is not None and not resp.ok:
+            return False
+        return True
+
+    def process_events(self, session):
+        """
+        Apply the pending healthInst events to the index.
+
+        :param session: the instance of Session used for APIC communication
+        :returns: Integer containing the number of events applied
+        """
+        url = self._get_url(subscription=True)
+        class_name = HealthScore._get_apic_classes()[0]
+        count = 0
+        while session.has_events(url):
+            event = session.get_event(url)
+            for score in event['imdata']:
+                if class_name not in score:
+                    continue
+                attributes = score[class_name]['attributes']
+                if attributes.get('status') == 'deleted':
+                    self._scores.pop(self._get_parent_dn(str(attributes['dn'])), None)
+                else:
+                    self._add_score(attributes)
+                count += 1
+        return count
+
+    def get(self, obj):
+        """
+        Get the health score of an object
+
+        :param obj: ACI Toolkit object or string containing the DN of the object
+        :returns: HealthScore object or None if the object has no health score
+        """
+        dn = obj if isinstance(obj, six.string_types) else obj.dn
+        return self._scores.get(dn)
+
+    def get_unhealthy(self, threshold):
+        """
+        Get the health scores below a certain value
+
+        :param threshold: integer for determining unhealthy objects
+        :returns: List of tuples of the object DN and the HealthScore object\
+                  sorted from the lowest health score
+        """
+        unhealthy = [(dn, score) for dn, score in self._scores.items() if int(score.cur) < threshold]
+        unhealthy.sort(key=lambda item: (int(item[1].cur), item[0]))
+        return unhealthy
+
+    def get_lowest(self, count):
+        """
+        Get the lowest health scores
+
+        :param count: Integer containing the number of health scores to return
+        :returns: List of tuples of the object DN and the HealthScore object\
+                  sorted from the lowest health score
+        """
+        return heapq.nsmallest(count, self._scores.items(),
+                               key=lambda item: (int(item[1].cur), item[0]))
@@ -30,14 +30,179 @@
 """
 This module implements the Base Class for creating all of the ACI Objects.
 """
+import json
+from json.encoder import encode_basestring_ascii
 import logging
 from operator import attrgetter
 import sys
+import threading
+
+import six
+from six import StringIO
 
 from .aciSearch import AciSearch, Searchable
 from .acisession import Session
 
 
+_JSON_BUFFER_SIZE = 1000
+
+# ids of the objects whose JSON is being streamed by the current thread.
+# Marking the objects themselves would grow the __dict__ of every object
+# written.
+_json_stream = threading.local()
+
+
+def _is_json_streamed(obj):
+    return id(obj) in getattr(_json_stream, 'ids', ())
+
+
+def _get_stream_json(obj):
+    """
+    Get the JSON of an object for BaseACIObject.write_json.  The JSON of
+    its children objects is returned as a _LazyJsonChildren list.
+    """
+    if not hasattr(_json_stream, 'ids'):
+        _json_stream.ids = set()
+    _json_stream.ids.add(id(obj))
+    try:
+        return obj.get_json()
+    finally:
+        _json_stream.ids.discard(id(obj))
+
+
+class _LazyJsonChildren(list):
+    """
+    List of JSON children where the JSON of the children objects is only
+    generated when the list is written by BaseACIObject.write_json, so
+    that only the objects being written are held as dicts.  Any other
+    use of the list first appends the JSON of the children objects so
+    that it behaves as the list built by get_json.
+    """
+    def __init__(self, children_json, children):
+        super(_LazyJsonChildren, self).__init__(children_json)
+        self._children = children
+
+    def _materialize(self):
+        children = getattr(self, '_children', None)
+        if children is None:
+            return
+        self._children = None
+        for child in children:
+            data = child.get_json()
+            if data is None:
+                continue
+            if isinstance(data, list):
+                list.extend(self, data)
+            else:
+                list.append(self, data)
+
+    def iter_stream(self):
+        """
+        Iterate over the children JSON, generating the JSON of the
+        children objects one at a time
+        """
+        for item in list.__iter__(self):
+            yield item
+        for child in self._children or ():
+            data = _get_stream_json(child)
+            if data is None:
+                continue
+            if isinstance(data, list):
+                for item in data:
+                    yield item
+            else:
+                yield data
+
+
+def _materializing(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._materialize()
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    return wrapper
+
+for _name in ('__add__', '__contains__', '__delitem__', '__delslice__', '__eq__', '__ge__',
+              '__getitem__', '__getslice__', '__gt__', '__iadd__', '__imul__', '__iter__', '__le__',
+              '__len__', '__lt__', '__mul__', '__ne__', '__reduce_ex__', '__repr__', '__reversed__',
+              '__rmul__', '__setitem__', '__setslice__', 'append', 'count', 'extend', 'index',
+              'insert', 'pop', 'remove', 'reverse', 'sort'):
+    if hasattr(list, _name):
+        setattr(_LazyJsonChildren, _name, _materializing(_name))
+
+
+def _encode_json_key(key):
+    """Encode a dictionary key as json.dumps does"""
+    if isinstance(key, six.string_types):
+        return encode_basestring_ascii(key)
+    return json.dumps(str(key))
+
+
+def _write_json_value(data, parts, out, sort_keys):
+    """
+    Write the JSON of a value into the list of parts, flushing the
+    parts to the output when enough of them have been collected.
+    The output is identical to json.dumps with the same sort_keys.
+    """
+    if isinstance(data, dict):
+        parts.append('{')
+        keys = sorted(data) if sort_keys else data
+        first = True
+        for key in keys:
+            if not first:
+                parts.append(', ')
+            first = False
+            value = data[key]
+            if key == 'attributes' or not isinstance(value, (dict, list, tuple)):
+                parts.append(_encode_json_key(key) + ': ' + json.dumps(value, sort_keys=sort_keys))
+            else:
+                parts.append(_encode_json_key(key) + ': ')
+                _write_json_value(value, parts, out, sort_keys)
+        parts.append('}')
+    elif isinstance(data, (list, tuple)):
+        parts.append('[')
+        first = True
+        items = data.iter_stream() if isinstance(data, _LazyJsonChildren) else data
+        for item in items:
+            if not first:
+                parts.append(', ')
+            first = False
+            _write_json_value(item, parts, out, sort_keys)
+        parts.append(']')
+    else:
+        parts.append(json.dumps(data, sort_keys=sort_keys))
+    if len(parts) > _JSON_BUFFER_SIZE:
+        out.write(''.join(parts))
+        del parts[:]
+
+
+_IDENTITY_ATTRS = frozenset(('name', '_parent'))
+_IDENTITY_CLASSES = {}
+
+
+def _uses_identity_key(cls):
+    """
+    Check whether a class compares and hashes its instances using
+    the identity key of BaseACIObject.
+
+    :param cls: Class of the object
+    :returns: True or False
+    """
+    try:
+        return _IDENTITY_CLASSES[cls]
+    except KeyError:
+        pass
+    result = True
+    for method in ('__eq__', '__hash__'):
+        cls_method = getattr(getattr(cls, method), '__func__', getattr(cls, method))
+        base_method = getattr(getattr(BaseACIObject, method), '__func__', getattr(BaseACIObject, method))
+        if cls_method is not base_method:
+            result = False
+    _IDENTITY_CLASSES[cls] = result
+    return result
+
+
 class BaseRelation(object):
     """
     Class for all basic relations.
@@ -1015,7 +1180,9 @@ class BaseACIObject(AciSearch):
             if tag.is_deleted():
                 child['tagInst']['attributes']['status'] = 'deleted'
             children_json.append(child)
-        if get_children:
+        if get_children and _is_json_streamed(self):
+            children_json = _LazyJsonChildren(children_json, self._children)
+        elif get_children:
             for child in self._children:
                 data = child.get_json()
                 if data is not None:
@@ -1030,15 +1197,76 @@ class BaseACIObject(AciSearch):
                             'children': children_json}}
         return resp
 
+    def write_json(self, out_file=None, sort_keys=False):
+        """
+        Write the JSON representation of this object and all of its
+        children as it is generated.  The children objects are only
+        converted to JSON when they are written so the JSON of the whole
+        tree is never held in memory.
+
+        :param out_file: Optional file-like object to write the JSON to.
+        :param sort_keys: Boolean indicating whether the keys should be sorted\
+                          as done by Session.push_to_apic.  Default is False.
+        :returns: String containing the JSON if no out_file is given, otherwise None
+        """
+        return_string = out_file is None
+        if return_string:
+            out_file = StringIO()
+        parts = []
+        _write_json_value(_get_stream_json(self), parts, out_file, sort_keys)
+        out_file.write(''.join(parts))
+        if return_string:
+            return out_file.getvalue()
+
+    def __setattr__(self, attr, value):
+        # The identity key depends on the name and the parent so it is
+        # discarded whenever either of them is changed
+        if attr in _IDENTITY_ATTRS:
+            self._invalidate_identity_key()
+        object.__setattr__(self, attr, value)
+
+    def _invalidate_identity_key(self):
+        """
+        Discard the cached identity key of this object and of any
+        descendants that were built from it.
+        """
+        if self.__dict__.pop('_identity', None) is None:
+            return
+        for child in self.__dict__.get('_children', ()):
+            if isinstance(child, BaseACIObject):
+                child._invalidate_identity_key()
+
+    def _get_identity_key(self):
+        """
+        Get the key identifying this object within the object model.
+        The key is made of the parent key and the object name, i.e. the
+        path of the object from the root.  It is computed once and
+        cached until the name or parent of the object is changed.
+
+        :returns: Tuple of the identity key and its hash
+        """
+        identity = self.__dict__.get('_identity')
+        if identity is not None:
+            return identity
+        parent = self.__dict__.get('_parent')
+        if isinstance(parent, BaseACIObject) and _uses_identity_key(parent.__class__):
+            parent = (parent.__class__, parent._get_identity_key()[0])
+        key = (parent, self.name)
+        identity = (key, hash(key))
+        self.__dict__['_identity'] = identity
+        return identity
+
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            self_key = (self.get_parent(), self.name)
-            other_key = (other.get_parent(), other.name)
-            return self_key == other_key
+            if self.name != other.name:
+                return False
+            if self.__dict__.get('_parent') is other.__dict__.get('_parent'):
+                return True
+            return self._get_identity_key()[0] == other._get_identity_key()[0]
         return NotImplemented
 
     def __hash__(self):
-        return hash((self.get_parent(), self.name))
+        return self._get_identity_key()[1]
 
     def __ne__(self, other):
         return not self == other
@@ -1124,6 +1352,119 @@ class BaseACIObject(AciSearch):
             resp.append(obj)
         return resp
 
+    @staticmethod
+    def _get_parent_class_from_dn(parent_classes, dn):
+        """
+        Get the class of the object with the given DN among the possible
+        parent classes of an object.  The class whose name delimiter is
+        the last one found in the DN is chosen.
+
+        :param parent_classes: acitoolkit class or list of acitoolkit classes
+        :param dn: String containing the DN of the parent object
+        :returns: acitoolkit class or None
+        """
+        if not isinstance(parent_classes, list):
+            return parent_classes
+        parent_class = None
+        position = -1
+        for candidate in parent_classes:
+            try:
+                delimiter = candidate._get_starting_name_delimiter()
+            except NotImplementedError:
+                continue
+            if delimiter is not None and dn.rfind(delimiter) > position:
+                parent_class = candidate
+                position = dn.rfind(delimiter)
+        return parent_class
+
+    @classmethod
+    def _get_interned_parent(cls, toolkit_class, dn, objs):
+        """
+        Get the parent of an object from its DN.  The parents are created
+        from the DN the first time they are needed and are shared by all
+        of their children.
+
+        :param toolkit_class: acitoolkit class of the object
+        :param dn: String containing the DN of the object
+        :param objs: Dictionary of the objects keyed by (acitoolkit class, DN)
+        :returns: parent object or None for the objects directly under uni
+        """
+        parent_dn = toolkit_class._get_parent_dn(dn)
+        if '/' not in parent_dn:
+            return None
+        try:
+            parent_class = cls._get_parent_class_from_dn(toolkit_class._get_parent_class(), parent_dn)
+        except NotImplementedError:
+            return None
+        if parent_class is None:
+            return None
+        parent = objs.get((parent_class, parent_dn))
+        if parent is None:
+            grandparent = cls._get_interned_parent(parent_class, parent_dn, objs)
+            parent = parent_class(parent_class._get_name_from_dn(parent_dn), grandparent)
+            parent.dn = parent_dn
+            objs[(parent_class, parent_dn)] = parent
+        return parent
+
+    @classmethod
+    def get_all(cls, session, toolkit_classes, page_size=10000):
+        """
+        Get all of the objects of one or more acitoolkit classes across all
+        of the tenants with a single, paginated class query.  The parent of
+        each object is created from its DN and is shared by all of its
+        children, so i.e. the EPGs of an application profile have the same
+        AppProfile as parent.  If the class of a parent is also requested,
+        the parent is populated from its own APIC object.
+
+        :param session:  the instance of Session used for APIC communication
+        :param toolkit_classes: acitoolkit class or list of acitoolkit classes\
+                                i.e. [EPG, BridgeDomain, Context, Contract]
+        :param page_size: Integer containing the number of objects per page
+        :returns: list of objects in the order returned by the APIC
+        :raises: ValueError if a page could not be retrieved
+        """
+        if not isinstance(toolkit_classes, (list, tuple)):
+            toolkit_classes = [toolkit_classes]
+        apic_to_toolkit_class = {}
+        for toolkit_class in toolkit_classes:
+            apic_to_toolkit_class[toolkit_class._get_apic_classes()[0]] = toolkit_class
+        logging.debug('get_all called for %s', ', '.join(apic_to_toolkit_class))
+        apic_classes = list(apic_to_toolkit_class)
+        # The pages only split a consistent list if the APIC sorts the objects
+        query_url = '/api/node/class/%s.json?order-by=%s' % (','.join(apic_classes),
+                                                            ','.join(['%s.dn' % apic_class
+                                                                      for apic_class in apic_classes]))
+        objs = {}
+        resp = []
+        page_number = 0
+        while True:
+            ret = session.get('%s&page=%s&page-size=%s' % (query_url, page_number, page_size))
+            if not ret.ok:
+                logging.error('Could not get %s. Received response: %s', query_url, ret.text)
+                raise ValueError('Could not get page %s of %s' % (page_number, query_url))
+            data = ret.json()
+            for object_data in data['imdata']:
+                for apic_class in object_data:
+                    toolkit_class = apic_to_toolkit_class.get(apic_class)
+                    if toolkit_class is None:
+                        continue
+                    attribute_data = object_data[apic_class]['attributes']
+                    dn = str(attribute_data['dn'])
+                    obj = objs.get((toolkit_class, dn))
+                    if obj is None:
+                        parent = cls._get_interned_parent(toolkit_class, dn, objs)
+                        obj = toolkit_class(str(attribute_data['name']), parent)
+                        objs[(toolkit_class, dn)] = obj
+                    obj._populate_from_attributes(attribute_data)
+                    obj.dn = dn
+                    resp.append(obj)
+            page_number += 1
+            if len(data['imdata']) != page_size:
+                break
+            if 'totalCount' in data and page_number * page_size >= int(data['totalCount']):
+                break
+        return resp
+
     def find(self, search_object):
         """
         This will check to see if self is a match with ``search_object``
@@ -1272,17 +1613,46 @@ class BaseACIObject(AciSearch):
             attributes = event['imdata'][0]
             return attributes
 
-    def subscribe_to_fault_instances_subtree(self, session, extension='', deep=False):
+    def _get_fault_dn(self):
+        """
+        Get the DN used to match the faults raised on this object.  The DN
+        is the one read from the APIC if known, otherwise it is derived from
+        the instance subscription URL.
+
+        :returns: String containing the DN or None
+        """
+        if self.dn:
+            return self.dn
+        try:
+            urls = self._get_instance_subscription_urls()
+        except (NotImplementedError, AttributeError):
+            return None
+        for url in urls:
+            if url.startswith('/api/mo/'):
+                return url[len('/api/mo/'):].split('.json')[0]
+        return None
+
+    def subscribe_to_fault_instances_subtree(self, session, extension='', deep=False, single_subscription=False):
         """
         Subscribe to faults instances for the whole subtree.
 
         :param session:  the instance of Session used for APIC communication
         :param extension: Optional string that can be used to extend the URL
-        :param only_new: Boolean indicating whether to get all events or only the new events. All events (indicated by
-                         setting only_new to False) will queue a create event for all of the currently existing objects.
-                         Setting only_new to True will only queue events that occur after the initial subscribe. The
-                         default has only_new set to False.
-        """
+        :param deep: Boolean indicating whether to subscribe to the faults of all of the descendants
+                     instead of only the children.  Default is False.
+        :param single_subscription: Boolean indicating whether to use a single faultInst class subscription
+                                    limited to the DN of this object instead of a subscription per object.
+                                    The faults are then handed to the objects of the subtree using an
+                                    index of their DNs.  Default is False.
+        """
+        if single_subscription:
+            fault_index = _SubtreeFaultIndex(self, extension, deep)
+            if not session.is_subscribed(fault_index.url):
+                resp = session.subscribe(fault_index.url, only_new=True)
+                if resp is not None and not resp.ok:
+                    return resp
+            self._subtree_fault_index = fault_index
+            return
 
         self._instance_subscribe(session, extension)
         if deep:
@@ -1303,6 +1673,10 @@ class BaseACIObject(AciSearch):
         :param deep: Optional string to subscribe to all the children
         :returns: True or False.  True if there are events pending.
         """
+        fault_index = getattr(self, '_subtree_fault_index', None)
+        if fault_index is not None:
+            fault_index.collect_faults(session)
+            return fault_index.has_faults()
 
         urls = self._get_instance_subscription_urls()
         if any(session.has_events(url + extension) for url in urls):
@@ -1329,6 +1703,13 @@ class BaseACIObject(AciSearch):
         :param deep: Optional string to subscribe to all the children
         :returns: list of fault objects
         """
+        fault_index = getattr(self, '_subtree_fault_index', None)
+        if fault_index is not None:
+            fault_index.collect_faults(session)
+            for faults in fault_index.pop_faults().values():
+                fault_objs.extend(faults)
+            return fault_objs
+
         for child in self.get_children():
             urls = child._get_instance_subscription_urls()
             for url in urls:
@@ -1345,6 +1726,110 @@ class BaseACIObject(AciSearch):
                     child._instance_get_subtree_faults(session, fault_objs, extension, deep)
         return fault_objs
 
+    def get_subtree_faults_by_object(self, session):
+        """
+        Gets the faults that are pending for the subtree subscribed with
+        subscribe_to_fault_instances_subtree using single_subscription,
+        grouped by the object that owns them.
+
+        :param session:  the instance of Session used for APIC communication
+        :returns: list of tuples of the object and the list of its faults
+        """
+        fault_index = getattr(self, '_subtree_fault_index', None)
+        if fault_index is None:
+            raise ValueError('Subtree is not subscribed with a single subscription')
+        fault_index.collect_faults(session)
+        return [(fault_index.objects[dn], faults) for dn, faults in fault_index.pop_faults().items()]
+
+
+class _SubtreeFaultIndex(object):
+    """
+    Index of the DNs of the objects in a subtree used to hand the events
+    of a single faultInst class subscription to the objects that own them.
+    """
+    def __init__(self, root, extension='', deep=False):
+        self.objects = {}
+        self.faults = {}
+        self.root_dn = root._get_fault_dn()
+        if self.root_dn is None:
+            raise ValueError('Could not determine the DN of %s' % root)
+        self.url = ('/api/class/faultInst.json?subscription=yes'
+                    '&query-target-filter=wcard(faultInst.dn,"^%s/")' % self.root_dn) + extension
+        pending = [(root, 0)]
+        while pending:
+            obj, depth = pending.pop()
+            dn = obj._get_fault_dn()
+            if dn is not None:
+                self.objects[dn] = obj
+            if deep or depth == 0:
+                pending.extend((child, depth + 1) for child in obj.get_children())
+
+    @staticmethod
+    def _get_parent_dn(dn):
+        """
+        Remove the last RN of a DN.  Slashes within brackets, as found in
+        interface and subnet RNs, are not considered.
+
+        :param dn: String containing the DN
+        :returns: String containing the parent DN or None at the top
+        """
+        depth = 0
+        for index in range(len(dn) - 1, -1, -1):
+            char = dn[index]
+            if char == ']':
+                depth += 1
+            elif char == '[':
+                depth -= 1
+            elif char == '/' and depth == 0:
+                return dn[:index]
+        return None
+
+    def get_owner_dn(self, fault_dn):
+        """
+        Get the DN of the indexed object closest to the fault.
+
+        :param fault_dn: String containing the DN of the faultInst
+        :returns: String containing the DN of the owning object or None
+        """
+        dn = self._get_parent_dn(fault_dn)
+        while dn is not None and dn not in self.objects:
+            dn = self._get_parent_dn(dn)
+        return dn
+
+    def collect_faults(self, session):
+        """
+        Move the pending events of the subscription to the faults of the
+        objects that own them.
+
+        :param session:  the instance of Session used for APIC communication
+        """
+        while session.has_events(self.url):
+            event = session.get_event(self.url)
+            for fault in event['imdata']:
+                for class_name in fault:
+                    owner_dn = self.get_owner_dn(str(fault[class_name]['attributes']['dn']))
+                    if owner_dn is None:
+                        continue
+                    if owner_dn not in self.faults:
+                        self.faults[owner_dn] = []
+                    self.faults[owner_dn].append(fault)
+
+    def has_faults(self):
+        """
+        :returns: True if any object of the subtree has pending faults
+        """
+        return len(self.faults) > 0
+
+    def pop_faults(self):
+        """
+        Remove and return the pending faults.
+
+        :returns: Dictionary of the lists of faults indexed by the DN of their object
+        """
+        faults = self.faults
+        self.faults = {}
+        return faults
+
 
 class BaseACIPhysObject(BaseACIObject):
     """Base class for physical objects
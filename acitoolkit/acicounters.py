@@ -29,7 +29,62 @@
 ################################################################################
 """ACI Toolkit module for counter and stats objects
 """
+from collections import deque, namedtuple
+import logging
+from operator import itemgetter
 import re
+import threading
+import time
+
+
+class CounterFamily(namedtuple('CounterFamily', ['name', 'apic_name', 'int_fields', 'float_fields'])):
+    """
+    Schema of a counter family.  The APIC stats classes of the family are
+    named eqpt<apic_name>[Hist]<granularity>, for example eqptEgrTotal5min
+    and eqptEgrTotalHist5min.  The int_fields are converted to integers and
+    the float_fields to floats.
+    """
+    __slots__ = ()
+
+
+def _cumulative_fields(*prefixes):
+    """
+    Get the names of the cumulative counters of the given prefixes
+
+    :param prefixes: strings containing the counter prefixes
+    :returns: tuple of counter names
+    """
+    return tuple(prefix + suffix for prefix in prefixes for suffix in ('Avg', 'Cum', 'Max', 'Min', 'Per'))
+
+
+def _rate_fields(*prefixes):
+    """
+    Get the names of the rate counters of the given prefixes
+
+    :param prefixes: strings containing the counter prefixes
+    :returns: tuple of counter names
+    """
+    return tuple(prefix + suffix for prefix in prefixes for suffix in ('Rate', 'RateAvg', 'RateMax', 'RateMin'))
+
+
+def _get_fields_getter(fields):
+    """
+    Get a function returning the values of the given fields of an
+    attribute dictionary as a tuple
+
+    :param fields: tuple of field names
+    :returns: function
+    """
+    if not fields:
+        return lambda attributes: ()
+    if len(fields) == 1:
+        field = fields[0]
+        return lambda attributes: (attributes[field],)
+    return itemgetter(*fields)
+
+
+_CounterParser = namedtuple('_CounterParser', ['name', 'granularity', 'int_fields', 'float_fields',
+                                               'int_getter', 'float_getter', 'supported'])
 
 
 class AtomicCountersOnGoing(object):
@@ -302,7 +357,39 @@ class InterfaceStats(object):
     For each counter family/granularity/period there are several counter
     values retained.  The best way to see a list of these counters is to
     print the keys of the dictionary.
+
+    The counter families and their counters are described by the
+    CounterFamily instances in counter_families.  Other families can be
+    decoded by adding them with add_counter_family.
     """
+    counter_families = [
+        CounterFamily('egrTotal', 'EgrTotal', _cumulative_fields('bytes', 'pkts'),
+                      _rate_fields('bytes', 'pkts')),
+        CounterFamily('egrBytes', 'EgrBytes', _cumulative_fields('flood', 'multicast'),
+                      ('floodRate',) + _rate_fields('multicast')),
+        CounterFamily('egrPkts', 'EgrPkts', _cumulative_fields('flood', 'multicast', 'unicast'),
+                      ('floodRate', 'multicastRate', 'unicastRate')),
+        CounterFamily('egrDropPkts', 'EgrDropPkts', _cumulative_fields('afdWred', 'buffer', 'error'),
+                      ('afdWredRate', 'bufferRate', 'errorRate')),
+        CounterFamily('ingrBytes', 'IngrBytes', _cumulative_fields('flood', 'multicast'),
+                      ('floodRate',) + _rate_fields('multicast')),
+        CounterFamily('ingrPkts', 'IngrPkts', _cumulative_fields('flood', 'multicast', 'unicast'),
+                      ('floodRate', 'multicastRate', 'unicastRate')),
+        CounterFamily('ingrTotal', 'IngrTotal', _cumulative_fields('bytes', 'pkts'),
+                      _rate_fields('bytes', 'pkts')),
+        CounterFamily('ingrDropPkts', 'IngrDropPkts', _cumulative_fields('buffer', 'error', 'forwarding', 'lb'),
+                      ('bufferRate', 'errorRate', 'forwardingRate', 'lbRate')),
+        CounterFamily('ingrUnkBytes', 'IngrUnkBytes', _cumulative_fields('unclassified', 'unicast'),
+                      ('unclassifiedRate', 'unicastRate')),
+        CounterFamily('ingrUnkPkts', 'IngrUnkPkts', _cumulative_fields('unclassified', 'unicast'),
+                      ('unclassifiedRate', 'unicastRate')),
+        CounterFamily('ingrStorm', 'IngrStorm', _cumulative_fields('dropBytes'),
+                      _rate_fields('dropBytes')),
+    ]
+    _float_fields = set(attrName for counter_family in counter_families
+                        for attrName in counter_family.float_fields)
+    _counter_parsers = {}
+
     def __init__(self, parent, interfaceDn):
         self._parent = parent
         self._interfaceDn = interfaceDn
@@ -396,6 +483,44 @@ class InterfaceStats(object):
         self.result = result
         return result
 
+    @classmethod
+    def add_counter_family(cls, counter_family):
+        """
+        Add a counter family to the families decoded by get and get_all_ports
+
+        :param counter_family: CounterFamily instance
+        """
+        cls.counter_families.append(counter_family)
+        cls._float_fields.update(counter_family.float_fields)
+        cls._counter_parsers.clear()
+
+    @classmethod
+    def _get_counter_parser(cls, apic_class):
+        """
+        Get the counter family name, granularity and fields of an APIC
+        stats class from the counter families.  The result is computed once
+        per APIC class.
+
+        :param apic_class: String containing the APIC stats class name
+        :returns: _CounterParser instance
+        """
+        parser = cls._counter_parsers.get(apic_class)
+        if parser is None:
+            granularity = re.search(r'(\d+\D+)$', apic_class).group(1)
+            for counter_family in cls.counter_families:
+                if counter_family.apic_name in apic_class:
+                    name = counter_family.name
+                    int_fields = counter_family.int_fields
+                    float_fields = counter_family.float_fields
+                    supported = True
+                    break
+            else:
+                name, int_fields, float_fields, supported = apic_class, (), (), False
+            parser = _CounterParser(name, granularity, int_fields, float_fields,
+                                    _get_fields_getter(int_fields), _get_fields_getter(float_fields), supported)
+            cls._counter_parsers[apic_class] = parser
+        return parser
+
     @staticmethod
     def _process_data(data):
         """
@@ -415,113 +540,21 @@ class InterfaceStats(object):
                         else:
                             period = int(counterAttr['index']) + 1
 
-                        if 'EgrTotal' in count:
-                            countName = 'egrTotal'
-                        elif 'EgrBytes' in count:
-                            countName = 'egrBytes'
-                        elif 'EgrPkts' in count:
-                            countName = 'egrPkts'
-                        elif 'EgrDropPkts' in count:
-                            countName = 'egrDropPkts'
-                        elif 'IngrBytes' in count:
-                            countName = 'ingrBytes'
-                        elif 'IngrPkts' in count:
-                            countName = 'ingrPkts'
-                        elif 'IngrTotal' in count:
-                            countName = 'ingrTotal'
-                        elif 'IngrDropPkts' in count:
-                            countName = 'ingrDropPkts'
-                        elif 'IngrUnkBytes' in count:
-                            countName = 'ingrUnkBytes'
-                        elif 'IngrUnkPkts' in count:
-                            countName = 'ingrUnkPkts'
-                        elif 'IngrStorm' in count:
-                            countName = 'ingrStorm'
-                        else:
-                            countName = count
+                        parser = InterfaceStats._get_counter_parser(count)
+                        if not parser.supported:
+                            print('Found unsupported counter ' + str(parser.name) + " " +
+                                  str(parser.granularity) + " " + str(period))
 
-                        granularity = re.search(r'(\d+\D+)$', count).group(1)
+                        record = dict(zip(parser.int_fields, map(int, parser.int_getter(counterAttr))))
+                        record.update(zip(parser.float_fields, map(float, parser.float_getter(counterAttr))))
+                        record['intervalEnd'] = counterAttr.get('repIntvEnd')
+                        record['intervalStart'] = counterAttr.get('repIntvStart')
 
-                        if countName not in result:
-                            result[countName] = {}
-                        if granularity not in result[countName]:
-                            result[countName][granularity] = {}
-                        if period not in result[countName][granularity]:
-                            result[countName][granularity][period] = {}
-
-                        if countName in ['egrTotal', 'ingrTotal']:
-                            for attrName in ['bytesAvg', 'bytesCum', 'bytesMax', 'bytesMin', 'bytesPer',
-                                             'pktsAvg', 'pktsCum', 'pktsMax', 'pktsMin', 'pktsPer']:
-                                result[countName][granularity][period][attrName] = int(counterAttr[attrName])
-                            for attrName in ['bytesRate', 'bytesRateAvg', 'bytesRateMax', 'bytesRateMin',
-                                             'pktsRate', 'pktsRateAvg', 'pktsRateMax', 'pktsRateMin']:
-                                result[countName][granularity][period][attrName] = float(counterAttr[attrName])
-
-                        elif countName in ['egrBytes', 'ingrBytes']:
-                            for attrName in ['floodAvg', 'floodCum', 'floodMax', 'floodMin', 'floodPer',
-                                             'multicastAvg', 'multicastCum', 'multicastMax', 'multicastMin',
-                                             'multicastPer']:
-                                result[countName][granularity][period][attrName] = int(counterAttr[attrName])
-                            for attrName in ['floodRate',
-                                             'multicastRate', 'multicastRateAvg', 'multicastRateMax',
-                                             'multicastRateMin']:
-                                result[countName][granularity][period][attrName] = float(counterAttr[attrName])
-
-                        elif countName in ['egrPkts', 'ingrPkts']:
-                            for attrName in ['floodAvg', 'floodCum', 'floodMax', 'floodMin', 'floodPer',
-                                             'multicastAvg', 'multicastCum', 'multicastMax', 'multicastMin',
-                                             'multicastPer',
-                                             'unicastAvg', 'unicastCum', 'unicastMax', 'unicastMin', 'unicastPer']:
-                                result[countName][granularity][period][attrName] = int(counterAttr[attrName])
-                            for attrName in ['floodRate', 'multicastRate', 'unicastRate']:
-                                result[countName][granularity][period][attrName] = float(counterAttr[attrName])
-
-                        elif countName in ['egrDropPkts']:
-                            for attrName in ['afdWredAvg', 'afdWredCum', 'afdWredMax', 'afdWredMin', 'afdWredPer',
-                                             'bufferAvg', 'bufferCum', 'bufferMax', 'bufferMin', 'bufferPer',
-                                             'errorAvg', 'errorCum', 'errorMax', 'errorMin', 'errorPer']:
-                                result[countName][granularity][period][attrName] = int(counterAttr[attrName])
-                            for attrName in ['afdWredRate',
-                                             'bufferRate',
-                                             'errorRate']:
-                                result[countName][granularity][period][attrName] = float(counterAttr[attrName])
-                        elif countName in ['ingrDropPkts']:
-                            for attrName in ['bufferAvg', 'bufferCum', 'bufferMax', 'bufferMin', 'bufferPer',
-                                             'errorAvg', 'errorCum', 'errorMax', 'errorMin', 'errorPer',
-                                             'forwardingAvg', 'forwardingCum', 'forwardingMax', 'forwardingMin',
-                                             'forwardingPer',
-                                             'lbAvg', 'lbCum', 'lbMax', 'lbMin', 'lbPer']:
-                                result[countName][granularity][period][attrName] = int(counterAttr[attrName])
-                            for attrName in ['bufferRate', 'errorRate', 'forwardingRate', 'lbRate']:
-                                result[countName][granularity][period][attrName] = float(counterAttr[attrName])
-
-                        elif countName in ['ingrUnkBytes']:
-                            for attrName in ['unclassifiedAvg', 'unclassifiedCum', 'unclassifiedMax', 'unclassifiedMin',
-                                             'unclassifiedPer',
-                                             'unicastAvg', 'unicastCum', 'unicastMax', 'unicastMin', 'unicastPer']:
-                                result[countName][granularity][period][attrName] = int(counterAttr[attrName])
-                            for attrName in ['unclassifiedRate', 'unicastRate']:
-                                result[countName][granularity][period][attrName] = float(counterAttr[attrName])
-
-                        elif countName in ['ingrUnkPkts']:
-                            for attrName in ['unclassifiedAvg', 'unclassifiedCum', 'unclassifiedMax', 'unclassifiedMin',
-                                             'unclassifiedPer',
-                                             'unicastAvg', 'unicastCum', 'unicastMax', 'unicastMin', 'unicastPer']:
-                                result[countName][granularity][period][attrName] = int(counterAttr[attrName])
-                            for attrName in ['unclassifiedRate', 'unicastRate']:
-                                result[countName][granularity][period][attrName] = float(counterAttr[attrName])
-                        elif countName in ['ingrStorm']:
-                            for attrName in ['dropBytesAvg', 'dropBytesCum', 'dropBytesMax', 'dropBytesMin',
-                                             'dropBytesPer']:
-                                result[countName][granularity][period][attrName] = int(counterAttr[attrName])
-                            for attrName in ['dropBytesRate', 'dropBytesRateAvg', 'dropBytesRateMax',
-                                             'dropBytesRateMin']:
-                                result[countName][granularity][period][attrName] = float(counterAttr[attrName])
+                        periods = result.setdefault(parser.name, {}).setdefault(parser.granularity, {})
+                        if period in periods:
+                            periods[period].update(record)
                         else:
-                            print('Found unsupported counter ' + str(countName) + " " +
-                                  str(granularity) + " " + str(period))
-                        result[countName][granularity][period]['intervalEnd'] = counterAttr.get('repIntvEnd')
-                        result[countName][granularity][period]['intervalStart'] = counterAttr.get('repIntvStart')
+                            periods[period] = record
 
         return result
 
@@ -554,15 +587,7 @@ class InterfaceStats(object):
         if countName in ['intervalEnd', 'intervalStart']:
             result = None
 
-        elif countName in ['pktsRate', 'pktsRateAvg', 'pktsRateMax',
-                           'pktsRateMin', 'bytesRate', 'bytesRateAvg',
-                           'bytesRateMax', 'bytesRateMin', 'floodRate',
-                           'unicastRate', 'unclassifiedRate', 'afdWredRate',
-                           'bufferRate', 'errorRate', 'forwardingRate',
-                           'lbRate', 'multicastRate', 'multicastRateAvg',
-                           'multicastRateMax', 'multicastRateMin',
-                           'dropBytesRate', 'dropBytesRateAvg',
-                           'dropBytesRateMax', 'dropBytesRateMin']:
+        elif countName in self._float_fields:
             result = 0.0
         else:
             result = 0
@@ -576,3 +601,229 @@ class InterfaceStats(object):
                         result = self.result[countFamily][granularity][period][countName]
 
         return result
+
+
+class CounterSample(namedtuple('CounterSample', ['timestamp', 'counters', 'deltas', 'rates'])):
+    """
+    Sample of the counters of a counter family of a port collected by the
+    InterfaceStatsCollector.  The counters are the values decoded from the
+    APIC.  The deltas and rates are computed from the cumulative counters
+    since the previous sample and are indexed by the counter prefix, for
+    example 'bytes' for the 'bytesCum' counter.  They are empty for the
+    first sample of a port.
+    """
+    __slots__ = ()
+
+
+class InterfaceStatsCollector(object):
+    """
+    This class collects the current interface counters of all of the ports
+    of the fabric with one paginated class query per counter class and
+    poll.  It computes the deltas and rates of the cumulative counters
+    between samples and keeps a bounded history of samples for each port
+    and counter family so that monitoring tools can read the rates without
+    querying the APIC.
+
+    The cumulative counters count up from the creation of the counter and
+    are not cleared at the start of every interval of their granularity.
+    A cumulative counter whose value decreased since the previous sample,
+    e.g. after the counters of the port were cleared, is considered reset
+    and its delta is its new value.
+    """
+    def __init__(self, session, counter_families=('egrTotal', 'ingrTotal'), granularity='5min',
+                 history=60, page_size=10000):
+        """
+        :param session: Session to use when accessing the APIC
+        :param counter_families: names of the counter families to collect
+        :param granularity: String containing the granularity of the counters to collect
+        :param history: Integer containing the number of samples kept per port and counter family
+        :param page_size: Integer containing the number of objects per page of the class query
+        """
+        self._session = session
+        self.counter_families = list(counter_families)
+        self.granularity = granularity
+        self.history = history
+        self.page_size = page_size
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _get_apic_classes(self):
+        """
+        Get the APIC classes of the current counters to collect
+
+        :returns: list of strings containing APIC class names
+        """
+        apic_names = dict((counter_family.name, counter_family.apic_name)
+                          for counter_family in InterfaceStats.counter_families)
+        return ['eqpt' + apic_names[name] + self.granularity for name in self.counter_families]
+
+    def _get_counter_data(self):
+        """
+        Get the current counters of all of the ports
+
+        :returns: list of JSON dictionaries of the APIC counter objects
+        :raises: ValueError if a page could not be retrieved
+        """
+        data = []
+        for apic_class in self._get_apic_classes():
+            page_number = 0
+            while True:
+                # The pages only split a consistent list if the APIC sorts the objects
+                query_url = '/api/node/class/{0}.json?order-by={0}.dn&page={1}&page-size={2}'.format(
+                    apic_class, page_number, self.page_size)
+                ret = self._session.get(query_url)
+                if not ret.ok:
+                    logging.error('Could not get %s. Received response: %s', query_url, ret.text)
+                    raise ValueError('Could not get page %s of %s' % (page_number, apic_class))
+                page = ret.json()
+                data.extend(page['imdata'])
+                page_number += 1
+                if len(page['imdata']) != self.page_size:
+                    break
+                if 'totalCount' in page and page_number * self.page_size >= int(page['totalCount']):
+                    break
+        return data
+
+    @staticmethod
+    def _get_sample(timestamp, counters, previous):
+        """
+        Create a sample and compute its deltas and rates from the previous sample
+
+        :param timestamp: Float containing the time of the sample in seconds
+        :param counters: Dictionary of the decoded counters
+        :param previous: Previous CounterSample or None
+        :returns: CounterSample instance
+        """
+        deltas = {}
+        rates = {}
+        if previous is not None:
+            elapsed = timestamp - previous.timestamp
+            for counter_name in counters:
+                if not counter_name.endswith('Cum'):
+                    continue
+                value = counters[counter_name]
+                delta = value - previous.counters.get(counter_name, 0)
+                if delta < 0:
+                    delta = value
+                prefix = counter_name[:-len('Cum')]
+                deltas[prefix] = delta
+                if elapsed > 0:
+                    rates[prefix] = delta / float(elapsed)
+        return CounterSample(timestamp, counters, deltas, rates)
+
+    def poll(self, timestamp=None):
+        """
+        Collect the current counters of all of the ports and add a sample
+        to the history of each port and counter family
+
+        :param timestamp: Optional float containing the time of the samples.\
+                          The current time is used if not specified
+        :returns: Integer containing the number of samples added
+        """
+        data = self._get_counter_data()
+        if timestamp is None:
+            timestamp = time.time()
+        count = 0
+        with self._lock:
+            for counter_object in data:
+                for apic_class in counter_object:
+                    attributes = counter_object[apic_class]['attributes']
+                    parser = InterfaceStats._get_counter_parser(apic_class)
+                    if not parser.supported:
+                        continue
+                    # the counter classes also exist below the port channels and tunnels
+                    if '/sys/phys-[' not in attributes['dn']:
+                        continue
+                    try:
+                        port_id = InterfaceStats._parseDn2PortId(attributes['dn'])
+                        counters = dict(zip(parser.int_fields, map(int, parser.int_getter(attributes))))
+                        counters.update(zip(parser.float_fields, map(float, parser.float_getter(attributes))))
+                    except (IndexError, ValueError):
+                        logging.error('Could not parse the counters of %s', attributes['dn'])
+                        continue
+                    counters['intervalEnd'] = attributes.get('repIntvEnd')
+                    counters['intervalStart'] = attributes.get('repIntvStart')
+
+                    key = (port_id, parser.name)
+                    samples = self._samples.get(key)
+                    if samples is None:
+                        samples = self._samples[key] = deque(maxlen=self.history)
+                        previous = None
+                    else:
+                        previous = samples[-1]
+                    samples.append(self._get_sample(timestamp, counters, previous))
+                    count += 1
+        return count
+
+    def get_ports(self):
+        """
+        Get the ports that have samples
+
+        :returns: sorted list of interface id strings such as '1/101/1/1'
+        """
+        with self._lock:
+            return sorted(set(port_id for (port_id, counter_family) in self._samples))
+
+    def get_history(self, port_id, counter_family):
+        """
+        Get the samples of a port and counter family
+
+        :param port_id: String containing the interface id such as '1/101/1/1'
+        :param counter_family: String containing the counter family such as 'egrTotal'
+        :returns: list of CounterSample instances from the oldest to the newest
+        """
+        with self._lock:
+            return list(self._samples.get((port_id, counter_family), []))
+
+    def get_rate(self, port_id, counter_family, counter):
+        """
+        Get the latest rate of a counter of a port
+
+        :param port_id: String containing the interface id such as '1/101/1/1'
+        :param counter_family: String containing the counter family such as 'egrTotal'
+        :param counter: String containing the counter prefix such as 'bytes' or 'pkts'
+        :returns: Float containing the rate per second or None if there is\
+                  no rate for the counter yet
+        """
+        with self._lock:
+            samples = self._samples.get((port_id, counter_family))
+            if not samples:
+                return None
+            return samples[-1].rates.get(counter)
+
+    def start(self, interval=30):
+        """
+        Start polling the counters periodically in a background thread
+
+        :param interval: Number of seconds between polls
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, interval):
+        """
+        Poll the counters until stopped
+
+        :param interval: Number of seconds between polls
+        """
+        while not self._stop_event.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                logging.error('Could not poll the interface counters: %s', e)
+            self._stop_event.wait(interval)
+
+    def stop(self):
+        """
+        Stop polling the counters
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -16,13 +16,11 @@
 """  This module contains code that emulates the Session class except that
      there is no actual APIC and the configuration comes from JSON files.
 """
-from copy import deepcopy
+from bisect import bisect_left
 import json
 import re
-try:
-    import urlparse
-except ImportError:
-    from urllib.parse import urlparse
+
+from six.moves.urllib.parse import parse_qs, urlparse
 
 from .acisession import Session
 import logging
@@ -34,9 +32,10 @@ class FakeResponse(object):
     """
     def __init__(self, data=None):
         self.ok = True
+        self.status_code = 200
         self._data = {}
         self._data['imdata'] = data
-        self._content = ''
+        self._encoded_content = None
 
     def json(self):
         """
@@ -46,6 +45,43 @@ class FakeResponse(object):
         """
         return self._data
 
+    @property
+    def _content(self):
+        """
+        Get the encoded JSON of the Response data.  The data is only
+        encoded if the content is accessed.
+
+        :return: bytes containing the JSON formatted data
+        """
+        if self._encoded_content is None:
+            self._encoded_content = json.dumps(self._data).encode()
+        return self._encoded_content
+
+    @_content.setter
+    def _content(self, content):
+        self._encoded_content = content
+
+    @property
+    def content(self):
+        """
+        Get the encoded JSON of the Response data
+
+        :return: bytes containing the JSON formatted data
+        """
+        return self._content
+
+    @property
+    def text(self):
+        """
+        Get the JSON of the Response data as a string
+
+        :return: string containing the JSON formatted data
+        """
+        content = self._content
+        if isinstance(content, bytes):
+            return content.decode()
+        return content
+
 
 class FakeSubscriber(object):
     """
@@ -71,6 +107,11 @@ class FakeSubscriber(object):
 class FakeSession(Session):
     """
     Class to fake an APIC Session
+
+    The objects of the JSON files are indexed by class, by dn and by
+    parent dn when they are loaded.  The responses contain the loaded
+    objects and attribute dictionaries themselves rather than copies so
+    they must be treated as read-only.
     """
     def __init__(self, filenames=()):
         """
@@ -81,218 +122,234 @@ class FakeSession(Session):
         self.db = []
         self.subscription_thread = FakeSubscriber()
         self._classes = {}
+        self._objects = []
+        self._dns = {}
+        self._children = {}
+        self._sorted_dns = None
         for filename in filenames:
             with open(filename, 'r') as f:
                 try:
-                    data = json.loads(f.read())
+                    data = json.load(f)
                 except ValueError:
                     continue
-                # Skip invalid formatted files
-                if 'imdata' not in data:
+            # Skip invalid formatted files
+            if 'imdata' not in data:
+                continue
+            # Skip files that are timeout and other errors
+            if len(data['imdata']) == 1:
+                if 'error' in data['imdata'][0]:
                     continue
-                # Skip files that are timeout and other errors
-                if len(data['imdata']) == 1:
-                    if 'error' in data['imdata'][0]:
-                        continue
-                self._fill_data(data['imdata'], None)
-                self.db.append(data)
-            with open(filename, "w") as f:
-                f.write(unicode(json.dumps(data, indent=4)))
+            self._fill_data(data['imdata'], None)
+            self.db.append(data)
 
     def _get_config(self, url):
         """
         Get the configuration of a specified URL
 
         :param url: string containing the URL to search the configuration
-        :return: list of the found objects
+        :return: tuple of the list of the found objects and the total\
+                 number of objects before the page was selected
         """
         queries = self._parse_url(url)
-        dn, query_target, rsp_subtree, target_cls, node_cl = queries
-        data, cl_data = [], []
-        # the loop will execute even if there are no target classes
-        # this ensures the get_class function gets called at least once
-        for target in target_cls.split(','):
-            cl_data = self._get_class(dn, node_cl, target, query_target)
-            data.extend(cl_data)
-        return self._rsp_subtree_data(data, rsp_subtree)
+        dn, query_target, rsp_subtree, target_cls, node_cl, page, page_size = queries
+        target_cls = set(target_cls.split(',')) if target_cls else None
+        if node_cl:
+            positions = []
+            for cl in node_cl.split(','):
+                class_positions = self._get_class(cl)
+                if class_positions is None:
+                    logging.error('Unknown class %s', cl)
+                    continue
+                if query_target == 'self':
+                    positions.extend(class_positions)
+                    continue
+                for position in class_positions:
+                    instance_cl, instance = self._objects[position]
+                    instance_dn = instance[instance_cl]['attributes']['dn']
+                    positions.extend(self._get_dn(instance_dn, target_cls, query_target))
+        else:
+            positions = self._get_dn(dn, target_cls, query_target)
+        total_count = len(positions)
+        if page_size is not None:
+            positions = positions[page * page_size:(page + 1) * page_size]
+        return self._rsp_subtree_data(positions, rsp_subtree), total_count
 
     @staticmethod
     def _parse_url(url):
         """
         Parse the url to get the dn, query-target, rsp-subtree,
-        target-subtree-class(es), and the node class
+        target-subtree-class(es), the node class and the page
 
         :param url: string containing the URL to be parsed
         :return: a tuple of data
         """
         # set a dummy url scheme to make the url look like a real one
         url = 'scheme://apic' + url
-        url_parsed = urlparse.urlparse(url)
+        url_parsed = urlparse(url)
         cl_path = url_parsed.path.partition('.json')[0]
         path_regex = r'/api/(?:mo|node/class|class|node/mo)/(([^/]*).*)'
         dn, root_cl = re.search(path_regex, cl_path).groups()
         # get the queries as a dict
-        url_queries = urlparse.parse_qs(url_parsed.query)
+        url_queries = parse_qs(url_parsed.query)
         # get the queries and convert them to a string
         query_target = ''.join(url_queries.get('query-target', ['self']))
         rsp_subtree = ''.join(url_queries.get('rsp-subtree', ['no']))
         target_classes = ','.join(url_queries.get('target-subtree-class',
                                                   ['']))
+        page = int(''.join(url_queries.get('page', ['0'])))
+        page_size = url_queries.get('page-size')
+        if page_size is not None:
+            page_size = int(''.join(page_size))
         node_class = None
         if dn == root_cl:
             node_class = root_cl
             if node_class == 'uni':
+                # the instances of the target classes are the whole result
                 node_class = target_classes
+                query_target = 'self'
             dn = None
-        return dn, query_target, rsp_subtree, target_classes, node_class
+        return dn, query_target, rsp_subtree, target_classes, node_class, page, page_size
 
-    def _get_class(self, dn, cl, target, query_target='self'):
+    def _get_class(self, cl):
         """
-        Gets the configuration for the specified class instances based on
-        the dn, node class, target class, and query-target
+        Gets the positions of the instances of a class
 
-        :param dn: The distinguished name of the class
-        :param cl: The node class
-        :param target: The target class based on the target-subtree-class
-        :param query_target: The query-target class in the url
-        :return list of found objects
+        :param cl: The class name
+        :return: list of the positions of the objects in load order or\
+                 None if the class is unknown
         """
-        resp = []
-        if cl:
-            try:
-                lst = self._classes[cl]
-            except KeyError:
-                logging.error('Unknown class %s', cl)
-                return []
-            return [cl_obj for _, cl_obj in lst]
-        for _, lst in self._classes.iteritems():
-            if target and query_target != 'self':
-                lst = self._classes[target]
-            for tup in lst:
-                node_dn, node_cl = tup
-                valid_dn = (dn == node_dn)
-                if query_target == 'self' and valid_dn:
-                    resp.append(node_cl)
-                elif query_target == 'children':
-                    if self._is_child(node_dn, dn):
-                        resp.append(node_cl)
-                elif query_target == 'subtree':
-                    if self._is_subtree(node_dn, dn):
-                        resp.append(node_cl)
-            if target and resp:
-                return resp
-        return resp
+        instances = self._classes.get(cl)
+        if instances is None:
+            return None
+        return [position for _, position in instances]
 
-    def _rsp_subtree_data(self, db, rsp_subtree='no'):
+    def _get_dn(self, dn, target_cls=None, query_target='self'):
         """
-        Gets the configuration based on the rsp-subtree value
+        Gets the positions of the objects based on the dn, target
+        classes, and query-target
 
-        This function will copy the class objects and checks if
-        deleting subchildren is necessary.
+        :param dn: The distinguished name of the object
+        :param target_cls: Set of the target classes based on the\
+                           target-subtree-class or None for all classes
+        :param query_target: The query-target class in the url
+        :return: list of the positions of the found objects in load order
+        """
+        if dn is None:
+            return []
+        if query_target == 'self':
+            return list(self._dns.get(dn, []))
+        if query_target == 'children':
+            positions = self._children.get(dn, [])
+        elif query_target == 'subtree':
+            sorted_dns = self._get_sorted_dns()
+            first = bisect_left(sorted_dns, dn + '/')
+            last = bisect_left(sorted_dns, dn + '0', first)
+            positions = list(self._dns.get(dn, []))
+            for subtree_dn in sorted_dns[first:last]:
+                positions.extend(self._dns[subtree_dn])
+            positions.sort()
+        else:
+            return []
+        if target_cls is None:
+            return list(positions)
+        return [position for position in positions if self._objects[position][0] in target_cls]
 
-        :param db: The list of class objects to search
-        :rsp_subtree: The rsp-subtree value
-        :return: a list objects
+    def _get_sorted_dns(self):
         """
-        if rsp_subtree != 'full':
-            resp = []
-            for node in db:
-                node_cl, _ = next(node.iteritems())
-                # make a deep copy to avoid deleting other nodes
-                node_cl_copy = deepcopy(node[node_cl])
-                ret = {}
-                ret[node_cl] = {}
-                ret[node_cl]['attributes'] = node_cl_copy['attributes']
-                has_children = node_cl_copy.get('children')
-                #  check if the response asks for only direct children
-                if rsp_subtree == 'children' and has_children:
-                    ret[node_cl]['children'] = node_cl_copy['children']
-                    #  delete for subchildren
-                    self._delete_subchildren(ret[node_cl]['children'])
-                resp.append(ret)
-            return resp
-        return db
+        Get the sorted dns used to find the subtree of a dn.  The list is
+        sorted again after more objects are loaded.
 
-    @staticmethod
-    def _delete_subchildren(db):
+        :return: sorted list of the dns
         """
-        Deletes the children of the class object
+        if self._sorted_dns is None:
+            self._sorted_dns = sorted(self._dns)
+        return self._sorted_dns
 
-        :param db: The list of class objects
-        :return: None
+    def _rsp_subtree_data(self, positions, rsp_subtree='no'):
         """
-        for child in db:
-            _, contents = next(child.iteritems())
-            if contents.get('children'):
-                del contents['children']
+        Gets the configuration based on the rsp-subtree value
 
-    @staticmethod
-    def _is_child(child_dn, parent_dn):
-        """
-        Checks if the child dn is a direct child of the parent dn
-
-        :param child_dn: The child distinguished name
-        :param parent_dn: The parent distinguished name
-        :return: True or False. True if the child_dn is a child
-        """
-        if not child_dn.startswith(parent_dn):
-            return False
-        child_dn_parse = child_dn[len(parent_dn) + 1:]
-        # checks for a foward slash outside brackets (may be nested)
-        if '[' in child_dn_parse:
-            count = 0
-            for char in child_dn_parse:
-                if char == '[':
-                    count += 1
-                elif char == ']':
-                    count -= 1
-                elif char == '/' and not count:
-                    return False
-            return True
-        return '/' not in child_dn_parse and child_dn_parse
+        The objects are not copied.  Unless the full subtree is requested,
+        a new object containing the attributes and, if requested, the
+        direct children is returned for each object.
 
-    @staticmethod
-    def _is_subtree(child_dn, parent_dn):
+        :param positions: The positions of the class objects
+        :rsp_subtree: The rsp-subtree value
+        :return: a list objects
         """
-        Checks if child dn is a subtree of the parent dn
+        if rsp_subtree == 'full':
+            return [self._objects[position][1] for position in positions]
+        resp = []
+        for position in positions:
+            node_cl, node = self._objects[position]
+            contents = node[node_cl]
+            ret = {node_cl: {'attributes': contents['attributes']}}
+            #  check if the response asks for only direct children
+            if rsp_subtree == 'children':
+                children = []
+                for child_position in self._children.get(contents['attributes']['dn'], []):
+                    child_cl, child = self._objects[child_position]
+                    children.append({child_cl: {'attributes': child[child_cl]['attributes']}})
+                if children:
+                    ret[node_cl]['children'] = children
+            resp.append(ret)
+        return resp
 
-        :param child_dn: The child distinguished name
-        :param parent_dn: The parent distinguished name
-        :return: True or False. True if the child_dn is a subtree
-        """
-        if not child_dn.startswith(parent_dn):
-            return False
-        path_parse = child_dn[len(parent_dn):]
-        # the empty string means the two dn's are the same
-        # therefore it should be included as a subtree
-        return (not path_parse or path_parse[0] == '/')
+    @staticmethod
+    def _get_parent_dn(dn):
+        """
+        Get the parent dn of a distinguished name.  The forward slashes
+        inside brackets (may be nested) are part of the relative names.
+
+        :param dn: The distinguished name
+        :return: The parent distinguished name or None for a top level dn
+        """
+        count = 0
+        for index in range(len(dn) - 1, -1, -1):
+            char = dn[index]
+            if char == ']':
+                count += 1
+            elif char == '[':
+                count -= 1
+            elif char == '/' and not count:
+                return dn[:index]
+        return None
 
     def _fill_data(self, children, parent_dn):
         """
         Recursively fill in the distinguished name (dn) for the
-        configuration JSON files and sets the classes dictionary
+        configuration JSON files and sets the indexes
         to be used for searching for class objects
 
+        The objects are stored in load order as (class name, object)
+        tuples and are referenced by their positions in the indexes.
         The classes dict is a key: list(tuple()...) configuration
         The key is the class name (e.g. fvTenant)
-        The list contains a tuple of dn's and the class object itself
+        The list contains a tuple of dn's and the object position.
+        The dns dict contains the object positions of each dn and the
+        children dict the object positions of the children of each dn.
 
         :param children: Children of the parent node
         :param parent_dn: Parent dn to be passed on to their children
         :return: None
         """
         for child in children:
-            node_cl, contents = next(child.iteritems())
+            node_cl, contents = next(iter(child.items()))
             attributes = contents['attributes']
             if not attributes.get('dn'):
                 rn = attributes['rn']
                 attributes['dn'] = parent_dn + '/' + rn
-            tup = (attributes['dn'], child)
-            if not self._classes.get(node_cl):
-                self._classes[node_cl] = []
-            self._classes[node_cl].append(tup)
+            dn = attributes['dn']
+            position = len(self._objects)
+            self._objects.append((node_cl, child))
+            self._classes.setdefault(node_cl, []).append((dn, position))
+            if dn not in self._dns:
+                self._dns[dn] = []
+                self._sorted_dns = None
+            self._dns[dn].append(position)
+            self._children.setdefault(self._get_parent_dn(dn), []).append(position)
             if contents.get('children'):
-                self._fill_data(contents['children'], attributes['dn'])
+                self._fill_data(contents['children'], dn)
 
     def login(self, timeout=None):
         """
@@ -305,12 +362,14 @@ class FakeSession(Session):
         resp = FakeResponse()
         return resp
 
-    def subscribe(self, url):
+    def subscribe(self, url, only_new=False):
         """
         Subscribe to events for a particular URL.  Used internally by the
         class and instance subscriptions.
 
         :param url:  URL string to issue subscription
+        :param only_new: Boolean indicating whether to get all of the\
+                         objects or only the new events
         """
         pass
 
@@ -324,6 +383,15 @@ class FakeSession(Session):
         """
         return False
 
+    def get_event_count(self, url):
+        """
+        Check the number of subscription events for a particular APIC URL
+
+        :param url:  URL string belonging to subscription
+        :returns: Integer number of events in event queue
+        """
+        return 0
+
     def get_event(self, url):
         """
         Get an event for a particular URL.  Used internally by the
@@ -423,5 +491,7 @@ class FakeSession(Session):
             resp_data = [{}]
             resp = FakeResponse(data=resp_data)
         else:
-            resp = FakeResponse(self._get_config(url))
+            data, total_count = self._get_config(url)
+            resp = FakeResponse(data)
+            resp._data['totalCount'] = str(total_count)
         return resp
@@ -29,10 +29,14 @@
 ################################################################################
 """ACI Toolkit module for physical objects
 """
+from bisect import bisect_left
 import copy
 import logging
 from operator import attrgetter, itemgetter
 import re
+import threading
+
+from six.moves.queue import Queue, Empty
 
 from .acibaseobject import (
     BaseACIObject, BaseACIPhysModule, BaseACIPhysObject, BaseInterface
@@ -1433,24 +1437,32 @@ class Node(BaseACIPhysObject):
         if node_id:
             node_dn = 'topology/pod-{0}/node-{1}'.format(pod_id, node_id)
             base_url = '/api/mo/' + node_dn + '.json?'
-            working_data = WorkingData(session, Node, base_url)
-
+            node_working_data = [WorkingData(session, Node, base_url)]
+            bulk = False
         else:
-            class_url = '/api/node/class/fabricNode.json'
-            ret = session.get(class_url)
-            ret._content = ret._content.decode().replace('\n', '').encode()
-            data = ret.json()['imdata']
-            working_data = WorkingData()
-            for item in data:
-                if 'fabricNode' in item:
-                    if 'role' in item['fabricNode']['attributes']:
-                        if item['fabricNode']['attributes']['role'] in ['leaf', 'spine', 'controller']:
-                            node_dn = item['fabricNode']['attributes']['dn']
-                            base_url = '/api/mo/' + node_dn + '.json?'
-                            working_data.add(session, Node, base_url)
+            # get every APIC class once for the whole fabric instead of
+            # querying the subtree of each node
+            node_working_data = WorkingData.get_by_node(session, Node, ['fabricNodeHealth5min'])
+            bulk = True
 
-                            # base_url = '/api/mo/topology/pod-{0}.json?'.format(pod_id)
+        nodes = []
+        for working_data in node_working_data:
+            nodes.extend(cls._get_from_working_data(session, working_data, parent, node_id, bulk))
+        return nodes
 
+    @classmethod
+    def _get_from_working_data(cls, session, working_data, parent, node_id, bulk):
+        """
+        Build the Nodes from the fabricNode objects in the working data
+
+        :param session: APIC session
+        :param working_data: WorkingData containing the objects of the nodes
+        :param parent: optional parent object or pod_id
+        :param node_id: optional node_id of switch
+        :param bulk: True if the working data also contains the node health\
+                     so that it does not need to be queried for each node
+        :returns: list of Nodes
+        """
         nodes = []
         data = working_data.get_class('fabricNode')
         for apic_node in data:
@@ -1489,7 +1501,10 @@ class Node(BaseACIPhysObject):
                 if node_match and pod_match:
                     if node.role == 'leaf':
                         node._add_vpc_info(working_data)
-                    node.get_health()
+                    if bulk:
+                        node.get_health(working_data)
+                    else:
+                        node.get_health()
                     node.get_firmware(working_data)
 
                     if isinstance(parent, Pod):
@@ -1510,11 +1525,19 @@ class Node(BaseACIPhysObject):
                 if 'firmwareCardRunning' in data:
                     self.firmware = data['firmwareCardRunning']['attributes']['version']
 
-    def get_health(self):
+    def get_health(self, working_data=None):
         """
         This will get the health of the switch node
+
+        :param working_data: optional WorkingData containing the\
+                             fabricNodeHealth5min object of the node.\
+                             If not given, the health is queried from the APIC.
         """
-        if self.role != 'controller':
+        if self.role != 'controller' and working_data is not None:
+            data = working_data.get_object(self.dn + '/sys/CDfabricNodeHealth5min')
+            if data and 'fabricNodeHealth5min' in data:
+                self.health = data['fabricNodeHealth5min']['attributes']['healthLast']
+        elif self.role != 'controller':
             mo_query_url = '/api/mo/' + self.dn + \
                            '/sys.json?&rsp-subtree-include=stats&rsp-subtree-class=fabricNodeHealth5min'
             ret = self._session.get(mo_query_url)
@@ -1696,7 +1719,7 @@ class Node(BaseACIPhysObject):
         """
         return self.oper_st
 
-    def populate_children(self, deep=False, include_concrete=False):
+    def populate_children(self, deep=False, include_concrete=False, policy_lookup=None):
         """Will populate all of the children modules such as
         linecards, fantrays and powersupplies, of the node.
 
@@ -1704,6 +1727,8 @@ class Node(BaseACIPhysObject):
                      sub-tree to be populated. When false, only the
                      immediate children are populated
         :param include_concrete: boolean to indicate that concrete objects should also be populated
+        :param policy_lookup: optional PolicyLookup shared by the nodes to\
+                              resolve the EPGs and contexts of the concrete objects
 
         :returns: List of children objects
         """
@@ -1717,7 +1742,8 @@ class Node(BaseACIPhysObject):
             query_url = '/api/mo/topology/pod-' + self.pod + '/node-' + self.node + \
                         '/sys.json?'
 
-            working_data = WorkingData(session, Node, query_url, deep=True, include_concrete=True)
+            working_data = WorkingData(session, Node, query_url, deep=True, include_concrete=True,
+                                       policy_lookup=policy_lookup)
             for concrete_class in self._get_children_concrete_classes():
                 concrete_class.get(working_data, self)
 
@@ -1727,6 +1753,74 @@ class Node(BaseACIPhysObject):
 
         return self._children
 
+    @staticmethod
+    def populate_nodes(nodes, deep=False, include_concrete=False, max_workers=8, progress_callback=None,
+                       policy_lookup=None):
+        """Will populate the children of several nodes using a bounded
+        pool of worker threads so that the queries of the different
+        switches are sent concurrently.  The EPGs and contexts used by
+        the concrete objects are retrieved once for all of the nodes.
+
+        A node that fails to be populated does not stop the others.  The
+        error is logged and the node is left with the children that were
+        populated before the failure.
+
+        :param nodes: list of Node instances to populate
+        :param deep: boolean passed to populate_children of every node
+        :param include_concrete: boolean passed to populate_children of every node
+        :param max_workers: maximum number of nodes populated at the same time.\
+                            A value of 1 populates the nodes one after another\
+                            in the calling thread
+        :param progress_callback: optional function called after each node is\
+                                  populated with the node, the number of nodes\
+                                  completed, the total number of nodes and the\
+                                  exception raised or None
+        :param policy_lookup: optional PolicyLookup used to resolve the EPGs\
+                              and contexts.  One is created if not given
+        :returns: list of (node, exception) tuples of the nodes that failed
+        """
+        if include_concrete and policy_lookup is None and nodes:
+            # TODO: resolve circular dependency
+            from .aciConcreteLib import PolicyLookup
+            policy_lookup = PolicyLookup(nodes[0]._session)
+        node_queue = Queue()
+        for node in nodes:
+            node_queue.put(node)
+        lock = threading.Lock()
+        failures = []
+        completed = [0]
+
+        def worker():
+            while True:
+                try:
+                    node = node_queue.get_nowait()
+                except Empty:
+                    return
+                error = None
+                try:
+                    node.populate_children(deep=deep, include_concrete=include_concrete,
+                                           policy_lookup=policy_lookup)
+                except Exception as e:
+                    logging.error('Could not populate node %s: %s', node.node, e)
+                    error = e
+                with lock:
+                    completed[0] += 1
+                    if error is not None:
+                        failures.append((node, error))
+                    if progress_callback is not None:
+                        progress_callback(node, completed[0], len(nodes), error)
+
+        if max_workers <= 1 or len(nodes) <= 1:
+            worker()
+        else:
+            workers = [threading.Thread(target=worker) for _ in range(min(max_workers, len(nodes)))]
+            for thread in workers:
+                thread.daemon = True
+                thread.start()
+            for thread in workers:
+                thread.join()
+        return failures
+
     def get_chassis_type(self):
         """Returns the chassis type of this node.  The chassis
         type is derived from the model number.
@@ -2803,66 +2897,75 @@ class Interface(BaseInterface):
             return cls._parse_path_dn(dn)
 
     @staticmethod
-    def _get_discoveryprot_policies(session, prot):
-        """
-        :param prot: String containing either 'cdp' or 'lldp'
+    def _get_discoveryprot_policies(session):
         """
-        prot_policies = {}
-        if prot == 'cdp':
-            prot_class = 'cdpIfPol'
-        elif prot == 'lldp':
-            prot_class = 'lldpIfPol'
-        else:
-            raise ValueError
+        Get the CDP and LLDP interface policies with a single query
 
-        query_url = '/api/node/class/%s.json?query-target=self' % prot_class
+        :param session: the instance of Session used for APIC communication
+        :returns: dictionary indexed by 'cdp' and 'lldp' of dictionaries\
+                  containing the admin state of each policy name
+        """
+        prot_policies = {'cdp': {}, 'lldp': {}}
+        query_url = '/api/node/class/cdpIfPol,lldpIfPol.json?query-target=self'
         ret = session.get(query_url)
         prot_data = ret.json()['imdata']
         for policy in prot_data:
-            if ('%s' % prot_class) in policy:
-                attributes = policy['%s' % prot_class]['attributes']
-                if prot == 'cdp':
-                    prot_policies[attributes['name']] = attributes['adminSt']
-                else:
-                    prot_policies[attributes['name']] = attributes['adminTxSt']
+            if 'cdpIfPol' in policy:
+                attributes = policy['cdpIfPol']['attributes']
+                prot_policies['cdp'][attributes['name']] = attributes['adminSt']
+            elif 'lldpIfPol' in policy:
+                attributes = policy['lldpIfPol']['attributes']
+                prot_policies['lldp'][attributes['name']] = attributes['adminTxSt']
         return prot_policies
 
     @staticmethod
-    def _get_discoveryprot_relations(session, interfaces, prot, prot_policies):
-        if prot == 'cdp':
-            prot_relation_class = 'l1RsCdpIfPolCons'
-            prot_relation_dn_class = '/cdpIfP-'
-            prot_relation_dn = '/rscdpIfPolCons'
-        elif prot == 'lldp':
-            prot_relation_class = 'l1RsLldpIfPolCons'
-            prot_relation_dn_class = '/lldpIfP-'
-            prot_relation_dn = '/rslldpIfPolCons'
-        else:
-            raise ValueError
+    def _get_discoveryprot_relations(session, interfaces, prot_policies, query_url):
+        """
+        Enable or disable CDP and LLDP on the interfaces according to the
+        policies of their l1RsCdpIfPolCons and l1RsLldpIfPolCons relations
+
+        :param session: the instance of Session used for APIC communication
+        :param interfaces: list of interfaces
+        :param prot_policies: dictionary returned by _get_discoveryprot_policies
+        :param query_url: URL of the query returning the relations of the interfaces
+        :returns: list of interfaces
+        """
+        # index the interfaces by port so that each relation is applied
+        # with a single lookup
+        intf_by_port = {}
+        for intf in interfaces:
+            if isinstance(intf, Interface):
+                key = (intf.interface_type, intf.pod, intf.node, intf.module, intf.port)
+                intf_by_port.setdefault(key, intf)
 
-        query_url = ('/api/node/class/l1PhysIf.json?query-target=subtree&'
-                     'target-subtree-class=%s' % prot_relation_class)
         ret = session.get(query_url)
         prot_data = ret.json()['imdata']
         for prot_relation in prot_data:
-            if prot_relation_class in prot_relation:
-                attributes = prot_relation[prot_relation_class]['attributes']
-                policy_name = attributes['tDn'].split(prot_relation_dn_class)[1]
-                intf_dn = attributes['dn'].split(prot_relation_dn)[0]
-                search_intf = Interface(*Interface._parse_physical_dn(intf_dn))
-                for intf in interfaces:
-                    if intf == search_intf:
-                        if prot_policies[policy_name] == 'enabled':
-                            if prot == 'cdp':
-                                intf.enable_cdp()
-                            else:
-                                intf.enable_lldp()
-                        else:
-                            if prot == 'cdp':
-                                intf.disable_cdp()
-                            else:
-                                intf.disable_lldp()
-                        break
+            if 'l1RsCdpIfPolCons' in prot_relation:
+                prot = 'cdp'
+                attributes = prot_relation['l1RsCdpIfPolCons']['attributes']
+                policy_name = attributes['tDn'].split('/cdpIfP-')[1]
+                intf_dn = attributes['dn'].split('/rscdpIfPolCons')[0]
+            elif 'l1RsLldpIfPolCons' in prot_relation:
+                prot = 'lldp'
+                attributes = prot_relation['l1RsLldpIfPolCons']['attributes']
+                policy_name = attributes['tDn'].split('/lldpIfP-')[1]
+                intf_dn = attributes['dn'].split('/rslldpIfPolCons')[0]
+            else:
+                continue
+            intf = intf_by_port.get(Interface._parse_physical_dn(intf_dn))
+            if intf is None:
+                continue
+            if prot_policies[prot][policy_name] == 'enabled':
+                if prot == 'cdp':
+                    intf.enable_cdp()
+                else:
+                    intf.enable_lldp()
+            else:
+                if prot == 'cdp':
+                    intf.disable_cdp()
+                else:
+                    intf.disable_lldp()
         return interfaces
 
     @classmethod
@@ -2961,22 +3064,31 @@ class Interface(BaseInterface):
                 if not isinstance(pod_parent, cls._get_parent_class()):
                     raise TypeError('Interface parent must be a {0} object'.format(cls._get_parent_class()))
 
-        cdp_policies = Interface._get_discoveryprot_policies(session, 'cdp')
-        lldp_policies = Interface._get_discoveryprot_policies(session, 'lldp')
+        # TODO: resolve circular dependency
+        from .acitoolkit import _interface_from_dn
+
+        prot_policies = Interface._get_discoveryprot_policies(session)
 
+        prot_relation_classes = 'l1RsCdpIfPolCons,l1RsLldpIfPolCons'
         if port:
             dist_name = 'topology/pod-{0}/node-{1}/sys/phys-[eth{2}/{3}]'.format(pod_parent, node, module, port)
             interface_query_url = ('/api/mo/' + dist_name + '.json?query-target=self')
             eth_query_url = ('/api/mo/' + dist_name + '/phys.json?query-target=self')
+            prot_query_url = ('/api/mo/' + dist_name + '.json?query-target=children&'
+                              'target-subtree-class=' + prot_relation_classes)
         # add the case where we return all of the ports of a given node
         elif node:
             dist_name = 'topology/pod-1/node-{0}/sys'.format(node)
             interface_query_url = ('/api/mo/' + dist_name + '.json?query-target=children&target-subtree-class=l1PhysIf')
             eth_query_url = ('/api/mo/' + dist_name + '.json?query-target=subtree&target-subtree-class=ethpmPhysIf')
+            prot_query_url = ('/api/mo/' + dist_name + '.json?query-target=subtree&'
+                              'target-subtree-class=' + prot_relation_classes)
 
         else:
             interface_query_url = '/api/node/class/l1PhysIf.json?query-target=self'
             eth_query_url = '/api/node/class/ethpmPhysIf.json?query-target=self'
+            prot_query_url = ('/api/node/class/l1PhysIf.json?query-target=subtree&'
+                              'target-subtree-class=' + prot_relation_classes)
 
         ret = session.get(interface_query_url)
         interface_data = ret.json()['imdata']
@@ -3018,7 +3130,7 @@ class Interface(BaseInterface):
                     attributes['operSt'] = 'unknown'
                     attributes['operSpeed'] = 'unknown'
 
-                interface_obj = ACI._interface_from_dn(dist_name)
+                interface_obj = _interface_from_dn(dist_name)
                 for attribute in attributes:
                     interface_obj.attributes[attribute] = attributes[attribute]
                 interface_obj._session = session
@@ -3037,8 +3149,7 @@ class Interface(BaseInterface):
                 else:
                     resp.append(interface_obj)
 
-        resp = Interface._get_discoveryprot_relations(session, resp, 'cdp', cdp_policies)
-        resp = Interface._get_discoveryprot_relations(session, resp, 'lldp', lldp_policies)
+        resp = Interface._get_discoveryprot_relations(session, resp, prot_policies, prot_query_url)
         return resp
 
     def __str__(self):
@@ -3090,10 +3201,13 @@ class WorkingData(object):
     as a single object.
     """
 
-    def __init__(self, session=None, toolkit_class=None, url=None, deep=False, include_concrete=False):
+    def __init__(self, session=None, toolkit_class=None, url=None, deep=False, include_concrete=False,
+                 policy_lookup=None):
 
+        self.policy_lookup = policy_lookup
         self.by_class = {}
         self.by_dn = {}
+        self.by_class_dn = {}
         self.vnid_dict = {}
         self.ctx_dict = {}
         self.bd_dict = {}
@@ -3136,6 +3250,68 @@ class WorkingData(object):
 
                 self.build_vnid_dictionary()
 
+    @classmethod
+    def get_by_node(cls, session, toolkit_class, extra_apic_classes=(), page_size=10000,
+                    roles=('leaf', 'spine', 'controller')):
+        """
+        Get the objects of all of the nodes of the fabric with one
+        paginated class query per APIC class, instead of one subtree
+        query per node, and split them by node.
+
+        :param session: APIC session
+        :param toolkit_class: acitoolkit class whose APIC classes are retrieved
+        :param extra_apic_classes: list of additional APIC classes to retrieve
+        :param page_size: Integer containing the number of objects per page
+        :param roles: roles of the fabricNode objects to return
+        :returns: list of WorkingData, one for each fabricNode with one of the\
+                  given roles, in the order returned by the APIC
+        :raises: ValueError if a page could not be retrieved
+        """
+        # noinspection PyProtectedMember
+        apic_classes = toolkit_class._get_apic_classes() + list(extra_apic_classes)
+        by_node = {}
+        node_dns = []
+        for apic_class in apic_classes:
+            page_number = 0
+            while True:
+                # The pages only split a consistent list if the APIC sorts the objects
+                query_url = '/api/node/class/{0}.json?order-by={0}.dn&page={1}&page-size={2}'.format(apic_class,
+                                                                                                    page_number,
+                                                                                                    page_size)
+                ret = session.get(query_url)
+                if not ret.ok:
+                    logging.error('Could not get %s. Received response: %s', query_url, ret.text)
+                    raise ValueError('Could not get page %s of %s' % (page_number, apic_class))
+                # Same workaround as in add for the newlines in the APIC replies
+                ret._content = ret._content.decode().replace('\n', '').encode()
+                data = ret.json()
+                for item in data['imdata']:
+                    if apic_class not in item:
+                        continue
+                    attributes = item[apic_class]['attributes']
+                    node_dn = '/'.join(attributes['dn'].split('/', 3)[:3])
+                    if apic_class == 'fabricNode':
+                        if attributes.get('role') not in roles or node_dn in by_node:
+                            continue
+                        node_dns.append(node_dn)
+                        by_node[node_dn] = []
+                    if node_dn in by_node:
+                        by_node[node_dn].append(item)
+                page_number += 1
+                if len(data['imdata']) != page_size:
+                    break
+                if 'totalCount' in data and page_number * page_size >= int(data['totalCount']):
+                    break
+        result = []
+        for node_dn in node_dns:
+            working_data = cls()
+            working_data.session = session
+            working_data.rawjson = by_node[node_dn]
+            working_data._index_objects()
+            working_data.build_vnid_dictionary()
+            result.append(working_data)
+        return result
+
     def _index_objects(self):
         """
         Will index the json by dn and by class for easy reference
@@ -3168,6 +3344,20 @@ class WorkingData(object):
 
                     else:
                         self.by_class[apic_class].append(item)
+        for apic_class in set(apic_class for item in self.rawjson for apic_class in item):
+            if apic_class in self.by_class:
+                self._index_class_dns(apic_class)
+
+    def _index_class_dns(self, class_name):
+        """
+        Will index the objects of a class by sorted dn so that the objects
+        under a dn can be found with a binary search
+        :param class_name: name of the class to index
+        """
+        records = self.by_class[class_name]
+        dns = [record[class_name]['attributes']['dn'] for record in records]
+        positions = sorted(range(len(dns)), key=dns.__getitem__)
+        self.by_class_dn[class_name] = ([dns[position] for position in positions], positions)
 
     def get_class(self, class_name):
         """
@@ -3188,16 +3378,15 @@ class WorkingData(object):
         :param class_name: name of class you are looking for
         :param dname: Distinguished Name (dn)
         """
-        result = []
-
-        classes = self.get_class(class_name)
-        if classes:
-            for class_record in classes:
-                for class_id in class_record:
-                    obj_dn = class_record[class_id]['attributes']['dn']
-                    if obj_dn.startswith(dname + '/'):
-                        result.append(class_record)
-        return result
+        if class_name not in self.by_class_dn:
+            return []
+        dns, positions = self.by_class_dn[class_name]
+        # every dn starting with dname + '/' sorts between dname + '/' and
+        # dname + '0' since '0' is the character following '/'
+        first = bisect_left(dns, dname + '/')
+        last = bisect_left(dns, dname + '0', first)
+        records = self.by_class[class_name]
+        return [records[position] for position in sorted(positions[first:last])]
 
     def get_object(self, dname):
         """
@@ -3489,17 +3678,49 @@ class PhysicalModel(BaseACIObject):
         physical_model = PhysicalModel(session=session, parent=parent)
         return [physical_model]
 
+    def populate_children(self, deep=False, include_concrete=False, max_workers=8, progress_callback=None):
+        """
+        Populates the pods and, if deep is True, the entire tree under them.
+        The nodes are populated concurrently by Node.populate_nodes.
+
+        :param deep: True or False.  Default is False.
+        :param include_concrete: True or False. Default is False
+        :param max_workers: maximum number of nodes populated at the same time
+        :param progress_callback: optional function called after each node is\
+                                  populated.  See Node.populate_nodes
+        :returns: list of children objects
+        """
+        for child_class in self._get_children_classes():
+            child_class.get(self._session, self)
+
+        if deep:
+            nodes = []
+            for pod in self._children:
+                pod.populate_children()
+                for child in pod.get_children():
+                    if isinstance(child, Node):
+                        nodes.append(child)
+                    else:
+                        child.populate_children(deep, include_concrete)
+            Node.populate_nodes(nodes, deep, include_concrete, max_workers, progress_callback)
+
+        return self._children
+
     @classmethod
-    def get_deep(cls, session, include_concrete=False):
+    def get_deep(cls, session, include_concrete=False, max_workers=8, progress_callback=None):
         """
         Will return the atk object and the entire tree under it.
         :param session: APIC session to use
         :param include_concrete: flag to indicate that concrete objects should also be included
+        :param max_workers: maximum number of nodes populated at the same time
+        :param progress_callback: optional function called after each node is\
+                                  populated.  See Node.populate_nodes
         :return:
         """
-        atk_objects = cls(session)
+        atk_objects = cls.get(session)
         for atk_object in atk_objects:
-            atk_object.populate_children(deep=True, include_concrete=include_concrete)
+            atk_object.populate_children(deep=True, include_concrete=include_concrete,
+                                         max_workers=max_workers, progress_callback=progress_callback)
         return atk_objects
 
 
@@ -3575,16 +3796,44 @@ class Fabric(BaseACIObject):
         fabric.name = 'Fabric'
         return [fabric]
 
+    def populate_children(self, deep=False, include_concrete=False, max_workers=8, progress_callback=None):
+        """
+        Populates the physical and logical models and, if deep is True,
+        the entire tree under them.
+
+        :param deep: True or False.  Default is False.
+        :param include_concrete: True or False. Default is False
+        :param max_workers: maximum number of nodes populated at the same time
+        :param progress_callback: optional function called after each node is\
+                                  populated.  See Node.populate_nodes
+        :returns: list of children objects
+        """
+        for child_class in self._get_children_classes():
+            child_class.get(self._session, self)
+
+        if deep:
+            for child in self._children:
+                if isinstance(child, PhysicalModel):
+                    child.populate_children(deep, include_concrete, max_workers, progress_callback)
+                else:
+                    child.populate_children(deep, include_concrete)
+
+        return self._children
+
     @classmethod
-    def get_deep(cls, session, include_concrete=False):
+    def get_deep(cls, session, include_concrete=False, max_workers=8, progress_callback=None):
         """
         Will return the entire tree of the fabric.
         :param session: APIC session to use
         :param include_concrete: flag to indicate that concrete objects should also be included
+        :param max_workers: maximum number of nodes populated at the same time
+        :param progress_callback: optional function called after each node is\
+                                  populated.  See Node.populate_nodes
         :return:
         """
         fabrics = cls.get(session)
-        fabrics[0].populate_children(deep=True, include_concrete=include_concrete)
+        fabrics[0].populate_children(deep=True, include_concrete=include_concrete,
+                                     max_workers=max_workers, progress_callback=progress_callback)
         return fabrics
 
     @staticmethod
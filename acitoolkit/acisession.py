@@ -51,7 +51,8 @@ try:
     from requests.packages.urllib3.exceptions import InsecureRequestWarning
 except ImportError:
     pass
-from six.moves.queue import Queue
+import six
+from six.moves.queue import Queue, Empty
 from websocket import create_connection, WebSocketException
 from requests.exceptions import ConnectionError
 try:
@@ -313,26 +314,68 @@ class Subscriber(threading.Thread):
             return
 
         while not self._event_q.empty():
-            event = self._event_q.get()
-            orig_event = event
+            self._sort_event(self._event_q.get())
+
+    def _sort_event(self, event):
+        """
+        Put a single event into the bucket of the URL that it was
+        subscribed with.
+
+        :param event: String containing the JSON event
+        """
+        orig_event = event
+        try:
+            event = json.loads(event)
+        except ValueError:
+            logging.error('Non-JSON event: %s', orig_event)
+            return
+        # Find the URL for this event
+        num_subscriptions = len(event['subscriptionId'])
+        for i in range(0, num_subscriptions):
+            url = None
+            for k in self._subscriptions:
+                if self._subscriptions[k] == str(event['subscriptionId'][i]):
+                    url = k
+                    break
+            if url not in self._events:
+                self._events[url] = []
+            self._events[url].append(event)
+            if num_subscriptions > 1:
+                event = copy.deepcopy(event)
+
+    def wait_for_events(self, timeout=None):
+        """
+        Block until an event is received for any subscription or until
+        the timeout expires.
+
+        Events that do not match any of the subscriptions do not count.
+
+        :param timeout: Optional number of seconds to wait. None waits forever.
+        :returns: True if events are pending. False if the timeout expired.
+        """
+        if timeout is not None:
+            deadline = time.time() + timeout
+        while not self._has_subscribed_events():
+            if timeout is not None:
+                timeout = max(0, deadline - time.time())
             try:
-                event = json.loads(event)
-            except ValueError:
-                logging.error('Non-JSON event: %s', orig_event)
-                continue
-            # Find the URL for this event
-            num_subscriptions = len(event['subscriptionId'])
-            for i in range(0, num_subscriptions):
-                url = None
-                for k in self._subscriptions:
-                    if self._subscriptions[k] == str(event['subscriptionId'][i]):
-                        url = k
-                        break
-                if url not in self._events:
-                    self._events[url] = []
-                self._events[url].append(event)
-                if num_subscriptions > 1:
-                    event = copy.deepcopy(event)
+                event = self._event_q.get(timeout=timeout)
+            except Empty:
+                return False
+            self._sort_event(event)
+            self._process_event_q()
+        return True
+
+    def _has_subscribed_events(self):
+        """
+        Check if any of the subscribed URLs has pending events
+
+        :returns: True or False
+        """
+        for url in self._subscriptions:
+            if self._events.get(url):
+                return True
+        return False
 
     def subscribe(self, url, only_new=False):
         """
@@ -732,6 +775,17 @@ class Session(object):
         """
         return self.subscription_thread.has_events(url)
 
+    def wait_for_events(self, timeout=None):
+        """
+        Block until an event is received for any subscription or until
+        the timeout expires.  Allows applications to consume events
+        without polling has_events in a loop.
+
+        :param timeout: Optional number of seconds to wait. None waits forever.
+        :returns: True if events are pending. False if the timeout expired.
+        """
+        return self.subscription_thread.wait_for_events(timeout)
+
     def get_event_count(self, url):
         """
         Check the number of subscription events for a particular APIC URL
@@ -762,22 +816,28 @@ class Session(object):
         if self._subscription_enabled:
             self.subscription_thread.unsubscribe(url)
 
-    def push_to_apic(self, url, data, timeout=None):
+    def push_to_apic(self, url, data, timeout=None, sort_keys=True):
         """
         Push the object data to the APIC
 
         :param url: String containing the URL that will be used to\
                     send the object data to the APIC.
         :param data: Dictionary containing the JSON objects to be sent\
-                     to the APIC.
+                     to the APIC or string containing the JSON already\
+                     serialized, i.e. by BaseACIObject.write_json.
+        :param sort_keys: Boolean indicating whether the keys of the data\
+                          dictionary are sorted when serialized. Sorting\
+                          is only needed when a stable payload is wanted.\
+                          Default is True.
         :returns: Response class instance from the requests library.\
                   response.ok is True if request is sent successfully.
         """
         post_url = self.api + url
         logging.debug('Posting url: %s data: %s', post_url, data)
 
+        if not isinstance(data, six.string_types):
+            data = json.dumps(data, sort_keys=sort_keys)
         if self.cert_auth and not (self.appcenter_user and self._subscription_enabled and self._logged_in):
-            data = json.dumps(data, sort_keys=True)
             cookies = self._prep_x509_header('POST', url, data)
             resp = self.session.post(post_url, data=data, verify=self.verify_ssl,
                                      timeout=timeout, proxies=self._proxies, cookies=cookies)
@@ -785,7 +845,7 @@ class Session(object):
                 logging.error('Certificate authentication failed. Please check all settings are correct.')
                 resp.raise_for_status()
         else:
-            resp = self.session.post(post_url, data=json.dumps(data, sort_keys=True), verify=self.verify_ssl,
+            resp = self.session.post(post_url, data=data, verify=self.verify_ssl,
                                      timeout=timeout, proxies=self._proxies)
             if resp.status_code == 403:
                 logging.error(resp.text)
@@ -794,7 +854,7 @@ class Session(object):
                 self.resubscribe()
                 logging.error('Trying post again...')
                 logging.debug(post_url)
-                resp = self.session.post(post_url, data=json.dumps(data, sort_keys=True), verify=self.verify_ssl,
+                resp = self.session.post(post_url, data=data, verify=self.verify_ssl,
                                          timeout=timeout, proxies=self._proxies)
         logging.debug('Response: %s %s', resp, resp.text)
         return resp
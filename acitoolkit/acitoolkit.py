@@ -100,16 +100,17 @@ class Tenant(BaseACIObject):
         return super(Tenant, self).get_json(self._get_apic_classes()[0],
                                             attributes=attr)
 
-    def push_to_apic(self, session):
+    def push_to_apic(self, session, sort_keys=True):
         """
         Push the appropriate configuration to the APIC for this Tenant.
         All of the subobject configuration will also be pushed.
 
         :param session: the instance of Session used for APIC communication
+        :param sort_keys: Boolean indicating whether the keys of the JSON are sorted. Default is True.
         :returns: Requests Response code
         """
         resp = session.push_to_apic(self.get_url(),
-                                    self.get_json())
+                                    self.write_json(sort_keys=sort_keys))
         return resp
 
     @classmethod
@@ -167,6 +168,7 @@ class Tenant(BaseACIObject):
         query = urlencode(params)
         objs = []
         full_data = []
+        obj_dict = {}
         if parent is None:
             parent = Fabric()
         for name in names:
@@ -193,9 +195,9 @@ class Tenant(BaseACIObject):
                 if obj is not None:
                     objs.append(obj)
                     resp.append(obj)
+                    build_object_dictionary([obj], obj_dict)
                 else:
                     print(name, 'resulted in a null object')
-        obj_dict = build_object_dictionary(objs)
         for obj in objs:
             obj._extract_relationships(full_data, obj_dict)
         return resp
@@ -7410,24 +7412,25 @@ class LogicalModel(BaseACIObject):
         return results
 
 
-def build_object_dictionary(objs):
+def build_object_dictionary(objs, result=None):
     """
     Will build a dictionary indexed by object class that contains all the objects of that class
 
-    :param objs:
-    :return:
+    The object trees are walked iteratively so that deep trees do not hit the
+    recursion limit and each object is added once to the set of its class.
+
+    :param objs: list of objects whose trees are to be indexed
+    :param result: optional dictionary to add the objects to. Default is a new dictionary
+    :return: dictionary of sets of objects indexed by class
     """
-    result = {}
-    for obj in objs:
+    if result is None:
+        result = {}
+    pending = list(objs)
+    while pending:
+        obj = pending.pop()
         obj_class = obj.__class__
         if obj_class not in result:
             result[obj_class] = set()
-
         result[obj_class].add(obj)
-        children = obj.get_children()
-        children_result = build_object_dictionary(children)
-        for child_class in children_result:
-            if child_class not in result:
-                result[child_class] = set()
-            result[child_class] = result[child_class] | children_result[child_class]
+        pending.extend(obj.get_children())
     return result
@@ -0,0 +1,357 @@
+"""
+Benchmark of the toolkit and application entry points against the Fake APIC.
+
+The benchmark loads snapshot files, by default the files of a synthetic
+fabric written by the fabric generator, into a FakeSession and times the
+main entry points against it.  For every entry point it reports the
+number of objects processed, the best duration of the repetitions, the
+throughput and, where tracemalloc is available, the peak memory.  The
+results can be saved and compared with a previous run to find
+performance regressions without a real APIC.
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+import argparse
+import importlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from acitoolkit import Endpoint, FakeSession, FaultStore, Interface, Node, Tenant
+from fabricgenerator import FabricGenerator, add_size_arguments, get_size
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+APPLICATIONS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BenchmarkResult = namedtuple('BenchmarkResult', ('name', 'count', 'duration', 'peak_memory', 'error'))
+
+
+def _import_application(directory, module_name):
+    """
+    Import the module of one of the other applications
+
+    :param directory: String containing the directory of the application
+    :param module_name: String containing the name of the module
+    :return: module
+    """
+    path = os.path.join(APPLICATIONS_DIR, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return importlib.import_module(module_name)
+
+
+@contextmanager
+def _temporary_directory():
+    """
+    Run in a temporary working directory for the entry points that write
+    files into the current directory
+    """
+    cwd = os.getcwd()
+    directory = tempfile.mkdtemp()
+    os.chdir(directory)
+    try:
+        yield directory
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+
+
+def _count_objects(roots):
+    """
+    Count the objects of toolkit object trees
+
+    :param roots: list of the root objects
+    :return: Integer containing the number of objects
+    """
+    count = 0
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        count += 1
+        stack.extend(obj.get_children())
+    return count
+
+
+class Benchmark(object):
+    """
+    Times the entry points against the snapshot files.
+
+    Each case is prepared by a _prepare_<case> method that receives the
+    FakeSession and returns the function to time.  The function returns
+    the number of objects it processed.  The preparation is not timed.
+    """
+    CASES = ('load', 'tenant_get_deep', 'endpoint_get', 'node_get', 'interface_get',
+             'fault_replay', 'acilint', 'search_index', 'configdb_snapshot')
+
+    def __init__(self, filenames, repeat=3, measure_memory=True):
+        """
+        :param filenames: list of the snapshot filenames
+        :param repeat: Integer containing the number of timed runs of each case
+        :param measure_memory: Boolean indicating whether to measure the peak\
+                               memory of each case with an additional run
+        """
+        self.filenames = filenames
+        self.repeat = repeat
+        self.measure_memory = measure_memory and tracemalloc is not None
+        self._session = None
+
+    @property
+    def session(self):
+        """
+        FakeSession with the snapshot files loaded, shared by the cases
+        """
+        if self._session is None:
+            self._session = FakeSession(self.filenames)
+        return self._session
+
+    def _prepare_load(self, session):
+        def run():
+            return len(FakeSession(self.filenames)._objects)
+        return run
+
+    @staticmethod
+    def _prepare_tenant_get_deep(session):
+        def run():
+            return _count_objects(Tenant.get_deep(session))
+        return run
+
+    @staticmethod
+    def _prepare_endpoint_get(session):
+        def run():
+            return len(Endpoint.get(session))
+        return run
+
+    @staticmethod
+    def _prepare_node_get(session):
+        def run():
+            return len(Node.get(session))
+        return run
+
+    @staticmethod
+    def _prepare_interface_get(session):
+        def run():
+            return len(Interface.get(session))
+        return run
+
+    @staticmethod
+    def _prepare_fault_replay(session):
+        epgs = session.get('/api/node/class/fvAEPg.json').json()['imdata']
+        dns = [epg['fvAEPg']['attributes']['dn'] + '/fault-F0467' for epg in epgs]
+        severities = ('critical', 'major', 'minor', 'warning')
+        events = []
+        for index, dn in enumerate(dns):
+            events.append({'imdata': [{'faultInst': {'attributes': {
+                'dn': dn, 'severity': severities[index % 4], 'domain': 'tenant', 'type': 'config',
+                'lc': 'soaking', 'code': 'F0467', 'status': 'created'}}}]})
+        for attributes in ({'lc': 'raised'}, {'lc': 'retaining', 'severity': 'cleared'}, {'status': 'deleted'}):
+            for dn in dns:
+                event_attributes = {'dn': dn, 'status': 'modified'}
+                event_attributes.update(attributes)
+                events.append({'imdata': [{'faultInst': {'attributes': event_attributes}}]})
+
+        def run():
+            store = FaultStore()
+            for event in events:
+                store.add_event(event)
+            return len(events)
+        return run
+
+    @staticmethod
+    def _prepare_acilint(session):
+        acilint = _import_application('lint', 'acilint')
+        methods = [method for method in dir(acilint.Checker)
+                   if method.startswith(('warning_', 'error_', 'critical_'))]
+
+        def run():
+            with open(os.devnull, 'w') as devnull:
+                checker = acilint.Checker(session, 'html', devnull)
+                checker.execute(methods)
+            return _count_objects(checker.tenants)
+        return run
+
+    @staticmethod
+    def _prepare_search_index(session):
+        aciSearchDb = _import_application('search', 'aciSearchDb')
+        root = Tenant.get_deep(session)[0].get_parent()
+
+        def run():
+            with _temporary_directory():
+                index = aciSearchDb.SearchIndexLookup()
+                index.add_atk_objects(root)
+                store = aciSearchDb.SearchObjectStore()
+                store.add_atk_objects(root)
+            return len(store.object_directory)
+        return run
+
+    @staticmethod
+    def _prepare_configdb_snapshot(session):
+        aciconfigdb = _import_application('snapback', 'aciconfigdb')
+
+        def run():
+            with _temporary_directory():
+                cdb = aciconfigdb.ConfigDB()
+                cdb.session = session
+                cdb.take_snapshot()
+                return len([filename for filename in os.listdir(cdb.repo_dir) if filename.endswith('.json')])
+        return run
+
+    def _run_case(self, name):
+        """
+        Run a case
+
+        :param name: String containing the name of the case
+        :return: BenchmarkResult instance
+        """
+        stdout = sys.stdout
+        try:
+            with open(os.devnull, 'w') as devnull:
+                # the entry points print their progress
+                sys.stdout = devnull
+                func = getattr(self, '_prepare_' + name)(self.session)
+                durations = []
+                for repetition in range(max(1, self.repeat)):
+                    start = time.time()
+                    count = func()
+                    durations.append(time.time() - start)
+                peak_memory = None
+                if self.measure_memory:
+                    tracemalloc.start()
+                    try:
+                        func()
+                        peak_memory = tracemalloc.get_traced_memory()[1]
+                    finally:
+                        tracemalloc.stop()
+        except Exception as e:
+            logging.exception('Benchmark %s failed', name)
+            return BenchmarkResult(name, None, None, None, '%s: %s' % (e.__class__.__name__, e))
+        finally:
+            sys.stdout = stdout
+        return BenchmarkResult(name, count, min(durations), peak_memory, None)
+
+    def run(self, cases=None):
+        """
+        Run the cases
+
+        :param cases: list of the names of the cases to run. All of the cases are run if not specified
+        :return: list of BenchmarkResult instances
+        """
+        if cases is None:
+            cases = self.CASES
+        for name in cases:
+            if name not in self.CASES:
+                raise ValueError('Unknown benchmark %s' % name)
+        return [self._run_case(name) for name in cases]
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compare the durations of the results with a baseline
+
+    :param results: list of BenchmarkResult instances
+    :param baseline: Dictionary of the baseline durations indexed by case name
+    :param threshold: Float containing the relative slowdown reported as a regression
+    :return: Dictionary of the duration ratios indexed by case name and the\
+             list of the names of the regressed cases
+    """
+    ratios = {}
+    regressions = []
+    for result in results:
+        if result.duration is None or not baseline.get(result.name):
+            continue
+        ratio = result.duration / baseline[result.name]
+        ratios[result.name] = ratio
+        if ratio > 1 + threshold:
+            regressions.append(result.name)
+    return ratios, regressions
+
+
+def print_results(results, ratios=None):
+    """
+    Print the results as a table
+
+    :param results: list of BenchmarkResult instances
+    :param ratios: Optional dictionary of the duration ratios with the baseline
+    """
+    ratios = ratios or {}
+    template = '{0:20} {1:>10} {2:>10} {3:>12} {4:>10} {5:>10}'
+    print(template.format('Benchmark', 'Objects', 'Seconds', 'Objects/s', 'Peak MB', 'Baseline'))
+    print(template.format('-' * 20, '-' * 10, '-' * 10, '-' * 12, '-' * 10, '-' * 10))
+    for result in results:
+        if result.error is not None:
+            print('{0:20} {1}'.format(result.name, result.error))
+            continue
+        throughput = result.count / result.duration if result.duration else 0
+        peak_memory = 'n/a' if result.peak_memory is None else '%.1f' % (result.peak_memory / 1048576.0)
+        ratio = '%.2fx' % ratios[result.name] if result.name in ratios else ''
+        print(template.format(result.name, result.count, '%.3f' % result.duration,
+                              '%.0f' % throughput, peak_memory, ratio))
+
+
+def main():
+    """
+    Main execution routine
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the acitoolkit entry points against snapshot '
+                                                 'files of a synthetic or real fabric.')
+    parser.add_argument('--directory', default=None,
+                        help='Directory containing the snapshot files. A synthetic fabric is generated '
+                             'if not specified.')
+    add_size_arguments(parser)
+    parser.add_argument('--cases', nargs='+', choices=Benchmark.CASES, default=None,
+                        help='Benchmarks to run. All of the benchmarks are run if not specified.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs of each benchmark')
+    parser.add_argument('--nomemory', action='store_true', default=False,
+                        help='Do not measure the peak memory')
+    parser.add_argument('--output', default=None, help='File where the results are saved as JSON')
+    parser.add_argument('--baseline', default=None, help='File of saved results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative slowdown compared with the baseline reported as a regression')
+    parser.add_argument('--debug', action='store_true', default=False, help='Enable debug messages.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.CRITICAL)
+
+    directory = args.directory
+    generated_directory = None
+    if directory is None:
+        size = get_size(args)
+        generated_directory = directory = tempfile.mkdtemp()
+        print('Generating %s' % str(size))
+        FabricGenerator(size).write(directory)
+    filenames = sorted(os.path.join(directory, filename) for filename in os.listdir(directory)
+                       if filename.endswith('.json'))
+
+    try:
+        benchmark = Benchmark(filenames, repeat=args.repeat, measure_memory=not args.nomemory)
+        results = benchmark.run(args.cases)
+    finally:
+        if generated_directory is not None:
+            shutil.rmtree(generated_directory)
+
+    ratios, regressions = {}, []
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        baseline_durations = dict((result['name'], result['duration']) for result in baseline['results'])
+        ratios, regressions = compare(results, baseline_durations, args.threshold)
+    print_results(results, ratios)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'python': sys.version.split()[0],
+                       'files': len(filenames),
+                       'results': [result._asdict() for result in results]}, output_file, indent=4)
+    if regressions:
+        print('Regressions: %s' % ', '.join(regressions))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
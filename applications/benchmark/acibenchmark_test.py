@@ -0,0 +1,145 @@
+"""
+Test cases for the synthetic fabric generator and the benchmark runner
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from acitoolkit import AppProfile, EPG, Endpoint, FakeSession, Node, Tenant
+from acibenchmark import Benchmark, BenchmarkResult, compare
+from fabricgenerator import FabricGenerator, FabricSize, SIZES
+
+SIZE = FabricSize(tenants=3, apps=2, epgs=5, contracts=2, endpoints=4, switches=3, ports=8)
+
+
+class TestFabricGenerator(unittest.TestCase):
+    """
+    Test the snapshot files of the synthetic fabric
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filenames = FabricGenerator(SIZE).write(os.path.join(self.tmp_dir, 'fabric'))
+        self.session = FakeSession(self.filenames)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _count(self, apic_class):
+        return len(self.session.get('/api/node/class/%s.json' % apic_class).json()['imdata'])
+
+    def test_deterministic(self):
+        """
+        Test that the same sizes always produce the same files
+        """
+        filenames = FabricGenerator(SIZE).write(os.path.join(self.tmp_dir, 'again'))
+        self.assertEqual([os.path.basename(filename) for filename in filenames],
+                         [os.path.basename(filename) for filename in self.filenames])
+        for filename, other_filename in zip(self.filenames, filenames):
+            with open(filename) as snapshot_file, open(other_filename) as other_file:
+                self.assertEqual(snapshot_file.read(), other_file.read())
+
+    def test_sizes(self):
+        """
+        Test the number of objects of each class
+        """
+        self.assertEqual(len(self.filenames), SIZE.tenants + 1)
+        self.assertEqual(self._count('fvTenant'), SIZE.tenants)
+        self.assertEqual(self._count('fvAp'), SIZE.tenants * SIZE.apps)
+        self.assertEqual(self._count('fvAEPg'), SIZE.tenants * SIZE.epgs)
+        self.assertEqual(self._count('vzBrCP'), SIZE.tenants * SIZE.contracts)
+        self.assertEqual(self._count('fvCEp'), SIZE.tenants * SIZE.epgs * SIZE.endpoints)
+        self.assertEqual(self._count('l1PhysIf'), SIZE.switches * SIZE.ports)
+        self.assertEqual(self._count('fabricNode'), SIZE.switches + 2)
+        macs = set(endpoint['fvCEp']['attributes']['mac']
+                   for endpoint in self.session.get('/api/node/class/fvCEp.json').json()['imdata'])
+        self.assertEqual(len(macs), SIZE.tenants * SIZE.epgs * SIZE.endpoints)
+
+    def test_toolkit_objects(self):
+        """
+        Test that the toolkit objects and their relations are built from the snapshot
+        """
+        tenants = Tenant.get_deep(self.session)
+        self.assertEqual(len(tenants), SIZE.tenants)
+        epgs = [epg for app in tenants[1].get_children(AppProfile) for epg in app.get_children(EPG)]
+        self.assertEqual(len(epgs), SIZE.epgs)
+        epg = epgs[3]
+        self.assertEqual(epg.name, 'epg3')
+        self.assertEqual(epg.get_bd().name, 'bd3')
+        self.assertEqual(epg.get_bd().get_context().name, 'ctx1')
+        self.assertEqual([contract.name for contract in epg.get_all_provided()], ['contract1'])
+        self.assertEqual([contract.name for contract in epg.get_all_consumed()], ['contract0'])
+
+        endpoints = Endpoint.get(self.session)
+        self.assertEqual(len(endpoints), SIZE.tenants * SIZE.epgs * SIZE.endpoints)
+        self.assertTrue(all(endpoint.if_name.startswith('eth 1/10') for endpoint in endpoints))
+        self.assertEqual(len([node for node in Node.get(self.session) if node.role == 'leaf']), SIZE.switches)
+
+    def test_presets(self):
+        """
+        Test that the preset sizes are ordered
+        """
+        for field in ('tenants', 'epgs', 'switches'):
+            self.assertLess(getattr(SIZES['small'], field), getattr(SIZES['large'], field))
+
+
+class TestBenchmark(unittest.TestCase):
+    """
+    Test the benchmark runner
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filenames = FabricGenerator(SIZES['tiny']).write(self.tmp_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_run(self):
+        """
+        Test running the toolkit benchmarks
+        """
+        cases = ['load', 'tenant_get_deep', 'endpoint_get', 'node_get', 'interface_get', 'fault_replay']
+        results = Benchmark(self.filenames, repeat=2).run(cases)
+        self.assertEqual([result.name for result in results], cases)
+        for result in results:
+            self.assertIsNone(result.error)
+            self.assertGreater(result.count, 0)
+            self.assertGreaterEqual(result.duration, 0)
+        size = SIZES['tiny']
+        self.assertEqual(results[2].count, size.tenants * size.epgs * size.endpoints)
+        self.assertEqual(results[4].count, size.switches * size.ports)
+        self.assertEqual(results[5].count, size.tenants * size.epgs * 4)
+
+    def test_unknown_case(self):
+        """
+        Test that an unknown benchmark is rejected
+        """
+        self.assertRaises(ValueError, Benchmark(self.filenames).run, ['unknown'])
+
+    def test_failure(self):
+        """
+        Test that a failing benchmark is reported without stopping the others
+        """
+        benchmark = Benchmark(self.filenames, repeat=1)
+
+        def fail(session):
+            raise ImportError('missing')
+        benchmark._prepare_node_get = fail
+        results = benchmark.run(['node_get', 'endpoint_get'])
+        self.assertEqual(results[0].error, 'ImportError: missing')
+        self.assertIsNone(results[1].error)
+
+    def test_compare(self):
+        """
+        Test finding the regressions compared with a baseline
+        """
+        results = [BenchmarkResult('load', 10, 1.0, None, None),
+                   BenchmarkResult('node_get', 10, 2.5, None, None),
+                   BenchmarkResult('acilint', None, None, None, 'ImportError: missing')]
+        ratios, regressions = compare(results, {'load': 1.0, 'node_get': 2.0, 'acilint': 1.0}, threshold=0.1)
+        self.assertEqual(ratios, {'load': 1.0, 'node_get': 1.25})
+        self.assertEqual(regressions, ['node_get'])
+
+
+if __name__ == '__main__':
+    unittest.main()
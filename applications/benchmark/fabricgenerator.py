@@ -0,0 +1,311 @@
+"""
+Generator of synthetic fabric snapshots for the Fake APIC.
+
+The snapshots contain the tenant configuration, the learned endpoints
+and the switches and ports of a fabric of a configurable size.  They
+are written as one JSON file per tenant and one file for the topology,
+in the same format as the snapback configuration snapshots, and can be
+loaded by FakeSession.  The content only depends on the sizes so the
+same sizes always produce the same files.
+"""
+from collections import namedtuple
+import argparse
+import json
+import os
+
+FabricSize = namedtuple('FabricSize', ('tenants', 'apps', 'epgs', 'contracts', 'endpoints',
+                                       'switches', 'ports'))
+
+# apps, epgs and contracts are per tenant, endpoints per EPG and ports per switch
+SIZES = {
+    'tiny': FabricSize(tenants=2, apps=1, epgs=2, contracts=1, endpoints=2, switches=2, ports=4),
+    'small': FabricSize(tenants=10, apps=2, epgs=10, contracts=5, endpoints=10, switches=10, ports=48),
+    'medium': FabricSize(tenants=50, apps=4, epgs=50, contracts=20, endpoints=10, switches=40, ports=48),
+    'large': FabricSize(tenants=200, apps=5, epgs=100, contracts=50, endpoints=10, switches=200, ports=48),
+}
+
+
+class FabricGenerator(object):
+    """
+    Generates the snapshot files of a fabric.
+
+    Every tenant has a context per application profile and a bridge
+    domain per EPG.  Each EPG provides one of the contracts of its tenant
+    and consumes the next one.  The endpoints are spread over the ports
+    of the leaf switches and the fabric has one spine for every 16 leaf
+    switches.
+    """
+    def __init__(self, size):
+        """
+        :param size: FabricSize instance containing the sizes of the fabric
+        """
+        self.size = size
+        self.num_spines = max(1, (size.switches + 15) // 16)
+
+    def _get_leaf_ids(self):
+        return [str(101 + index) for index in range(self.size.switches)]
+
+    def _get_path(self, endpoint_index):
+        """
+        Get the fabricPathEp of the port an endpoint is attached to
+
+        :param endpoint_index: Integer containing the fabric-wide index of the endpoint
+        :return: tuple of the dn of the parent of the path and the relative name of the path
+        """
+        leaf = 101 + endpoint_index % self.size.switches
+        port = 1 + (endpoint_index // self.size.switches) % self.size.ports
+        return 'topology/pod-1/paths-%s' % leaf, 'pathep-[eth1/%s]' % port
+
+    @staticmethod
+    def _get_object(apic_class, attributes, children=None):
+        obj = {apic_class: {'attributes': attributes}}
+        if children:
+            obj[apic_class]['children'] = children
+        return obj
+
+    def _get_relation(self, apic_class, rn, target_class, target_parent_dn, target_rn, **attributes):
+        """
+        Get a relation object resolved to its target
+
+        :param apic_class: String containing the class of the relation
+        :param rn: String containing the relative name of the relation
+        :param target_class: String containing the class of the target
+        :param target_parent_dn: String containing the dn of the parent of the target
+        :param target_rn: String containing the relative name of the target
+        :param attributes: additional attributes of the relation
+        :return: Dictionary containing the relation object
+        """
+        attributes.update({'rn': rn, 'tCl': target_class, 'tDn': target_parent_dn + '/' + target_rn,
+                           'tRn': target_rn, 'state': 'formed', 'stateQual': 'none'})
+        return self._get_object(apic_class, attributes)
+
+    def get_tenant(self, tenant_index):
+        """
+        Get the configuration of a tenant
+
+        :param tenant_index: Integer containing the index of the tenant
+        :return: Dictionary containing the fvTenant object and its subtree
+        """
+        size = self.size
+        tenant_name = 'tenant%s' % tenant_index
+        tenant_dn = 'uni/tn-' + tenant_name
+        children = []
+        contract_names = ['contract%s' % index for index in range(size.contracts)]
+        for index, contract_name in enumerate(contract_names):
+            filter_name = 'filter%s' % index
+            entry = self._get_object('vzEntry', {'rn': 'e-tcp', 'name': 'tcp', 'etherT': 'ip', 'prot': 'tcp',
+                                                 'dFromPort': str(1000 + index), 'dToPort': str(1000 + index),
+                                                 'sFromPort': 'unspecified', 'sToPort': 'unspecified',
+                                                 'applyToFrag': 'no', 'arpOpc': 'unspecified',
+                                                 'stateful': 'no', 'tcpRules': ''})
+            children.append(self._get_object('vzFilter', {'rn': 'flt-' + filter_name, 'name': filter_name},
+                                             [entry]))
+            relation = self._get_relation('vzRsSubjFiltAtt', 'rssubjFiltAtt-' + filter_name, 'vzFilter',
+                                          tenant_dn, 'flt-' + filter_name, tnVzFilterName=filter_name)
+            subject = self._get_object('vzSubj', {'rn': 'subj-subject', 'name': 'subject'}, [relation])
+            children.append(self._get_object('vzBrCP', {'rn': 'brc-' + contract_name, 'name': contract_name,
+                                                        'scope': 'context'}, [subject]))
+
+        epg_index = 0
+        for app_index in range(size.apps):
+            context_name = 'ctx%s' % app_index
+            children.append(self._get_object('fvCtx', {'rn': 'ctx-' + context_name, 'name': context_name,
+                                                       'pcEnfPref': 'enforced'}))
+            epgs = []
+            for index in range(size.epgs // size.apps + (1 if app_index < size.epgs % size.apps else 0)):
+                epg_name = 'epg%s' % epg_index
+                bd_name = 'bd%s' % epg_index
+                subnet = '10.%s.%s.1/24' % (tenant_index % 256, epg_index % 256)
+                bd_children = [self._get_relation('fvRsCtx', 'rsctx', 'fvCtx', tenant_dn, 'ctx-' + context_name,
+                                                  tnFvCtxName=context_name),
+                               self._get_object('fvSubnet', {'rn': 'subnet-[%s]' % subnet, 'ip': subnet,
+                                                             'name': '', 'scope': 'private'})]
+                children.append(self._get_object('fvBD', {'rn': 'BD-' + bd_name, 'name': bd_name,
+                                                          'arpFlood': 'no', 'unicastRoute': 'yes',
+                                                          'unkMacUcastAct': 'proxy',
+                                                          'unkMcastAct': 'flood'}, bd_children))
+                epg_children = [self._get_relation('fvRsBd', 'rsbd', 'fvBD', tenant_dn, 'BD-' + bd_name,
+                                                   tnFvBDName=bd_name)]
+                if contract_names:
+                    provided = contract_names[epg_index % len(contract_names)]
+                    consumed = contract_names[(epg_index + 1) % len(contract_names)]
+                    epg_children.append(self._get_relation('fvRsProv', 'rsprov-' + provided, 'vzBrCP', tenant_dn,
+                                                           'brc-' + provided, tnVzBrCPName=provided,
+                                                           matchT='AtleastOne', prio='unspecified'))
+                    epg_children.append(self._get_relation('fvRsCons', 'rscons-' + consumed, 'vzBrCP', tenant_dn,
+                                                           'brc-' + consumed, tnVzBrCPName=consumed,
+                                                           prio='unspecified'))
+                epg_children.extend(self._get_endpoints(tenant_index, epg_index, subnet))
+                epgs.append(self._get_object('fvAEPg', {'rn': 'epg-' + epg_name, 'name': epg_name,
+                                                        'pcEnfPref': 'unenforced'}, epg_children))
+                epg_index += 1
+            app_name = 'app%s' % app_index
+            children.append(self._get_object('fvAp', {'rn': 'ap-' + app_name, 'name': app_name}, epgs))
+
+        return self._get_object('fvTenant', {'dn': tenant_dn, 'name': tenant_name}, children)
+
+    def _get_endpoints(self, tenant_index, epg_index, subnet):
+        """
+        Get the endpoints learned in an EPG
+
+        :param tenant_index: Integer containing the index of the tenant
+        :param epg_index: Integer containing the index of the EPG in the tenant
+        :param subnet: String containing the subnet of the bridge domain of the EPG
+        :return: list of fvCEp objects
+        """
+        size = self.size
+        endpoints = []
+        for index in range(size.endpoints):
+            endpoint_index = (tenant_index * size.epgs + epg_index) * size.endpoints + index
+            mac = '00:%02X:%02X:%02X:%02X:%02X' % ((endpoint_index >> 32) & 0xff, (endpoint_index >> 24) & 0xff,
+                                                  (endpoint_index >> 16) & 0xff, (endpoint_index >> 8) & 0xff,
+                                                  endpoint_index & 0xff)
+            paths_dn, path_rn = self._get_path(endpoint_index)
+            path = self._get_relation('fvRsCEpToPathEp', 'rscEpToPathEp-[%s/%s]' % (paths_dn, path_rn),
+                                      'fabricPathEp', paths_dn, path_rn)
+            endpoints.append(self._get_object('fvCEp', {'rn': 'cep-' + mac, 'name': mac, 'mac': mac,
+                                                        'ip': subnet.rsplit('.', 1)[0] + '.%s' % (10 + index % 240),
+                                                        'encap': 'vlan-%s' % (100 + epg_index % 3900),
+                                                        'lcC': 'learned', 'modTs': '2016-01-01T00:00:00.000+00:00'},
+                                              [path]))
+        return endpoints
+
+    def _get_node(self, node_id, role):
+        """
+        Get the objects of a node of the topology
+
+        :param node_id: String containing the node id
+        :param role: String containing the role of the node
+        :return: list of objects
+        """
+        node_dn = 'topology/pod-1/node-%s' % node_id
+        objects = [self._get_object('fabricNode', {'dn': node_dn, 'id': node_id, 'name': 'node-%s' % node_id,
+                                                   'role': role, 'serial': 'SN%s' % node_id,
+                                                   'model': 'N9K-C9396PX', 'vendor': 'Cisco Systems, Inc',
+                                                   'fabricSt': 'active', 'modTs': 'never'}),
+                   self._get_object('topSystem', {'dn': node_dn + '/sys', 'address': '10.0.0.%s' % node_id,
+                                                  'fabricMAC': '00:00:00:00:00:01', 'state': 'in-service',
+                                                  'mode': 'unspecified',
+                                                  'oobMgmtAddr': '192.168.0.%s' % node_id})]
+        if role == 'controller':
+            return objects
+        objects.append(self._get_object('eqptCh', {'dn': node_dn + '/sys/ch', 'operSt': 'online',
+                                                   'operStQual': '', 'descr': 'chassis'}))
+        objects.append(self._get_object('firmwareCardRunning', {'dn': node_dn + '/sys/ch/supslot-1/sup/running',
+                                                                'version': 'n9000-11.2(1m)'}))
+        objects.append(self._get_object('fabricNodeHealth5min', {'dn': node_dn + '/sys/CDfabricNodeHealth5min',
+                                                                  'healthLast': '100'}))
+        objects.append(self._get_object('vpcInst', {'dn': node_dn + '/sys/vpc/inst', 'adminSt': 'disabled'}))
+        for slot in range(1, 3):
+            slot_dn = node_dn + '/sys/ch/psuslot-%s' % slot
+            objects.append(self._get_object('eqptPsuSlot', {'dn': slot_dn, 'physId': str(slot),
+                                                            'operSt': 'inserted'}))
+            objects.append(self._get_object('eqptPsu', {'dn': slot_dn + '/psu', 'ser': 'PSU%s%s' % (node_id, slot),
+                                                        'model': 'N9K-PAC-650W', 'descr': 'power supply',
+                                                        'operSt': 'online', 'fanOpSt': 'online', 'vSrc': 'ac',
+                                                        'hwVer': '1.0', 'rev': 'A0', 'status': '',
+                                                        'modTs': 'never'}))
+        if role != 'leaf':
+            return objects
+        for port in range(1, self.size.ports + 1):
+            if_name = 'eth1/%s' % port
+            port_dn = '%s/sys/phys-[%s]' % (node_dn, if_name)
+            objects.append(self._get_object('l1PhysIf', {'dn': port_dn, 'id': if_name, 'name': '',
+                                                         'portT': 'leaf', 'adminSt': 'up', 'speed': '10G',
+                                                         'mtu': '9000', 'mode': 'trunk', 'layer': 'Layer2',
+                                                         'descr': '', 'usage': 'epg',
+                                                         'monPolDn': 'uni/fabric/monfab-default',
+                                                         'autoNeg': 'on', 'switchingSt': 'enabled',
+                                                         'dot1qEtherType': '0x8100'}))
+            objects.append(self._get_object('ethpmPhysIf', {'dn': port_dn + '/phys', 'operSt': 'up',
+                                                            'operSpeed': '10G'}))
+            objects.append(self._get_object('fabricPathEp', {'dn': 'topology/pod-1/paths-%s/pathep-[%s]' % (
+                node_id, if_name), 'name': if_name, 'lagT': 'not-aggregated'}))
+        return objects
+
+    def get_topology(self):
+        """
+        Get the objects of the pod, the controller and the switches
+
+        :return: list of objects
+        """
+        objects = [self._get_object('fabricPod', {'dn': 'topology/pod-1', 'id': '1'})]
+        objects.extend(self._get_node('1', 'controller'))
+        for index in range(self.num_spines):
+            objects.extend(self._get_node(str(201 + index), 'spine'))
+        for node_id in self._get_leaf_ids():
+            objects.extend(self._get_node(node_id, 'leaf'))
+        return objects
+
+    def write(self, directory):
+        """
+        Write the snapshot files
+
+        :param directory: String containing the directory where the files are written
+        :return: list of the names of the written files
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        filenames = []
+        for tenant_index in range(self.size.tenants):
+            filename = os.path.join(directory, 'tenant-tenant%s.json' % tenant_index)
+            self._write_file(filename, [self.get_tenant(tenant_index)])
+            filenames.append(filename)
+        filename = os.path.join(directory, 'topology.json')
+        self._write_file(filename, self.get_topology())
+        filenames.append(filename)
+        return filenames
+
+    @staticmethod
+    def _write_file(filename, imdata):
+        with open(filename, 'w') as snapshot_file:
+            json.dump({'totalCount': str(len(imdata)), 'imdata': imdata}, snapshot_file,
+                      sort_keys=True, separators=(',', ':'))
+
+
+def get_size(args):
+    """
+    Get the fabric size from the preset and the individual sizes given
+    on the command line
+
+    :param args: Namespace containing the command line arguments
+    :return: FabricSize instance
+    """
+    size = SIZES[args.size]
+    overrides = dict((field, getattr(args, field)) for field in FabricSize._fields
+                     if getattr(args, field) is not None)
+    return size._replace(**overrides)
+
+
+def add_size_arguments(parser):
+    """
+    Add the fabric size arguments to a command line parser
+
+    :param parser: ArgumentParser instance
+    """
+    parser.add_argument('--size', choices=sorted(SIZES), default='small',
+                        help='Preset fabric size. The individual sizes override the preset.')
+    parser.add_argument('--tenants', type=int, help='Number of tenants')
+    parser.add_argument('--apps', type=int, help='Number of application profiles per tenant')
+    parser.add_argument('--epgs', type=int, help='Number of EPGs per tenant')
+    parser.add_argument('--contracts', type=int, help='Number of contracts per tenant')
+    parser.add_argument('--endpoints', type=int, help='Number of endpoints per EPG')
+    parser.add_argument('--switches', type=int, help='Number of leaf switches')
+    parser.add_argument('--ports', type=int, help='Number of ports per leaf switch')
+
+
+def main():
+    """
+    Main execution routine
+    """
+    parser = argparse.ArgumentParser(description='Generate the snapshot files of a synthetic fabric '
+                                                 'for use with the Fake APIC.')
+    parser.add_argument('--directory', required=True, help='Directory where the snapshot files are written')
+    add_size_arguments(parser)
+    args = parser.parse_args()
+    size = get_size(args)
+    filenames = FabricGenerator(size).write(args.directory)
+    print('Wrote %s snapshot files for %s' % (len(filenames), size))
+
+if __name__ == '__main__':
+    main()
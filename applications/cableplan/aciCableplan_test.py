@@ -541,6 +541,20 @@ class Test_portset(unittest.TestCase):
 
 
 class Test_switch(unittest.TestCase):
+    def test_name_change_reindex(self):
+        cp = cableplan.CABLEPLAN()
+        spine = cp.add_switch(cableplan.CpSwitch('Spine1', spine=True))
+        leaf = cp.add_switch(cableplan.CpSwitch('Leaf1'))
+        link = cableplan.CpLink(source_chassis=spine, source_port='Eth1/1', dest_chassis=leaf, dest_port='Eth1/1')
+        cp.add_link(link)
+        spine.set_name('Spine2')
+        self.assertIsNone(cp.get_switch('Spine1'))
+        self.assertIs(cp.get_switch('Spine2'), spine)
+        self.assertTrue(cp.exists_link(link))
+        cp.add_link(cableplan.CpLink(source_chassis=spine, source_port='Eth1/1', dest_chassis=leaf,
+                                     dest_port='Eth1/1'))
+        self.assertEqual(len(cp.get_links()), 1)
+
     def test_name_change(self):
         spine1 = cableplan.CpSwitch('Spine1')
         leaf1 = cableplan.CpSwitch('Leaf1')
@@ -742,6 +756,39 @@ class Test_export(unittest.TestCase):
 
         self.assertRaises(TypeError, cp.export, 'BogusFile')
 
+    def test_export_import_large(self):
+        num_spines = 4
+        num_leafs = 50
+        num_ports = 20
+        cp1 = cableplan.CABLEPLAN(version='1.0')
+        spines = [cp1.add_switch(cableplan.CpSwitch('Spine%s' % index, chassis_type='n9k', spine=True))
+                  for index in range(num_spines)]
+        leafs = [cp1.add_switch(cableplan.CpSwitch('Leaf%s' % index)) for index in range(num_leafs)]
+        for spine in spines:
+            for leaf in leafs:
+                for port in range(1, num_ports + 1):
+                    cp1.add_link(cableplan.CpLink(source_chassis=spine, source_port='Eth1/%s' % port,
+                                                  dest_chassis=leaf, dest_port='Eth2/%s' % port))
+                    # duplicates are ignored
+                    cp1.add_link(cableplan.CpLink(source_chassis=leaf, source_port='eth2/%s' % port,
+                                                  dest_chassis=spine, dest_port='eth1/%s' % port))
+        num_links = num_spines * num_leafs * num_ports
+        self.assertEqual(len(cp1.get_links()), num_links)
+
+        fname = self.get_temporary_filename()
+        f = open(fname, 'w')
+        self.assertIsNone(cp1.export(f))
+        f.close()
+        with open(fname, 'r') as f:
+            self.assertEqual(f.read(), cp1.export())
+
+        cp2 = cableplan.CABLEPLAN.get(fname)
+        self.assertEqual(len(cp2.get_switch()), num_spines + num_leafs)
+        self.assertEqual(len(cp2.get_links()), num_links)
+        self.assertEqual(len(cp1.difference_link(cp2)), 0)
+        self.assertEqual(len(cp2.difference_link(cp1)), 0)
+        self.remove_file(fname)
+
     def test_import(self):
         expected_xml = self.get_expected_xml()
         fname = self.get_temporary_filename()
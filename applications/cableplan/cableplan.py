@@ -98,6 +98,30 @@ def parsexml_(*args, **kwargs):
     doc = eTree.parse(*args, **kwargs)
     return doc
 
+
+def iterparsexml_(source):
+    """
+    iterparsexml_
+    Incrementally parse the XML in source.  Namespace declarations are reported
+    as 'start-ns' events so that they are available without building the tree.
+    :param source: filename or file object
+    :return: iterator of (event, element) tuples
+    """
+    return eTree.iterparse(source, events=('start-ns', 'start', 'end'))
+
+
+def release_element_(elem):
+    """
+    Free an element that has been fully processed during an iterparse so that
+    memory use stays bounded regardless of the size of the document.
+    :param elem: element to release
+    """
+    elem.clear()
+    if XMLParser_import_library == XMLParser_import_lxml:
+        # lxml keeps references to the already processed siblings
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
 #
 # Globals
 #
@@ -142,6 +166,9 @@ class CABLEPLAN:
         self.version = version
         self.switches = []
         self.links = []
+        self._switch_index = {}
+        self._link_index = set()
+        self._switch_links = {}
         self.schemaLocation = 'nxos-cable-plan-schema.xsd'
         self.nsmap = None
         self.namespace = 'http://www.cisco.com/cableplan/Schema2'
@@ -169,14 +196,38 @@ class CABLEPLAN:
 
     @classmethod
     def _parse(cls, in_file_name):
-        doc = parsexml_(in_file_name)
-        # This can be enhanced to parse a string rather than just a file with the
-        # following line:
-        # doc = parsexml_(StringIO(inString))
+        """Streams the cable plan XML in in_file_name.  Each CHASSIS_INFO and LINK_INFO
+        element is released as soon as it has been processed so that large cable plans
+        can be read in bounded memory.
 
-        root_node = doc.getroot()
+        :param in_file_name: filename or file object containing the cable plan XML
+
+        :returns: CABLEPLAN
+        """
         cable_plan = cls()
-        cable_plan._build_xml(root_node)
+        nsmap = {}
+        switch = None
+        for event, elem in iterparsexml_(in_file_name):
+            if event == 'start-ns':
+                prefix, url = elem
+                nsmap[prefix or None] = url
+                continue
+            node_name = Tag_pattern_.match(elem.tag).groups()[-1]
+            if event == 'start':
+                if node_name == 'CISCO_NETWORK_TYPES':
+                    cable_plan._parse_xml_network_types(elem, nsmap)
+                elif node_name == 'DATA_CENTER':
+                    cable_plan._parse_xml_data_center_attrs(elem)
+                elif node_name == 'CHASSIS_INFO':
+                    switch = cable_plan._parse_xml_chassis_attrs(elem)
+            else:
+                if node_name == 'LINK_INFO':
+                    if switch is not None:
+                        cable_plan._parse_xml_link_info(elem, switch)
+                    release_element_(elem)
+                elif node_name == 'CHASSIS_INFO':
+                    switch = None
+                    release_element_(elem)
         return cable_plan
 
     @classmethod
@@ -189,10 +240,7 @@ class CABLEPLAN:
 
     def get_switch(self, switch_name=None):
         if switch_name:
-            for switch in self.switches:
-                if switch.get_name() == switch_name:
-                    return switch
-            return None
+            return self._switch_index.get(switch_name)
         else:
             return self.switches[:]
 
@@ -223,38 +271,73 @@ class CABLEPLAN:
             raise TypeError('add_switch expects object of type CpSwitch')
 
         new_switch.set_parent(self)
-        for switch in self.switches:
-            if switch == new_switch:
-                switch.merge(new_switch)
-                del new_switch
-                return switch
+        switch = self._switch_index.get(new_switch.get_name())
+        if switch is not None:
+            switch.merge(new_switch)
+            del new_switch
+            return switch
         self.switches.append(new_switch)
+        self._switch_index[new_switch.get_name()] = new_switch
         return new_switch
 
     def delete_switch(self, old_switch):
         if old_switch in self.switches:
             self.switches.remove(old_switch)
+            self._reindex()
 
     def exists_switch(self, switch):
-        return switch in self.switches
+        return switch.get_name() in self._switch_index
 
     def add_link(self, new_link):
         """Will add a link to the CABLEPLAN.  Duplicates will not be allow, but overlapping will be.
+        Duplicates are detected with a hash lookup on the link key so that adding a link does not
+        depend on the number of links already in the CABLEPLAN.
 
         :param new_link: Link to be added of type CpLink
 
         :returns: None
         """
-
-        if new_link not in self.links:
+        key = new_link.get_key()
+        if key not in self._link_index:
+            self._link_index.add(key)
             self.links.append(new_link)
+            for switch_name in self._get_link_switch_names(new_link):
+                self._switch_links.setdefault(switch_name, []).append(new_link)
 
     def delete_link(self, link):
-        if link in self.links:
+        key = link.get_key()
+        if key in self._link_index:
+            self._link_index.remove(key)
             self.links.remove(link)
+            for switch_name in self._get_link_switch_names(link):
+                self._switch_links[switch_name].remove(link)
 
     def exists_link(self, link):
-        return link in self.links
+        return link.get_key() in self._link_index
+
+    def _reindex(self):
+        """Rebuilds the switch and link indexes.  This is needed when a switch is renamed
+        since the switch name is part of the key of the switch and of its links.
+
+        :returns: None
+        """
+        self._switch_index = {}
+        for switch in self.switches:
+            self._switch_index.setdefault(switch.get_name(), switch)
+        self._link_index = set()
+        self._switch_links = {}
+        links = self.links
+        self.links = []
+        for link in links:
+            self.add_link(link)
+
+    @staticmethod
+    def _get_link_switch_names(link):
+        source_name = link.source_chassis.get_name()
+        dest_name = link.dest_chassis.get_name()
+        if source_name == dest_name:
+            return [source_name]
+        return [source_name, dest_name]
 
     def get_links(self, switch1=None, switch2=None):
         """Returns a list of links.  If switch is unspecified, it will return all links.  If switch is specified,
@@ -269,7 +352,7 @@ class CABLEPLAN:
 
         if switch1:
             link_list = []
-            for link in self.links:
+            for link in self._switch_links.get(switch1.get_name(), []):
                 if link.is_connected(switch1, switch2):
                     link_list.append(link)
             return link_list
@@ -308,20 +391,9 @@ class CABLEPLAN:
         :param switch1:
         :param switch2:
         """
-        result = []
+        # links are unique so a stable sort keeps the first of equally specific links first
         links = self.get_links(switch1, switch2)
-        num_links = len(links)
-        for i in range(num_links):
-            best_order = 100000
-            best_link = None
-            for link in links:
-                if (link.order() < best_order) and (link not in result):
-                    best_order = link.order()
-                    best_link = link
-
-            if best_order < 100000:
-                result.append(best_link)
-        return result
+        return sorted([link for link in links if link.order() < 100000], key=lambda link: link.order())
 
     def _switch_link_diff(self, cp, switch1, switch2):
         """ returns a list links that go between switch1 and switch2 that are in self, but not in cp
@@ -369,30 +441,40 @@ class CABLEPLAN:
 
     def export(self, out_file=None, level=0):
         """Will generate XML text of the entire CABLEPLAN and return it as a string.  If
-        out_file is specified, it will write the XML to that file.  out_file should be opened for
-        writing before calling this method.  'level' specifies the amount of indentation to start with.
+        out_file is specified, the XML is instead written incrementally to that file and
+        nothing is returned so that the whole document is never held in memory.
+        out_file should be opened for writing before calling this method.
+        'level' specifies the amount of indentation to start with.
         """
 
         if out_file:
             if not isinstance(out_file, file):
                 raise TypeError('expected a file')
+            for text in self.iter_export(level):
+                out_file.write(text)
+            return None
+
+        return ''.join(self.iter_export(level))
 
+    def iter_export(self, level=0):
+        """Generator that yields the XML text of the entire CABLEPLAN piece by piece.
+        'level' specifies the amount of indentation to start with.
+
+        :param level: optional indention level, integer
+
+        :returns: generator of str
+        """
         tag = 'CISCO_NETWORK_TYPES'
 
-        text = '<?xml version="1.0" encoding="UTF-8"?>\n'
-        text += '<?created by cableplan.py?>\n'
-        text += indent(level)
-        text += '<%s version=%s xmlns=%s xmlns:%s=%s %s:schemaLocation=%s>\n' % (
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+        yield '<?created by cableplan.py?>\n'
+        yield indent(level) + '<%s version=%s xmlns=%s xmlns:%s=%s %s:schemaLocation=%s>\n' % (
             tag, quote_attrib(self.version), quote_attrib(self.namespace), self.prefix, quote_attrib(self.prefix_url),
             self.prefix, quote_attrib(self.namespace + ' ' + self.schemaLocation))
 
-        text += self.export_data_center(level=level + 1)
-        text += indent(level)
-        text += '</%s>\n' % tag
-
-        if out_file:
-            out_file.write(text)
-        return text
+        for text in self.iter_export_data_center(level=level + 1):
+            yield text
+        yield indent(level) + '</%s>\n' % tag
 
     def export_data_center(self, level=0):
         """Will generate the XML of the CABLEPLAN with DATA_CENTER as the root.  This will then be
@@ -402,30 +484,38 @@ class CABLEPLAN:
 
         :returns: string that is the DATA_CENTER xml
         """
+        return ''.join(self.iter_export_data_center(level))
+
+    def iter_export_data_center(self, level=0):
+        """Generator that yields the XML of the CABLEPLAN with DATA_CENTER as the root
+        piece by piece. 'level' specifies the indentation level to start with.
+
+        :param level: optional indention level, integer
+
+        :returns: generator of str
+        """
         tag = 'DATA_CENTER'
-        text = indent(level)
-        text += '<%s networkLocation=%s idFormat=%s>\n' % (
+        yield indent(level) + '<%s networkLocation=%s idFormat=%s>\n' % (
             tag, quote_attrib(self.networkLocation), quote_attrib(self.idFormat))
-        switches = self.get_spines()
-        for switch in switches:
-            text += switch.export(level + 1)
+        for switch in self.get_spines():
+            for text in switch.iter_export(level + 1):
+                yield text
 
-        text += indent(level)
-        text += '</%s>\n' % tag
-
-        return text
+        yield indent(level) + '</%s>\n' % tag
 
     @staticmethod
-    def _get_attr_value(node, attr_name):
+    def _get_attr_value(node, attr_name, nsmap=None):
 
         attrs = node.attrib
         attr_parts = attr_name.split(':')
         value = None
+        if nsmap is None:
+            nsmap = getattr(node, 'nsmap', {})
         if len(attr_parts) == 1:
             value = attrs.get(attr_name)
         elif len(attr_parts) == 2:
             prefix, name = attr_parts
-            namespace = node.nsmap.get(prefix)
+            namespace = nsmap.get(prefix)
             if namespace is not None:
                 value = attrs.get('{%s}%s' % (namespace, name, ))
         return value
@@ -489,31 +579,40 @@ class CABLEPLAN:
     def _build_xml(self, node):
 
         # start at CISCO_NETWORK_TYPES
+        self._parse_xml_network_types(node, node.nsmap)
+        for child in node:
+            node_name = Tag_pattern_.match(child.tag).groups()[-1]
+            if node_name == 'DATA_CENTER':
+                self._parse_xml_data_center(child)
+
+    def _parse_xml_network_types(self, node, nsmap):
         self.version = self._get_attr_value(node, 'version')
-        self.nsmap = node.nsmap  # namespace prefix can be found here
+        self.nsmap = nsmap  # namespace prefix can be found here
         self._get_namespace_prefix(self.nsmap)  # parse out namespace and prefix
 
         # TODO: should be refined to handle any namespace prefix
         self.schemaLocation = self._get_attr_value(node,
-                                                   'xsi:schemaLocation').strip()
-        for child in node:
-            node_name = Tag_pattern_.match(child.tag).groups()[-1]
-            if node_name == 'DATA_CENTER':
-                self._parse_xml_data_center(child)
+                                                   'xsi:schemaLocation', nsmap).strip()
 
     def _parse_xml_data_center(self, node):
-        self.networkLocation = self._get_attr_value(node, 'networkLocation')
-        self.idFormat = self._get_attr_value(node, 'idFormat')
+        self._parse_xml_data_center_attrs(node)
         for child in node:
             node_name = Tag_pattern_.match(child.tag).groups()[-1]
             if node_name == 'CHASSIS_INFO':
                 self._parse_xml_chassis_info(child)
 
-    def _parse_xml_chassis_info(self, node):
+    def _parse_xml_data_center_attrs(self, node):
+        self.networkLocation = self._get_attr_value(node, 'networkLocation')
+        self.idFormat = self._get_attr_value(node, 'idFormat')
+
+    def _parse_xml_chassis_attrs(self, node):
         chassis_name = self._get_attr_value(node, 'sourceChassis')
         chassis_type = self._get_attr_value(node, 'type')
         switch = CpSwitch(chassis_name, chassis_type, spine=True)
-        self.add_switch(switch)
+        return self.add_switch(switch)
+
+    def _parse_xml_chassis_info(self, node):
+        switch = self._parse_xml_chassis_attrs(node)
         for child in node:
             node_name = Tag_pattern_.match(child.tag).groups()[-1]
             if node_name == 'LINK_INFO':
@@ -560,6 +659,8 @@ class CpSwitch(object):
         """
 
         self.name = name
+        if self.parent:
+            self.parent._reindex()
         return None
 
     def get_type(self):
@@ -618,16 +719,22 @@ class CpSwitch(object):
         return self.name
 
     def export(self, level):
+        return ''.join(self.iter_export(level))
+
+    def iter_export(self, level):
+        """Generator that yields the CHASSIS_INFO XML of the switch piece by piece.
+
+        :param level: Indentation level
+
+        :returns: generator of str
+        """
         tag = 'CHASSIS_INFO'
-        text = indent(level)
-        text += '<%s sourceChassis=%s type=%s>\n' % (tag, quote_attrib(self.get_name()), quote_attrib(self.get_type()))
-        links = self.get_links()
-        for link in links:
-            text += link.export(self, level + 1)
+        yield indent(level) + '<%s sourceChassis=%s type=%s>\n' % (tag, quote_attrib(self.get_name()),
+                                                                    quote_attrib(self.get_type()))
+        for link in self.get_links():
+            yield link.export(self, level + 1)
 
-        text += indent(level)
-        text += '</%s>\n' % tag
-        return text
+        yield indent(level) + '</%s>\n' % tag
 
 
 # end class CpSwitch
@@ -767,6 +874,14 @@ class CpPort:
         text = self._rangeify()
         return text
 
+    def get_key(self):
+        """Returns a hashable key for the port set.  The key is case insensitive so that
+        two CpPort have the same key exactly when they compare equal.
+
+        :returns: frozenset of str
+        """
+        return frozenset(port.lower() for port in self.ports)
+
     def __eq__(self, other):
         """ compares the content of the port list and returns true if they are the same.  The comparison is case insensitive.
         """
@@ -929,6 +1044,21 @@ class CpLink:
             return True
         return False
 
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.get_key())
+
+    def get_key(self):
+        """Returns a hashable key for the link.  Two links have the same key exactly when they
+        are equal, i.e. same switches and same (case insensitive) port sets.
+
+        :returns: tuple
+        """
+        return (self.source_chassis.get_name(), self.source_port.get_key(),
+                self.dest_chassis.get_name(), self.destPort.get_key())
+
     def has_port_in_common(self, link):
         """Returns True if link has any ports that match self.  It will compare
         all ports included expanded lists of port sets.
@@ -1133,9 +1263,8 @@ def export_to_file(session, file1=None):
     cp = CABLEPLAN.get(session)
 
     if file1:
-        f = open(file1, 'w')
-        cp.export(f)
-        f.close()
+        with open(file1, 'w') as f:
+            cp.export(f)
     else:
         print cp.export(),
 
@@ -31,6 +31,8 @@
 import sys
 import getopt
 import logging
+import threading
+import time
 from cmd import Cmd
 from acitoolkit import (Tenant, Contract, AppProfile, EPG, Interface, PortChannel, L2ExtDomain, Subnet,
                         PhysDomain, VmmDomain, L3ExtDomain, EPGDomain, Context, BridgeDomain, L2Interface,
@@ -59,6 +61,208 @@ def error_message(resp):
     print 'Reason:', resp.text
 
 
+class ApicNameCache(object):
+    """
+    Names of the tenant objects used by the show commands and the
+    command completion.
+
+    Each object type is read from the APIC with a single class query
+    and the names are grouped by tenant and application profile using
+    the DN of the objects.  When enabled, the names of an object type
+    are loaded the first time they are needed and kept up to date either
+    from a class subscription or by reloading them once they are older
+    than ttl seconds.  The show commands wait for the reload so that
+    they never display names older than ttl seconds.  The command
+    completion reloads the names in the background and is given the
+    previous names until the reload completes, so that it never waits
+    for the APIC.
+    """
+    apic_classes = {'tenant': 'fvTenant',
+                    'bridgedomain': 'fvBD',
+                    'context': 'fvCtx',
+                    'contract': 'vzBrCP',
+                    'app': 'fvAp',
+                    'epg': 'fvAEPg'}
+
+    def __init__(self, apic, enabled=True, ttl=300, use_subscriptions=False):
+        self.apic = apic
+        self.enabled = enabled
+        self.ttl = ttl
+        self.use_subscriptions = use_subscriptions
+        self._names = {}
+        self._subscribed = set()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _parse_dn(dn):
+        """
+        Get the names of the object and its parents from the DN
+        i.e. uni/tn-tenant/ap-app/epg-epg gives ('tenant', 'app', 'epg')
+
+        :param dn: String containing the DN of the object
+        :returns: tuple of strings containing the names
+        """
+        return tuple(rn.partition('-')[2] for rn in dn.split('/')[1:])
+
+    def _get_subscription_url(self, object_type):
+        return '/api/class/%s.json?subscription=yes' % self.apic_classes[object_type]
+
+    def _get_from_apic(self, object_type):
+        apic_class = self.apic_classes[object_type]
+        query_url = '/api/class/%s.json?rsp-prop-include=naming-only' % apic_class
+        resp = self.apic.get(query_url)
+        if not resp.ok:
+            logging.error('Could not get %s from APIC: %s', apic_class, resp.text)
+            return None
+        names = []
+        for item in resp.json()['imdata']:
+            names.append(self._parse_dn(str(item[apic_class]['attributes']['dn'])))
+        names.sort()
+        return names
+
+    def _load(self, object_type):
+        """
+        Load the names of an object type from the APIC into the cache
+
+        :param object_type: String containing the object type i.e. 'epg'
+        :returns: sorted list of tuples containing the names or None
+        """
+        load_time = time.time()
+        names = self._get_from_apic(object_type)
+        if names is not None:
+            self._names[object_type] = (load_time, names)
+        return names
+
+    def _refresh(self, object_type):
+        try:
+            self._load(object_type)
+        except Exception:
+            logging.exception('Could not refresh the %s names', object_type)
+        finally:
+            with self._lock:
+                self._refreshing.discard(object_type)
+
+    def _start_refresh(self, object_type):
+        """
+        Reload the names of an object type in a background thread unless
+        a reload is already in progress
+
+        :param object_type: String containing the object type i.e. 'epg'
+        """
+        with self._lock:
+            if object_type in self._refreshing:
+                return
+            self._refreshing.add(object_type)
+        thread = threading.Thread(target=self._refresh, args=(object_type,))
+        thread.daemon = True
+        thread.start()
+
+    def _subscribe(self, object_type):
+        """
+        Subscribe to the changes of an object type.  If the subscription
+        fails, the names are refreshed using the ttl instead.
+
+        :param object_type: String containing the object type i.e. 'epg'
+        :returns: True if subscribed, otherwise False
+        """
+        try:
+            resp = self.apic.subscribe(self._get_subscription_url(object_type), only_new=True)
+        except Exception:
+            logging.exception('Could not subscribe to the %s names', object_type)
+            return False
+        if resp is None or not resp.ok:
+            logging.error('Could not subscribe to the %s names', object_type)
+            return False
+        self._subscribed.add(object_type)
+        return True
+
+    def _process_events(self, object_type):
+        """
+        Apply the pending subscription events of an object type to the cache
+
+        :param object_type: String containing the object type i.e. 'epg'
+        """
+        url = self._get_subscription_url(object_type)
+        apic_class = self.apic_classes[object_type]
+        load_time, names = self._names[object_type]
+        updated_names = None
+        while self.apic.has_events(url):
+            event = self.apic.get_event(url)
+            if updated_names is None:
+                updated_names = set(names)
+            for item in event['imdata']:
+                if apic_class not in item:
+                    continue
+                attributes = item[apic_class]['attributes']
+                name = self._parse_dn(str(attributes['dn']))
+                if attributes.get('status') == 'deleted':
+                    updated_names.discard(name)
+                else:
+                    updated_names.add(name)
+        if updated_names is not None:
+            self._names[object_type] = (time.time(), sorted(updated_names))
+
+    def invalidate(self, object_type=None):
+        """
+        Remove the names of an object type or of all object types from the
+        cache.  Object types kept up to date by a subscription are not removed.
+
+        :param object_type: String containing the object type i.e. 'epg'
+        """
+        if object_type is None:
+            object_types = list(self._names.keys())
+        else:
+            object_types = [object_type]
+        for object_type in object_types:
+            if object_type not in self._subscribed:
+                self._names.pop(object_type, None)
+
+    def get(self, object_type, tenant_name=None, app_name=None, stale_ok=False):
+        """
+        Get the names of all of the objects of a type
+
+        :param object_type: String containing the object type i.e. 'epg'
+        :param tenant_name: String containing the tenant name.  If given,\
+                            only the objects of this tenant are returned.
+        :param app_name: String containing the application profile name.\
+                         If given, only the EPGs of this application\
+                         profile are returned.
+        :param stale_ok: Boolean indicating whether names older than the\
+                         ttl can be returned while they are reloaded in\
+                         the background.  Default is False.
+        :returns: sorted list of tuples containing the tenant name,\
+                  the application profile name for EPGs, and the object name
+        """
+        if not self.enabled:
+            names = self._get_from_apic(object_type)
+        else:
+            expired = (object_type in self._names and object_type not in self._subscribed and
+                       self.ttl is not None and time.time() - self._names[object_type][0] > self.ttl)
+            if self.use_subscriptions and object_type not in self._subscribed:
+                # A failed subscription is retried when the names are reloaded
+                if (object_type not in self._names or expired) and self._subscribe(object_type):
+                    self._names.pop(object_type, None)
+            if object_type not in self._names:
+                names = self._load(object_type)
+            else:
+                if object_type in self._subscribed:
+                    self._process_events(object_type)
+                elif expired:
+                    if stale_ok:
+                        self._start_refresh(object_type)
+                    else:
+                        self._load(object_type)
+                names = self._names[object_type][1]
+        if names is None:
+            return []
+        if tenant_name is not None:
+            names = [name for name in names if name[0] == tenant_name]
+        if app_name is not None:
+            names = [name for name in names if name[1] == app_name]
+        return names
+
+
 class SubMode(Cmd):
     """
     Implements the basic commands for all modes
@@ -72,6 +276,7 @@ class SubMode(Cmd):
         self.set_prompt()
         self.negative = False
         self.apic = None
+        self.cache = None
 
     def set_prompt(self):
         """ Should be overridden by inheriting classes """
@@ -88,66 +293,41 @@ class SubMode(Cmd):
             words[0] = temp[0]
 
         if words[0] == 'tenant':
-            tenants = Tenant.get(self.apic)
+            tenants = self.get_names('tenant')
             tenant_dict = {}
-            for tenant in tenants:
-                tenant_dict[tenant.name] = []
+            for (tenant_name,) in tenants:
+                tenant_dict[tenant_name] = []
             if to_return:
                 return tenant_dict
             print 'Tenant'
             print '------'
-            for tenant in tenants:
-                print tenant.name
+            for (tenant_name,) in tenants:
+                print tenant_name
         elif words[0] == 'bridgedomain':
-            if self.tenant is None:
-                tenants = Tenant.get(self.apic)
-            else:
-                tenants = [self.tenant]
-            output = []
-            for tenant in tenants:
-                bds = BridgeDomain.get(self.apic, tenant)
+            bds = self.get_names('bridgedomain', self.tenant)
+            if to_return:
                 bd_dict = {}
-                bd_dict[tenant.name] = []
-                for bd in bds:
-                    bd_dict[tenant.name].append(bd.name)
-                if to_return:
-                    return bd_dict
-                for bd in bds:
-                    output.append((tenant.name, bd.name))
+                for tenant_name, bd_name in bds:
+                    bd_dict.setdefault(tenant_name, []).append(bd_name)
+                return bd_dict
             template = '{0:19} {1:20}'
             print template.format('Tenant', 'BridgeDomain')
             print template.format('------', '------------')
-            for rec in output:
+            for rec in bds:
                 print template.format(*rec)
         elif words[0] == 'context':
-            if self.tenant is None:
-                tenants = Tenant.get(self.apic)
-            else:
-                tenants = [self.tenant]
-            output = []
-            for tenant in tenants:
-                contexts = Context.get(self.apic, tenant)
-                for context in contexts:
-                    output.append((tenant.name, context.name))
+            contexts = self.get_names('context', self.tenant)
             template = '{0:19} {1:20}'
             print template.format('Tenant', 'Context')
             print template.format('------', '-------')
-            for rec in output:
+            for rec in contexts:
                 print template.format(*rec)
         elif words[0] == 'contract':
-            if self.tenant is None:
-                tenants = Tenant.get(self.apic)
-            else:
-                tenants = [self.tenant]
-            output = []
-            for tenant in tenants:
-                contracts = Contract.get(self.apic, tenant)
-                for contract in contracts:
-                    output.append((tenant.name, contract.name))
+            contracts = self.get_names('contract', self.tenant)
             template = '{0:19} {1:20}'
             print template.format('Tenant', 'Contract')
             print template.format('------', '-------')
-            for rec in output:
+            for rec in contracts:
                 print template.format(*rec)
         elif words[0] == 'interface':
             ifs = Interface.get(self.apic)
@@ -161,48 +341,21 @@ class SubMode(Cmd):
             for pc in portchannels:
                 print pc
         elif words[0] == 'app':
-            if self.tenant is None:
-                tenants = Tenant.get(self.apic)
-            else:
-                tenants = [Tenant(self.tenant.name)]
-            output = []
-            for tenant in tenants:
-                apps = AppProfile.get(self.apic, tenant)
-                for app in apps:
-                    if tenant is not None and tenant != app.get_parent():
-                        continue
-                    output.append((app.get_parent().name, app.name))
+            apps = self.get_names('app', self.tenant)
             template = '{0:19} {1:20}'
             print template.format('Tenant', 'App Profile')
             print template.format('------', '-----------')
-            for rec in output:
+            for rec in apps:
                 print template.format(*rec)
         elif words[0] == 'epg':
-            if self.tenant is None:
-                tenants = Tenant.get(self.apic)
-            else:
-                tenants = [Tenant(self.tenant.name)]
-            for tenant in tenants:
-                apps = AppProfile.get(self.apic, tenant)
-                for app in apps:
-                    epgs = EPG.get(self.apic, app, tenant)
-                    epg_dict = {}
-                    for epg in epgs:
-                        assert app == epg.get_parent()
-                        app = epg.get_parent()
-                        if app is not None:
-                            tenant = app.get_parent()
-                        if self.app is not None and self.app != app:
-                            continue
-                        if self.tenant is not None and self.tenant != tenant:
-                            continue
-                        if tenant.name not in epg_dict:
-                            epg_dict[tenant.name] = {}
-                        if app.name not in epg_dict[tenant.name]:
-                            epg_dict[tenant.name][app.name] = []
-                        epg_dict[tenant.name][app.name].append(epg.name)
-                    if epg_dict:
-                        pprint.pprint(epg_dict)
+            epgs = self.get_names('epg', self.tenant, self.app)
+            epg_dict = {}
+            for tenant_name, app_name, epg_name in epgs:
+                epg_dict.setdefault(tenant_name, {}).setdefault(app_name, []).append(epg_name)
+            if to_return:
+                return epg_dict
+            if epg_dict:
+                pprint.pprint(epg_dict)
         elif words[0] == 'infradomains':
             infradomains = PhysDomain.get(self.apic)
 
@@ -282,6 +435,36 @@ class SubMode(Cmd):
         else:
             sys.stdout.write('%% Unrecognized command\n')
 
+    def get_names(self, object_type, tenant=None, app=None, stale_ok=False):
+        """
+        Get the names of the objects of a type from the name cache.
+        A single query is sent to the APIC if the names are not cached.
+
+        :param object_type: String containing the object type i.e. 'epg'
+        :param tenant: Tenant instance to limit the objects to or None
+        :param app: AppProfile instance to limit the EPGs to or None
+        :param stale_ok: Boolean indicating whether expired names can be\
+                         returned while they are reloaded, as done for\
+                         the command completion.  Default is False.
+        :returns: sorted list of tuples containing the names
+        """
+        cache = self.cache
+        if cache is None:
+            cache = ApicNameCache(self.apic, enabled=False)
+        tenant_name = None if tenant is None else tenant.name
+        app_name = None if app is None else app.name
+        return cache.get(object_type, tenant_name, app_name, stale_ok)
+
+    def postcmd(self, stop, line):
+        """
+        Invalidate the name cache after a command that may have
+        changed the configuration
+        """
+        words = line.split()
+        if self.cache is not None and words and not 'show'.startswith(words[0]):
+            self.cache.invalidate()
+        return stop
+
     def emptyline(self):
         pass
 
@@ -358,10 +541,24 @@ class SubMode(Cmd):
         return args, num_completed_arg, last_completed_arg
 
     def get_completions(self, text, array):
-        if args == '':
+        if array is None:
+            return []
+        if text == '':
             return array
         return [a for a in array if a.startswith(text)]
 
+    def get_tenant_names(self, object_type):
+        """
+        Get the names of the objects of a type in the current tenant
+        for command completion
+
+        :param object_type: String containing the object type i.e. 'context'
+        :returns: list of strings containing the object names
+        """
+        if self.tenant is None:
+            return []
+        return [names[-1] for names in self.get_names(object_type, self.tenant, stale_ok=True)]
+
     def get_operator_port(self, line, arg):
         line = line.split(' ')
         if arg in line:
@@ -451,10 +648,8 @@ class BridgeDomainConfigSubMode(SubMode):
 
     def complete_context(self, text, line, begidx, endidx):
 
-        # TODO: need to replace the "get_context" function
         def get_context():
-            # return ['context_1', 'context_2']
-            pass
+            return self.get_tenant_names('context')
 
         args, num, first_cmd, nth_cmd, last_cmd = self.get_args_num_nth(text, line, 1)
 
@@ -550,10 +745,12 @@ class InterfaceConfigSubMode(SubMode):
 
     def complete_epg(self, text, line, begidx, endidx):
 
-        # TODO: need to replace the five "get" functions
+        # TODO: need to replace the four encap "get" functions
         def get_epg_name():
-            # return ['epg_1', 'epg_2']
-            pass
+            if self.tenant is None:
+                return []
+            return ['%s/%s' % (app_name, epg_name)
+                    for tenant_name, app_name, epg_name in self.get_names('epg', self.tenant, stale_ok=True)]
 
         def get_vlan_id():
             # return ['vlan_id_1', 'vlan_id_2']
@@ -650,14 +847,13 @@ class InterfaceConfigSubMode(SubMode):
 
     def complete_ip(self, text, line, begidx, endidx):
 
-        # TODO: need to replace the five "get" functions
+        # TODO: need to replace the four remaining "get" functions
         def get_ip_mask():
             # return ['ip_mask_1', 'ip_mask_2']
             pass
 
         def get_context():
-            # return ['context_1', 'context_2']
-            pass
+            return self.get_tenant_names('context')
 
         def get_area_id():
             # return ['area_id_1', 'area_id_2']
@@ -730,14 +926,14 @@ class ConfigSubMode(SubMode):
             self.prompt += '-' + self.tenant.name
         self.prompt += '(config)# '
 
-    def set_apic(self, apic):
-        self.apic = apic
-        self.bridgedomain_submode.apic = apic
-        self.context_submode.apic = apic
-        self.contract_submode.apic = apic
-        self.app_submode.apic = apic
-        self.app_submode.epg_submode.apic = apic
-        self.interface_submode.apic = apic
+    def set_apic(self, apic, cache=None):
+        if cache is None:
+            cache = ApicNameCache(apic)
+        for submode in (self, self.bridgedomain_submode, self.context_submode,
+                        self.contract_submode, self.app_submode,
+                        self.app_submode.epg_submode, self.interface_submode):
+            submode.apic = apic
+            submode.cache = cache
 
     def do_tenant(self, args):
         " Tenant Creation\ttenant <tenant-name> "
@@ -778,8 +974,8 @@ class ConfigSubMode(SubMode):
             self.bridgedomain_submode.cmdloop()
 
     def complete_bridgedomain(self, text, line, begidx, endidx):
-        bridgedomain_args = [a for a in self.do_show('bridgedomain',
-                                                     to_return=True).values()[0]]
+        bridgedomain_args = [bd_name for tenant_name, bd_name in self.get_names('bridgedomain', self.tenant,
+                                                                                 stale_ok=True)]
         completions = [a for a in bridgedomain_args if a.startswith(line[13:])]
         return completions
 
@@ -948,6 +1144,11 @@ class EPGConfigSubMode(SubMode):
             else:
                 print 'Assigned bridgedomain to EPG.'
 
+    def complete_bridgedomain(self, text, line, begidx, endidx):
+        args, num, first_cmd, nth_cmd, last_cmd = self.get_args_num_nth(text, line, 1)
+        if num == 1:
+            return self.get_completions(text, self.get_tenant_names('bridgedomain'))
+
     def do_infradomain(self, args):
         " Infrastructure Domain\infradomain <infra-domain-name> "
 
@@ -1289,8 +1490,9 @@ class CmdLine(SubMode):
         self.intro = ('\nCisco ACI Toolkit Command Shell\nCopyright (c)'
                       ' 2015, Cisco Systems, Inc.  All rights reserved.')
         self.negative = False
+        self.cache = ApicNameCache(apic)
         self.configsubmode = ConfigSubMode()
-        self.configsubmode.set_apic(apic)
+        self.configsubmode.set_apic(apic, self.cache)
 
     def set_prompt(self):
         self.prompt = 'fabric'
@@ -1343,8 +1545,7 @@ class CmdLine(SubMode):
             print '%% Tenant %s does not exist' % tenant.name
 
     def complete_switchto(self, text, line, begidx, endidx):
-        switchto_args = [a for a in self.do_show('tenant',
-                                                 to_return=True).keys()]
+        switchto_args = [tenant_name for (tenant_name,) in self.get_names('tenant', stale_ok=True)]
         completions = [a for a in switchto_args if a.startswith(line[9:])]
         return completions
 
@@ -1381,9 +1582,12 @@ class MockStdin:
         return line
 
 
-def main(apic):
+def main(apic, use_cache=True, cache_ttl=300, use_subscriptions=False):
     cmdLine = CmdLine()
     cmdLine.apic = apic
+    cmdLine.cache.enabled = use_cache
+    cmdLine.cache.ttl = cache_ttl
+    cmdLine.cache.use_subscriptions = use_subscriptions
     cmdLine.cmdloop()
 
 # *** MAIN LOOP ***
@@ -1394,15 +1598,19 @@ if __name__ == '__main__':
     OUTPUTFILE = ''
     DEBUGFILE = None
     DEBUGLEVEL = logging.CRITICAL
+    USECACHE = True
+    CACHETTL = 300
+    SUBSCRIBE = False
     usage = ('Usage: acitoolkitcli.py -l <login> -p <password> -u <url> '
-             '[-o <output-file>] [-t <test-file>]')
+             '[-o <output-file>] [-t <test-file>] [-n] [-c <cache-ttl>] [-s]')
     try:
         opts, args = getopt.getopt(sys.argv[1:],
-                                   "hl:p:u:do:f:t:",
+                                   "hl:p:u:do:f:t:nc:s",
                                    ["help", "apic-login=", "apic-password=",
                                     "apic-url=", "enable-debug",
                                     "output-file=", "debug-file=",
-                                    "test-file="])
+                                    "test-file=", "no-cache", "cache-ttl=",
+                                    "subscribe"])
     except getopt.GetoptError:
         print sys.argv[0], ': illegal option'
         print usage
@@ -1425,6 +1633,12 @@ if __name__ == '__main__':
             DEBUGFILE = arg
         elif opt in ('-t', '--test-file'):
             TESTFILE = arg
+        elif opt in ('-n', '--no-cache'):
+            USECACHE = False
+        elif opt in ('-c', '--cache-ttl'):
+            CACHETTL = int(arg)
+        elif opt in ('-s', '--subscribe'):
+            SUBSCRIBE = True
 
     if URL == '' or LOGIN == '' or PASSWORD == '':
         print usage
@@ -1449,6 +1663,6 @@ if __name__ == '__main__':
         sys.stdin = MockStdin(TESTFILE, sys.stdin)
 
     try:
-        main(apic)
+        main(apic, USECACHE, CACHETTL, SUBSCRIBE)
     except KeyboardInterrupt:
         pass
@@ -0,0 +1,271 @@
+"""
+Test cases for the ACI toolkit CLI
+"""
+import sys
+import time
+import unittest
+from StringIO import StringIO
+
+from acitoolkit import AppProfile, EPG, FakeSession, Tenant
+from acitoolkitcli import ApicNameCache, ConfigSubMode, InterfaceConfigSubMode
+
+NUM_TENANTS = 40
+NUM_APPS = 3
+NUM_EPGS = 5
+
+
+class FakeResponse(object):
+    """
+    Response to the subscription requests
+    """
+    def __init__(self, ok):
+        self.ok = ok
+
+
+class CountingFakeSession(FakeSession):
+    """
+    FakeSession that records the URLs of the GET requests
+    """
+    def __init__(self):
+        FakeSession.__init__(self)
+        self.requests = []
+
+    def get(self, url):
+        self.requests.append(url)
+        return FakeSession.get(self, url)
+
+
+def get_session():
+    """
+    Get a fake APIC with tenants containing application profiles,
+    EPGs, bridge domains, contexts and contracts
+    """
+    session = CountingFakeSession()
+    tenants = []
+    for tenant_index in range(NUM_TENANTS):
+        children = [{'fvBD': {'attributes': {'rn': 'BD-bd', 'name': 'bd'}}},
+                    {'fvCtx': {'attributes': {'rn': 'ctx-ctx', 'name': 'ctx'}}},
+                    {'vzBrCP': {'attributes': {'rn': 'brc-contract', 'name': 'contract'}}}]
+        for app_index in range(NUM_APPS):
+            epgs = [{'fvAEPg': {'attributes': {'rn': 'epg-epg%s' % epg_index, 'name': 'epg%s' % epg_index}}}
+                    for epg_index in range(NUM_EPGS)]
+            children.append({'fvAp': {'attributes': {'rn': 'ap-app%s' % app_index, 'name': 'app%s' % app_index},
+                                      'children': epgs}})
+        tenants.append({'fvTenant': {'attributes': {'dn': 'uni/tn-tenant%s' % tenant_index,
+                                                    'name': 'tenant%s' % tenant_index},
+                                     'children': children}})
+    session._fill_data(tenants, None)
+    return session
+
+
+class TestShowCommands(unittest.TestCase):
+    """
+    Test the show commands against the fake APIC
+    """
+    def setUp(self):
+        self.session = get_session()
+        self.cli = ConfigSubMode()
+        self.cli.set_apic(self.session)
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+
+    def test_parse_dn(self):
+        """
+        Test getting the names from the DN
+        """
+        self.assertEqual(ApicNameCache._parse_dn('uni/tn-t1/ap-a-1/epg-e1'), ('t1', 'a-1', 'e1'))
+        self.assertEqual(ApicNameCache._parse_dn('uni/tn-t1'), ('t1',))
+
+    def test_show_epg(self):
+        """
+        Test that show epg groups the EPGs of all tenants using a single query
+        """
+        epg_dict = self.cli.do_show('epg', to_return=True)
+        self.assertEqual(len(self.session.requests), 1)
+        self.assertEqual(len(epg_dict), NUM_TENANTS)
+        self.assertEqual(epg_dict['tenant3']['app2'], ['epg%s' % index for index in range(NUM_EPGS)])
+
+    def test_show_request_count(self):
+        """
+        Test the number of requests of the show commands compared with
+        getting the objects of each tenant and application profile
+        """
+        tenants = Tenant.get(self.session)
+        for tenant in tenants:
+            for app in AppProfile.get(self.session, tenant):
+                EPG.get(self.session, app, tenant)
+        per_tenant_requests = len(self.session.requests)
+        self.assertEqual(per_tenant_requests, 1 + NUM_TENANTS + NUM_TENANTS * NUM_APPS)
+
+        self.session.requests = []
+        for object_type in ('tenant', 'bridgedomain', 'context', 'contract', 'app', 'epg'):
+            self.cli.do_show(object_type)
+        self.assertEqual(len(self.session.requests), 6)
+        output = sys.stdout.getvalue()
+        self.assertIn('{0:19} {1:20}'.format('tenant39', 'ctx'), output)
+        self.assertIn('{0:19} {1:20}'.format('tenant0', 'app2'), output)
+
+    def test_cache(self):
+        """
+        Test that the cached names are shared by show and the completion
+        and are refreshed after a configuration command
+        """
+        self.cli.do_show('bridgedomain')
+        self.cli.tenant = Tenant('tenant1')
+        self.cli.bridgedomain_submode.tenant = self.cli.tenant
+        self.assertEqual(self.cli.complete_bridgedomain('', 'bridgedomain ', 13, 13), ['bd'])
+        self.assertEqual(self.cli.bridgedomain_submode.do_show('bridgedomain', to_return=True),
+                         {'tenant1': ['bd']})
+        self.assertEqual(len(self.session.requests), 1)
+        self.cli.postcmd(None, 'show bridgedomain')
+        self.cli.do_show('bridgedomain')
+        self.assertEqual(len(self.session.requests), 1)
+        self.cli.postcmd(None, 'bridgedomain bd2')
+        self.cli.do_show('bridgedomain')
+        self.assertEqual(len(self.session.requests), 2)
+
+    def test_cache_disabled(self):
+        """
+        Test that every show command queries the APIC when the cache is disabled
+        """
+        self.cli.cache.enabled = False
+        self.cli.do_show('tenant')
+        self.cli.do_show('tenant')
+        self.assertEqual(len(self.session.requests), 2)
+
+
+class TestCompletion(unittest.TestCase):
+    """
+    Test the command completion using the name cache
+    """
+    def setUp(self):
+        self.session = get_session()
+        self.cli = ConfigSubMode()
+        self.cli.set_apic(self.session)
+        self.cache = self.cli.cache
+        for submode in (self.cli, self.cli.bridgedomain_submode, self.cli.interface_submode,
+                        self.cli.app_submode.epg_submode):
+            submode.tenant = Tenant('tenant2')
+
+    def _wait_for_refresh(self):
+        for attempt in range(100):
+            if not self.cache._refreshing:
+                return
+            time.sleep(0.01)
+        self.fail('Background refresh did not complete')
+
+    def test_lazy_load(self):
+        """
+        Test that the names of an object type are only loaded once and
+        only when they are completed
+        """
+        bd_submode = self.cli.bridgedomain_submode
+        self.assertEqual(bd_submode.complete_context('', 'context ', 8, 8), ['ctx'])
+        self.assertEqual(bd_submode.complete_context('c', 'context c', 8, 9), ['ctx'])
+        self.assertEqual(bd_submode.complete_context('x', 'context x', 8, 9), [])
+        self.assertEqual(len(self.session.requests), 1)
+        self.assertEqual(list(self.cache._names.keys()), ['context'])
+
+        epg_submode = self.cli.app_submode.epg_submode
+        self.assertEqual(epg_submode.complete_bridgedomain('', 'bridgedomain ', 13, 13), ['bd'])
+        self.assertEqual(len(self.session.requests), 2)
+
+    def test_epg_completion(self):
+        """
+        Test the completion of the EPG names of an interface
+        """
+        intf_submode = self.cli.interface_submode
+        self.assertIsInstance(intf_submode, InterfaceConfigSubMode)
+        self.assertEqual(intf_submode.complete_epg('app1', 'epg app1', 4, 8),
+                         ['app1/epg%s' % index for index in range(NUM_EPGS)])
+
+    def _expire(self, object_type):
+        load_time, names = self.cache._names[object_type]
+        self.cache._names[object_type] = (load_time - self.cache.ttl - 1, names)
+
+    def test_ttl_refresh(self):
+        """
+        Test that expired names are returned to the completion while they
+        are reloaded in the background
+        """
+        self.cache.ttl = 60
+        self.assertEqual(self.cli.complete_bridgedomain('', 'bridgedomain ', 13, 13), ['bd'])
+        self.session._fill_data([{'fvBD': {'attributes': {'dn': 'uni/tn-tenant2/BD-bd2', 'name': 'bd2'}}}], None)
+        self.assertEqual(self.cli.complete_bridgedomain('', 'bridgedomain ', 13, 13), ['bd'])
+        self.assertEqual(len(self.session.requests), 1)
+
+        self._expire('bridgedomain')
+        self.assertEqual(self.cli.complete_bridgedomain('', 'bridgedomain ', 13, 13), ['bd'])
+        self._wait_for_refresh()
+        self.assertEqual(len(self.session.requests), 2)
+        self.assertEqual(self.cli.complete_bridgedomain('', 'bridgedomain ', 13, 13), ['bd', 'bd2'])
+
+    def test_ttl_show(self):
+        """
+        Test that show reloads the expired names before displaying them
+        """
+        self.assertIsNotNone(self.cache.ttl)
+        self.assertNotIn('new', self.cli.do_show('tenant', to_return=True))
+        self.session._fill_data([{'fvTenant': {'attributes': {'dn': 'uni/tn-new', 'name': 'new'}}}], None)
+        self._expire('tenant')
+        self.assertIn('new', self.cli.do_show('tenant', to_return=True))
+        self.assertEqual(len(self.session.requests), 2)
+        self.assertFalse(self.cache._refreshing)
+
+    def test_subscription(self):
+        """
+        Test that the names are updated from the subscription events
+        without querying the APIC again
+        """
+        subscriptions = []
+        events = []
+
+        def subscribe(url, only_new=False):
+            subscriptions.append(url)
+            return FakeResponse(True)
+        self.session.subscribe = subscribe
+        self.session.has_events = lambda url: len(events) > 0
+        self.session.get_event = lambda url: events.pop(0)
+        self.cache.use_subscriptions = True
+
+        self.assertEqual(len(self.cache.get('bridgedomain', 'tenant2')), 1)
+        self.assertEqual(subscriptions, ['/api/class/fvBD.json?subscription=yes'])
+        events.append({'imdata': [{'fvBD': {'attributes': {'dn': 'uni/tn-tenant2/BD-bd2',
+                                                           'status': 'created'}}}]})
+        events.append({'imdata': [{'fvBD': {'attributes': {'dn': 'uni/tn-tenant2/BD-bd',
+                                                           'status': 'deleted'}}}]})
+        self.assertEqual(self.cli.complete_bridgedomain('', 'bridgedomain ', 13, 13), ['bd2'])
+        self.cli.postcmd(None, 'bridgedomain bd3')
+        self.assertEqual(self.cache.get('bridgedomain', 'tenant2'), [('tenant2', 'bd2')])
+        self.assertEqual(len(self.session.requests), 1)
+        self.assertEqual(len(subscriptions), 1)
+
+    def test_subscription_failure(self):
+        """
+        Test that the names are refreshed using the ttl when the subscription fails
+        """
+        subscriptions = []
+
+        def subscribe(url, only_new=False):
+            subscriptions.append(url)
+            return FakeResponse(False) if len(subscriptions) == 1 else None
+        self.session.subscribe = subscribe
+        self.cache.use_subscriptions = True
+
+        self.assertEqual(self.cli.complete_bridgedomain('', 'bridgedomain ', 13, 13), ['bd'])
+        self.assertEqual(self.cli.complete_bridgedomain('', 'bridgedomain ', 13, 13), ['bd'])
+        self.assertEqual(self.cache._subscribed, set())
+        self.assertEqual(len(subscriptions), 1)
+        self.session._fill_data([{'fvBD': {'attributes': {'dn': 'uni/tn-tenant2/BD-bd2', 'name': 'bd2'}}}], None)
+        self._expire('bridgedomain')
+        self.assertEqual(self.cache.get('bridgedomain', 'tenant2'), [('tenant2', 'bd'), ('tenant2', 'bd2')])
+        self.assertEqual(self.cache._subscribed, set())
+        self.assertEqual(len(subscriptions), 2)
+        self.assertEqual(len(self.session.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
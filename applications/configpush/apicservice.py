@@ -823,6 +823,17 @@ class ConfigDB(object):
         return config_change
 
 
+class _JsonSizeCounter(object):
+    """
+    File-like object that only counts the characters written to it
+    """
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+
 class ApicService(GenericService):
     """
     Service to communicate with the APIC
@@ -842,6 +853,19 @@ class ApicService(GenericService):
         self._use_ip_epgs = False
         self._use_certificate_authentication = False
 
+    @staticmethod
+    def _get_json_size(tenant):
+        """
+        Get the size of the JSON that would be pushed for the tenant
+        without building the JSON string.
+
+        :param tenant: Tenant instance
+        :return: Integer containing the number of characters in the JSON
+        """
+        json_size = _JsonSizeCounter()
+        tenant.write_json(json_size)
+        return json_size.size
+
     def set_tenant_name(self, name):
         """
         Set the Tenant name
@@ -1232,7 +1256,7 @@ class ApicService(GenericService):
                                             prot=whitelist_policy.proto,
                                             parent=contract)
             if not self.displayonly:
-                if len(str(tenant.get_json())) > THROTTLE_SIZE:
+                if self._get_json_size(tenant) > THROTTLE_SIZE:
                     logging.debug('Throttling contracts. Pushing config...')
                     resp = tenant.push_to_apic(apic)
                     if not resp.ok:
@@ -1424,7 +1448,7 @@ class ApicService(GenericService):
             for epg_policy in self.cdb.get_epg_policies():
                 if not self.displayonly:
                     # Check if we need to throttle very large configs
-                    if len(str(tenant.get_json())) > THROTTLE_SIZE:
+                    if self._get_json_size(tenant) > THROTTLE_SIZE:
                         resp = tenant.push_to_apic(apic)
                         if not resp.ok:
                             return resp.content
@@ -1715,7 +1739,7 @@ class ApicService(GenericService):
                         self.consume_and_provide_contracts_for_epgs(epg_policy, epg, tenant)
                         if not self.displayonly:
                             # Check if we need to throttle very large configs
-                            if len(str(tenant.get_json())) > THROTTLE_SIZE:
+                            if self._get_json_size(tenant) > THROTTLE_SIZE:
                                 resp = tenant.push_to_apic(apic)
                                 if not resp.ok:
                                     return resp.content
@@ -1759,7 +1783,7 @@ class ApicService(GenericService):
                             self.consume_and_provide_contracts_for_epgs(l3out_epg_policy, epg, tenant)
                             if not self.displayonly:
                                 # Check if we need to throttle very large configs
-                                if len(str(tenant.get_json())) > THROTTLE_SIZE:
+                                if self._get_json_size(tenant) > THROTTLE_SIZE:
                                     resp = tenant.push_to_apic(apic)
                                     if not resp.ok:
                                         return resp.content
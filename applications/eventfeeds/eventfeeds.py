@@ -1,4 +1,3 @@
-from collections import namedtuple
 import datetime
 import json
 import logging
@@ -14,6 +13,7 @@ from acitoolkit import (
     AppProfile, BridgeDomain, Context, Contract, Credentials, Endpoint, EPG,
     Session, Tenant
 )
+from eventstore import EventStore, TableRow
 
 
 disable_warnings()
@@ -121,23 +121,17 @@ class EventMonitor(threading.Thread):
         evnt_logger.addHandler(stdout)
         evnt_logger.info('Starting Thread')
         evnt_logger.info('Getting DB Connection')
+        store = EventStore(feed.cfg['events_db'],
+                           commit_size=feed.cfg['commit_size'],
+                           commit_interval=feed.cfg['commit_interval'],
+                           max_age=feed.cfg['max_event_age'],
+                           max_count=feed.cfg['max_event_count'])
         try:
-            conn = _get_db()
+            store.open()
         except sqlite3.Error as e:
-            evnt_logger.critical('Could not get handle to DB: %s', e.message)
+            evnt_logger.critical('Could not get handle to DB: %s', e)
             sys.exit(1)
 
-        # Create table
-        evnt_cursor = conn.cursor()
-        try:
-            evnt_cursor.execute(
-                '''CREATE TABLE IF NOT EXISTS events (cls TEXT, name TEXT, timestamp timestamp, json TEXT, url TEXT)''')
-            evnt_cursor.execute(
-                '''CREATE INDEX IF NOT EXISTS datetime_index ON events (timestamp DESC)''')
-            conn.commit()
-        except sqlite3.OperationalError:
-            evnt_logger.info('No need to create Table')
-
         # Login to APIC
         session = Session(self.url, self.login, self.password)
         resp = session.login()
@@ -152,11 +146,13 @@ class EventMonitor(threading.Thread):
             cls.subscribe(session)
             evnt_logger.info('Subscribed to %s', cls.__name__)
 
-        TableRow = namedtuple('TableRow', ('cls', 'name', 'timestamp', 'json', 'url'))
         while True:
             try:
+                # Block until the websocket delivers an event or the pending
+                # batch is due to be committed
+                session.wait_for_events(timeout=store.time_until_due())
                 for cls in selected_classes:
-                    if cls.has_events(session):
+                    while cls.has_events(session):
                         event_object = cls.get_event(session)
 
                         row = TableRow(
@@ -166,12 +162,13 @@ class EventMonitor(threading.Thread):
                             json=json.dumps(event_object.get_json()),
                             url='Not Implemented')
 
-                        evnt_cursor.execute('INSERT INTO events VALUES (?, ?, ?, ?, ?)', row)
-                        conn.commit()
+                        store.add(row)
                         evnt_logger.info('[%s] Update to %s', event_object.__class__.__name__, event_object)
+                store.run_periodic()
 
             except KeyboardInterrupt:
                 evnt_logger.info('Closing Down')
+                store.close()
                 return
 
 
@@ -274,7 +271,11 @@ class FeedCfg(object):
         default_config = {
             'log_file': 'feed.log',
             'events_db': 'events.db',
-            'classes': ['Tenant']
+            'classes': ['Tenant'],
+            'commit_size': 500,
+            'commit_interval': 1.0,
+            'max_event_age': 365,
+            'max_event_count': 1000000
         }
 
         try:
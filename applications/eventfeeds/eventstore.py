@@ -0,0 +1,114 @@
+"""
+SQLite backed store for the events collected by EventFeeds.
+
+Events are buffered and written in group commits, the database uses
+write-ahead logging so that the feed readers do not block the writer,
+and old events are pruned according to the configured retention.
+"""
+from collections import namedtuple
+import datetime
+import logging
+import sqlite3
+import time
+
+TableRow = namedtuple('TableRow', ('cls', 'name', 'timestamp', 'json', 'url'))
+
+
+class EventStore(object):
+    """
+        EventStore buffers the events and writes them to the events
+        table in batches.
+
+        A batch is committed when it holds commit_size events or when
+        commit_interval seconds have passed since the last commit.
+        Events older than max_age days and all but the newest
+        max_count events are removed every compact_interval seconds.
+    """
+
+    def __init__(self, db_file, commit_size=500, commit_interval=1.0,
+                 max_age=None, max_count=None, compact_interval=60):
+        self.db_file = db_file
+        self.commit_size = commit_size
+        self.commit_interval = commit_interval
+        self.max_age = max_age
+        self.max_count = max_count
+        self.compact_interval = compact_interval
+        self.conn = None
+        self._pending = []
+        self._last_commit = time.time()
+        self._last_compact = time.time()
+
+    def open(self):
+        """Connect to the database and create the table and indexes if needed"""
+        self.conn = sqlite3.connect(self.db_file, detect_types=sqlite3.PARSE_DECLTYPES)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            '''CREATE TABLE IF NOT EXISTS events (cls TEXT, name TEXT, timestamp timestamp, json TEXT, url TEXT)''')
+        self.conn.execute(
+            '''CREATE INDEX IF NOT EXISTS datetime_index ON events (timestamp DESC)''')
+        self.conn.execute(
+            '''CREATE INDEX IF NOT EXISTS cls_datetime_index ON events (cls, timestamp DESC)''')
+        self.conn.commit()
+
+    def close(self):
+        """Write any pending events and close the database"""
+        self.flush()
+        self.conn.close()
+        self.conn = None
+
+    def add(self, row):
+        """
+            Queue a TableRow to be written to the database.  The pending
+            events are committed once the batch is full.
+        """
+        self._pending.append(row)
+        if len(self._pending) >= self.commit_size:
+            self.flush()
+
+    def flush(self):
+        """Write all of the pending events in a single transaction"""
+        if self._pending:
+            with self.conn:
+                self.conn.executemany('INSERT INTO events VALUES (?, ?, ?, ?, ?)', self._pending)
+            self._pending = []
+        self._last_commit = time.time()
+
+    def compact(self, now=None):
+        """
+            Delete the events that are older than max_age days and all
+            but the newest max_count events.
+
+            :returns: Number of events deleted
+        """
+        if now is None:
+            now = datetime.datetime.now()
+        deleted = 0
+        with self.conn:
+            if self.max_age is not None:
+                timestamp_limit = now - datetime.timedelta(days=self.max_age)
+                cur = self.conn.execute('DELETE FROM events WHERE timestamp < ?', (timestamp_limit,))
+                deleted += cur.rowcount
+            if self.max_count is not None:
+                cur = self.conn.execute('DELETE FROM events WHERE rowid <= '
+                                        '(SELECT rowid FROM events ORDER BY rowid DESC LIMIT 1 OFFSET ?)',
+                                        (self.max_count,))
+                deleted += cur.rowcount
+        self._last_compact = time.time()
+        if deleted:
+            logging.info('Removed %s events from the events table', deleted)
+        return deleted
+
+    def run_periodic(self):
+        """Commit the pending events and compact the table when their intervals have expired"""
+        current_time = time.time()
+        if current_time - self._last_commit >= self.commit_interval:
+            self.flush()
+        if current_time - self._last_compact >= self.compact_interval:
+            self.compact()
+
+    def time_until_due(self):
+        """Number of seconds until the pending events must be committed"""
+        if not self._pending:
+            return self.commit_interval
+        return max(0, self.commit_interval - (time.time() - self._last_commit))
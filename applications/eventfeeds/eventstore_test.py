@@ -0,0 +1,160 @@
+"""
+Test cases for the EventFeeds event store
+"""
+import datetime
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from eventstore import EventStore, TableRow
+
+
+class CountingConnection(object):
+    """
+    SQLite connection wrapper that counts the transactions and the rows of each executemany
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.batches = []
+        self.transactions = 0
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *args):
+        self.transactions += 1
+        return self.conn.__exit__(*args)
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        self.batches.append(len(rows))
+        return self.conn.executemany(sql, rows)
+
+
+class TestEventStore(unittest.TestCase):
+    """
+    Tests for the batched, retention managed event store
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_file = os.path.join(self.tmp_dir, 'events.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    @staticmethod
+    def _get_row(index, timestamp=None):
+        if timestamp is None:
+            timestamp = datetime.datetime.now()
+        return TableRow(cls='Tenant',
+                        name='tenant-%s' % index,
+                        timestamp=timestamp,
+                        json='{"fvTenant": {"attributes": {"name": "tenant-%s"}}}' % index,
+                        url='Not Implemented')
+
+    def _count_rows(self):
+        conn = sqlite3.connect(self.db_file)
+        count = conn.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+        conn.close()
+        return count
+
+    def test_schema(self):
+        """
+        Test that the table is created in WAL mode with the class index
+        """
+        store = EventStore(self.db_file)
+        store.open()
+        store.close()
+        conn = sqlite3.connect(self.db_file)
+        self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        indexes = [row[1] for row in conn.execute("PRAGMA index_list('events')")]
+        conn.close()
+        self.assertIn('datetime_index', indexes)
+        self.assertIn('cls_datetime_index', indexes)
+
+    def test_group_commit(self):
+        """
+        Test that events are only written once the batch is full or flushed
+        """
+        store = EventStore(self.db_file, commit_size=10, commit_interval=3600)
+        store.open()
+        for index in range(9):
+            store.add(self._get_row(index))
+        self.assertEqual(self._count_rows(), 0)
+        store.add(self._get_row(9))
+        self.assertEqual(self._count_rows(), 10)
+        store.add(self._get_row(10))
+        store.run_periodic()
+        self.assertEqual(self._count_rows(), 10)
+        store.close()
+        self.assertEqual(self._count_rows(), 11)
+
+    def test_commit_interval(self):
+        """
+        Test that a partial batch is written once the commit interval expires
+        """
+        store = EventStore(self.db_file, commit_size=100, commit_interval=0)
+        store.open()
+        store.add(self._get_row(0))
+        self.assertEqual(store.time_until_due(), 0)
+        store.run_periodic()
+        self.assertEqual(self._count_rows(), 1)
+        store.close()
+
+    def test_compact_max_age(self):
+        """
+        Test that events older than the maximum age are removed
+        """
+        store = EventStore(self.db_file, max_age=7)
+        store.open()
+        now = datetime.datetime.now()
+        for index in range(10):
+            store.add(self._get_row(index, now - datetime.timedelta(days=index * 2)))
+        store.flush()
+        self.assertEqual(store.compact(now), 6)
+        self.assertEqual(self._count_rows(), 4)
+        store.close()
+
+    def test_compact_max_count(self):
+        """
+        Test that only the newest events are kept when the count is limited
+        """
+        store = EventStore(self.db_file, max_count=25)
+        store.open()
+        for index in range(100):
+            store.add(self._get_row(index))
+        store.flush()
+        self.assertEqual(store.compact(), 75)
+        self.assertEqual(self._count_rows(), 25)
+        conn = sqlite3.connect(self.db_file)
+        names = [row[0] for row in conn.execute('SELECT name FROM events')]
+        conn.close()
+        self.assertIn('tenant-99', names)
+        self.assertNotIn('tenant-74', names)
+        store.close()
+
+    def test_batched_transactions(self):
+        """
+        Test that the events are inserted in one transaction per batch
+        """
+        store = EventStore(self.db_file, commit_size=500, commit_interval=3600)
+        store.open()
+        store.conn = CountingConnection(store.conn)
+        for index in range(2510):
+            store.add(self._get_row(index))
+        self.assertEqual(store.conn.batches, [500] * 5)
+        self.assertEqual(store.conn.transactions, 5)
+        conn = store.conn
+        store.close()
+        self.assertEqual(conn.batches, [500] * 5 + [10])
+        self.assertEqual(conn.transactions, 6)
+        self.assertEqual(self._count_rows(), 2510)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -236,6 +236,29 @@ class EPGEvent(Event):
     pass
 
 
+class ContractEvent(Event):
+    """
+    Contract and ContractInterface events (vzBrCP and vzCPIf in the APIC object model)
+    """
+    @property
+    def contract_type(self):
+        """
+        Get the contract type as used in the dn
+        :return: String containing 'brc' for Contracts and 'cif' for ContractInterfaces
+        """
+        if self.event_type == 'vzCPIf':
+            return 'cif'
+        return 'brc'
+
+    @property
+    def contract_name(self):
+        """
+        Get the contract name
+        :return: String containing the contract name
+        """
+        return self.dn.partition('/%s-' % self.contract_type)[-1].partition('/')[0]
+
+
 class BaseDB(object):
     """
     Base class for the various databases
@@ -258,10 +281,7 @@ class BaseDB(object):
                     epg['epg_container']['name'],
                     epg['name'])
         elif isinstance(epg, EPGPolicy):
-            return (epg.tenant,
-                    epg.epg_container_type,
-                    epg.epg_container_name,
-                    epg.name)
+            return epg.key
 
     @staticmethod
     def _convert_db_epg_to_policy_epg(epg):
@@ -454,6 +474,44 @@ class RelationDB(BaseDB):
         return name in self.db[epg][action]
 
 
+class ContractDB(BaseDB):
+    """
+    This class is used to track the names of the contracts and contract interfaces present in each tenant
+    """
+    def __init__(self):
+        super(ContractDB, self).__init__()
+        self.db = {}
+
+    def store_contract(self, event):
+        """
+        Store the contract event in the database
+        :param event: ContractEvent instance
+        :return: None
+        """
+        assert isinstance(event, ContractEvent)
+        db_entry = (event.contract_type, event.contract_name)
+        if event.is_deleted():
+            if event.tenant in self.db:
+                self.db[event.tenant].discard(db_entry)
+        else:
+            if event.tenant not in self.db:
+                self.db[event.tenant] = set()
+            self.db[event.tenant].add(db_entry)
+
+    def has_contract(self, tenant_name, contract_name, contract_type='brc'):
+        """
+        Check if the tenant has the contract
+
+        :param tenant_name: String containing the tenant name
+        :param contract_name: String containing the contract name
+        :param contract_type: String containing 'brc' for Contracts and 'cif' for ContractInterfaces
+        :return: True if the tenant has the contract. False otherwise.
+        """
+        if tenant_name not in self.db:
+            return False
+        return (contract_type, contract_name) in self.db[tenant_name]
+
+
 class TagDB(BaseDB):
     """
     This class is used to store all of the inheritance tags present on the APIC
@@ -480,13 +538,13 @@ class TagDB(BaseDB):
             self.db[epg].append(db_entry)
 
     def get_relations(self):
+        """
+        Get the inherited relations for all of the EPGs
+        :return: Dictionary of EPG key to list of tuples containing relation_type, relation_name
+        """
         relations = {}
         for epg in self.db:
-            policy_epg = self._convert_db_epg_to_policy_epg(epg).get_json()
-            if policy_epg not in relations:
-                relations[policy_epg] = []
-            for relation in self.db[epg]:
-                relations[policy_epg].append(relation)
+            relations[epg] = list(self.db[epg])
         return relations
 
     def is_inherited(self, epg, relation):
@@ -515,11 +573,19 @@ class Monitor(threading.Thread):
         self._relation_subscriptions = []
         self._inheritance_tag_subscriptions = []
         self._subnet_subscriptions = []
+        self._contract_subscriptions = []
+        self._contracts = ContractDB()
         self._relations = RelationDB()
         self._inheritance_tags = TagDB()
         self._subnets = SubnetDB()
         self._old_relations = {}
         self.apic = None
+        # EPG keys touched by the events drained since the last calculation
+        self._changed_epgs = set()
+        # Dependency index used to find the policies affected by the changed EPGs
+        self._index_generation = None
+        self._policies_by_parent = {}
+        self._policies_by_l3out = {}
 
     def exit(self):
         """
@@ -573,6 +639,18 @@ class Monitor(threading.Thread):
             subnet_event = SubnetEvent(subnet)
             self._subnets.store_subnet_event(subnet_event)
 
+        # Get all of the contracts and contract interfaces so that their existence can be checked locally.
+        # Subscribe before the query so that no change made in between is missed.  A change seen by both
+        # is stored twice, which leaves the same result.
+        for contract_class in ('vzBrCP', 'vzCPIf'):
+            query_url = '/api/class/%s.json' % contract_class
+            subscription_url = query_url + '?subscription=yes'
+            self.apic.subscribe(subscription_url, only_new=True)
+            self._contract_subscriptions.append(subscription_url)
+            contracts = self.apic.get(query_url)
+            for contract in contracts.json()['imdata']:
+                self._contracts.store_contract(ContractEvent(contract))
+
         # Get all of the inherited relations
         tag_query_url = '/api/class/tagInst.json?query-target-filter=wcard(tagInst.name,"inherited:")'
         tags = self.apic.get(tag_query_url)
@@ -615,11 +693,7 @@ class Monitor(threading.Thread):
     def _does_tenant_have_contract(self, tenant_name, contract_name, contract_type='brc'):
         logging.debug('tenant: %s contract: %s contract_type: %s',
                       tenant_name, contract_name, contract_type)
-        query_url = '/api/mo/uni/tn-%s/%s-%s.json' % (tenant_name,
-                                                      contract_type,
-                                                      contract_name)
-        resp = self.apic.get(query_url)
-        return resp.ok and int(resp.json()['totalCount']) > 0
+        return self._contracts.has_contract(tenant_name, contract_name, contract_type)
 
     def does_tenant_have_contract_if(self, tenant_name, contract_if_name):
         return self._does_tenant_have_contract(tenant_name,
@@ -752,32 +826,96 @@ class Monitor(threading.Thread):
         # Get the relations belonging to that EPG
         return self._relations.get_relations_for_epg(parent_epg)
 
+    def _calculate_relations_for_policy(self, inheritance_policy):
+        if inheritance_policy.epg.is_l3out():
+            return self._calculate_relations_for_l3out_policy(inheritance_policy)
+        # TODO: may eventually need to process l2out
+        return self._calculate_relations_for_app_policy(inheritance_policy)
+
     def calculate_relations(self):
+        """
+        Calculate the relations of all of the enabled inheritance policies
+        :return: Dictionary of EPG key to list of tuples containing relation_type, relation_name
+        """
         relations = {}
         for inheritance_policy in self.cdb.get_inheritance_policies():
             if not inheritance_policy.enabled:
                 continue
-            if inheritance_policy.epg.is_l3out():
-                epg_relations = self._calculate_relations_for_l3out_policy(inheritance_policy)
-            else:
-                # TODO: may eventually need to process l2out
-                epg_relations = self._calculate_relations_for_app_policy(inheritance_policy)
-            relations[inheritance_policy.epg.get_json()] = epg_relations
+            relations[inheritance_policy.epg.key] = self._calculate_relations_for_policy(inheritance_policy)
+        return relations
+
+    def _build_dependency_index(self):
+        """
+        Index the inheritance policies by the EPGs that their relations depend on.
+        App policies depend on the EPG they inherit from.  L3out policies depend on
+        the subnets and relations of all of the EPGs within the same OutsideL3.
+        """
+        self._policies_by_parent = {}
+        self._policies_by_l3out = {}
+        for inheritance_policy in self.cdb.get_inheritance_policies():
+            epg = inheritance_policy.epg
+            if inheritance_policy.has_inherit_from():
+                parent_key = inheritance_policy.inherit_from.key
+                self._policies_by_parent.setdefault(parent_key, set()).add(epg.key)
+            if epg.is_l3out():
+                self._policies_by_l3out.setdefault((epg.tenant, epg.l3out_name), set()).add(epg.key)
+        self._index_generation = self.cdb.generation
+
+    def get_affected_epgs(self, changed_epgs):
+        """
+        Get the EPGs of the inheritance policies whose relations may change because
+        of changes to the subnets, tags or relations of the specified EPGs.
+
+        :param changed_epgs: iterable of EPG keys
+        :return: set of EPG keys
+        """
+        affected = set()
+        for epg in changed_epgs:
+            affected.add(epg)
+            affected.update(self._policies_by_parent.get(epg, ()))
+            (tenant_name, container_type, container_name, epg_name) = epg
+            if container_type == 'l3out':
+                affected.update(self._policies_by_l3out.get((tenant_name, container_name), ()))
+        return affected
+
+    def calculate_changed_relations(self, old_relations, affected_epgs):
+        """
+        Recalculate the relations of only the affected EPGs
+
+        :param old_relations: Dictionary of EPG key to list of relations from the previous calculation
+        :param affected_epgs: set of EPG keys to recalculate
+        :return: Dictionary of EPG key to list of tuples containing relation_type, relation_name
+        """
+        relations = dict(old_relations)
+        for epg in affected_epgs:
+            inheritance_policy = self.cdb.get_inheritance_policy(epg)
+            if inheritance_policy is None or not inheritance_policy.enabled:
+                relations.pop(epg, None)
+                continue
+            relations[epg] = self._calculate_relations_for_policy(inheritance_policy)
         return relations
 
     def process_relation_event(self, event):
         logging.debug('process_event EVENT: %s', event.event)
         self._relations.store_relation(event)
+        self._changed_epgs.add(event.epg.key)
 
     def process_subnet_event(self, event):
         logging.debug('Received subnet event: %s', event)
         # Store the subnet in the SubnetDB
         self._subnets.store_subnet_event(event)
+        self._changed_epgs.add(event.epg.key)
+
+    def process_contract_event(self, event):
+        logging.debug('Received contract event: %s', event)
+        # Store the contract in the ContractDB
+        self._contracts.store_contract(event)
 
     def process_inheritance_tag_event(self, event):
         logging.debug('Received subnet event: %s', event)
         # Store the tag in the TagDB
         self._inheritance_tags.store_tag(event)
+        self._changed_epgs.add(event.epg.key)
 
     def _process_events(self, old_relations):
         while self.apic is None:
@@ -804,48 +942,53 @@ class Monitor(threading.Thread):
                 event = SubnetEvent(self.apic.get_event(subscription)['imdata'][0])
                 self.process_subnet_event(event)
 
-        # Calculate the new set of relations
-        new_relations = self.calculate_relations()
-
-        for old_epg in old_relations:
-            logging.debug(old_epg)
-        for new_epg in new_relations:
-            logging.debug(new_epg)
+        # Check for contract events
+        for subscription in self._contract_subscriptions:
+            while self.apic.has_events(subscription):
+                event = ContractEvent(self.apic.get_event(subscription)['imdata'][0])
+                self.process_contract_event(event)
+
+        # Calculate the new set of relations.  After a configuration change everything is
+        # recalculated, otherwise only the policies depending on the changed EPGs are.
+        if self._index_generation != self.cdb.generation:
+            self._build_dependency_index()
+            new_relations = self.calculate_relations()
+            epgs_to_compare = set(new_relations) | set(old_relations)
+        else:
+            epgs_to_compare = self.get_affected_epgs(self._changed_epgs)
+            new_relations = self.calculate_changed_relations(old_relations, epgs_to_compare)
+        self._changed_epgs = set()
 
         # Compare the old and the new relations for changes
         tenants = []
-        for new_epg in new_relations:
-            if new_epg not in old_relations:
+        for epg_key in epgs_to_compare:
+            epg = BaseDB._convert_db_epg_to_policy_epg(epg_key)
+            if epg_key not in new_relations:
+                for old_relation in old_relations.get(epg_key, []):
+                    if self._inheritance_tags.is_inherited(epg, old_relation):
+                        tenants = self.remove_inherited_relation(tenants, epg, old_relation)
+            elif epg_key not in old_relations:
                 # New EPG, so we need to add all of the relations
-                for new_relation in new_relations[new_epg]:
-                    if self._inheritance_tags.is_inherited(EPGPolicy(json.loads(new_epg)), new_relation):
-                        # If it's inherited, but we don't have the relation. We are likely coming up and not populated
-                        # the old_relations yet
-                        pass
+                for new_relation in new_relations[epg_key]:
                     # If just configured, we will have a relationDB entry. Otherwise, we need to inherit it
-                    if self._relations.has_relation_for_epg(EPGPolicy(json.loads(new_epg)), new_relation):
+                    if self._relations.has_relation_for_epg(epg, new_relation):
                         continue
-                    tenants = self.add_inherited_relation(tenants, EPGPolicy(json.loads(new_epg)), new_relation)
+                    tenants = self.add_inherited_relation(tenants, epg, new_relation)
             else:
                 # Handle any new added relations
-                for new_relation in new_relations[new_epg]:
-                    if new_relation not in old_relations[new_epg]:
-                        if self._relations.has_relation_for_epg(EPGPolicy(json.loads(new_epg)), new_relation):
+                for new_relation in new_relations[epg_key]:
+                    if new_relation not in old_relations[epg_key]:
+                        if self._relations.has_relation_for_epg(epg, new_relation):
                             continue
-                        tenants = self.add_inherited_relation(tenants, EPGPolicy(json.loads(new_epg)), new_relation)
+                        tenants = self.add_inherited_relation(tenants, epg, new_relation)
                 # Handle any deleted relations
-                for old_relation in old_relations[new_epg]:
-                    if old_relation not in new_relations[new_epg]:
-                        if self._inheritance_tags.is_inherited(EPGPolicy(json.loads(new_epg)), old_relation):
-                            tenants = self.remove_inherited_relation(tenants, EPGPolicy(json.loads(new_epg)), old_relation)
+                for old_relation in old_relations[epg_key]:
+                    if old_relation not in new_relations[epg_key]:
+                        if self._inheritance_tags.is_inherited(epg, old_relation):
+                            tenants = self.remove_inherited_relation(tenants, epg, old_relation)
                         else:
                             # Must have been configured and manually deleted
                             pass
-        for old_epg in old_relations:
-            if old_epg not in new_relations:
-                for old_relation in old_relations[old_epg]:
-                    if self._inheritance_tags.is_inherited(EPGPolicy(json.loads(old_epg)), old_relation):
-                        tenants = self.remove_inherited_relation(tenants, EPGPolicy(json.loads(old_epg)), old_relation)
 
         # Push the necessary config to the APIC
         for tenant in tenants:
@@ -891,6 +1034,9 @@ class PolicyObject(object):
     def __eq__(self, other):
         return self._policy == other._policy
 
+    def __ne__(self, other):
+        return not self == other
+
     def __str__(self):
         return str(self._policy)
 
@@ -918,6 +1064,17 @@ class EPGPolicy(PolicyObject):
     def name(self):
         return self._policy['name']
 
+    @property
+    def key(self):
+        """
+        Structured identity of the EPG
+        :return: Tuple containing strings for tenant name, epg container type, epg container name, epg name
+        """
+        return (self.tenant, self.epg_container_type, self.epg_container_name, self.name)
+
+    def __hash__(self):
+        return hash(self.key)
+
     def is_l3out(self):
         return self.epg_container_type == 'l3out'
 
@@ -978,6 +1135,9 @@ class ConfigDB(object):
     def __init__(self):
         self._apic_policy = None
         self._inheritance_policies = []
+        self._inheritance_policy_index = {}
+        # Incremented whenever the inheritance policies change
+        self.generation = 0
 
     def store_apic_config(self, new_config):
         """
@@ -1020,32 +1180,39 @@ class ConfigDB(object):
         :return: True if config has changed from previous config. False if no change.
         """
         inheritance_policy = InheritancePolicy(inheritance_policy)
-        for configured_policy in self.get_inheritance_policies():
+        configured_policy = self.get_inheritance_policy(inheritance_policy.epg)
+        if configured_policy is not None:
             # If we already have this policy, we're done
             if configured_policy == inheritance_policy:
                 return False
-            # Check if the EPG is the same
-            if configured_policy.epg == inheritance_policy.epg:
-                # Something must have changed. Replace the old policy with the new one.
-                self.remove_inheritance_policy(configured_policy)
-                self.add_inheritance_policy(inheritance_policy)
-                return True
+            # Something must have changed. Replace the old policy with the new one.
+            self.remove_inheritance_policy(configured_policy)
+            self.add_inheritance_policy(inheritance_policy)
+            return True
         # If we get this far, we must not have the policy
         self.add_inheritance_policy(inheritance_policy)
         return True
 
     def get_inheritance_policy(self, epg):
-        for configured_policy in self.get_inheritance_policies():
-            # If we already have this policy, we're done
-            if configured_policy.epg == epg:
-                return configured_policy
-        return None
+        """
+        Get the inheritance policy for an EPG
+
+        :param epg: EPGPolicy instance or EPG key tuple
+        :return: InheritancePolicy instance or None if there is no policy for the EPG
+        """
+        if isinstance(epg, EPGPolicy):
+            epg = epg.key
+        return self._inheritance_policy_index.get(epg)
 
     def remove_inheritance_policy(self, policy):
         self._inheritance_policies.remove(policy)
+        del self._inheritance_policy_index[policy.epg.key]
+        self.generation += 1
 
     def add_inheritance_policy(self, policy):
         self._inheritance_policies.append(policy)
+        self._inheritance_policy_index[policy.epg.key] = policy
+        self.generation += 1
 
     def get_inheritance_policies(self):
         return self._inheritance_policies
@@ -2,7 +2,8 @@
 Inheritance test suite
 """
 import unittest
-from inheritance import execute_tool
+from inheritance import (execute_tool, ConfigDB, ContractEvent, Monitor,
+                         RelationEvent, SubnetEvent)
 from acitoolkit import (Tenant, Context, OutsideL3, OutsideEPG, OutsideNetwork,
                         Contract, FilterEntry, Session, AppProfile, EPG,
                         ContractInterface, Fabric)
@@ -11,6 +12,7 @@ import sys
 import logging
 from logging.handlers import RotatingFileHandler
 import argparse
+import mock
 from os import getpid
 from ConfigParser import ConfigParser, NoSectionError, NoOptionError
 
@@ -210,6 +212,192 @@ class TestWithoutApicCommunication(unittest.TestCase):
         self.assertTrue(fake_out.verify_output([sample_config, '\n']))
 
 
+class FakeMonitorSession(object):
+    """
+    Fake APIC session that feeds queued events to the Monitor and records the pushes
+    """
+    def __init__(self):
+        self.events = {}
+        self.pushes = []
+        self.gets = []
+
+    def queue_event(self, url, event):
+        if url not in self.events:
+            self.events[url] = []
+        self.events[url].append({'imdata': [event]})
+
+    def has_events(self, url):
+        return len(self.events.get(url, [])) > 0
+
+    def get_event(self, url):
+        return self.events[url].pop(0)
+
+    def get(self, url):
+        self.gets.append(url)
+
+        class FakeResponse(object):
+            ok = True
+
+            @staticmethod
+            def json():
+                return {'totalCount': '0', 'imdata': []}
+        return FakeResponse()
+
+    def push_to_apic(self, url, data):
+        self.pushes.append((url, data))
+
+        class FakeResponse(object):
+            ok = True
+        return FakeResponse()
+
+
+class TestMonitorWithFakeSession(unittest.TestCase):
+    """
+    Monitor tests and benchmark with many policies using a fake APIC session
+    """
+    num_tenants = 50
+    num_epgs = 100
+    subnet_subscription = 'subnets'
+    contract_subscription = 'contracts'
+
+    @staticmethod
+    def _get_epg(tenant_name, epg_name):
+        return {'tenant': tenant_name,
+                'epg_container': {'name': 'l3out', 'container_type': 'l3out'},
+                'name': epg_name}
+
+    @staticmethod
+    def _get_subnet_event(tenant_name, epg_name, subnet):
+        dn = 'uni/tn-%s/out-l3out/instP-%s/extsubnet-[%s]' % (tenant_name, epg_name, subnet)
+        return {'l3extSubnet': {'attributes': {'dn': dn, 'status': 'created'}}}
+
+    @staticmethod
+    def _get_contract_event(tenant_name, contract_name, status='created'):
+        dn = 'uni/tn-%s/brc-%s' % (tenant_name, contract_name)
+        return {'vzBrCP': {'attributes': {'dn': dn, 'name': contract_name, 'status': status}}}
+
+    @staticmethod
+    def _get_pushed_contracts(pushes):
+        contracts = []
+        for url, tenant_json in pushes:
+            for child in tenant_json['fvTenant']['children']:
+                if 'vzBrCP' in child:
+                    contracts.append((tenant_json['fvTenant']['attributes']['name'],
+                                      child['vzBrCP']['attributes']['name']))
+        return contracts
+
+    def setUp(self):
+        self.cdb = ConfigDB()
+        self.monitor = Monitor(self.cdb)
+        self.monitor.apic = FakeMonitorSession()
+        self.monitor._subnet_subscriptions.append(self.subnet_subscription)
+        self.monitor._contract_subscriptions.append(self.contract_subscription)
+        self.calculations = 0
+        calculate = self.monitor._calculate_relations_for_policy
+
+        def counting_calculate(policy):
+            self.calculations += 1
+            return calculate(policy)
+        self.monitor._calculate_relations_for_policy = counting_calculate
+
+        for tenant_index in range(self.num_tenants):
+            tenant_name = 'tenant%s' % tenant_index
+            self.monitor.process_contract_event(ContractEvent(self._get_contract_event(tenant_name, 'contract')))
+            self.cdb.store_inheritance_policy({'epg': self._get_epg(tenant_name, 'parent'),
+                                               'allowed': True, 'enabled': False})
+            self.monitor.process_subnet_event(SubnetEvent(self._get_subnet_event(tenant_name, 'parent',
+                                                                                  '10.0.0.0/8')))
+            dn = 'uni/tn-%s/out-l3out/instP-parent/rsprov-contract' % tenant_name
+            self.monitor.process_relation_event(RelationEvent({'fvRsProv': {'attributes': {'dn': dn,
+                                                                                            'status': 'created'}}}))
+            for epg_index in range(self.num_epgs):
+                epg_name = 'child%s' % epg_index
+                self.cdb.store_inheritance_policy({'epg': self._get_epg(tenant_name, epg_name),
+                                                   'allowed': False, 'enabled': True})
+                subnet = '10.%s.%s.0/24' % (epg_index // 256, epg_index % 256)
+                self.monitor.process_subnet_event(SubnetEvent(self._get_subnet_event(tenant_name, epg_name,
+                                                                                     subnet)))
+
+    def test_contracts_subscribed_before_query(self):
+        """
+        Test that the contracts are subscribed to before they are queried so that no change is missed
+        """
+        calls = []
+
+        class RecordingSession(FakeMonitorSession):
+            def __init__(self, url, user_name, password):
+                FakeMonitorSession.__init__(self)
+
+            def login(self):
+                return None
+
+            def subscribe(self, url, only_new=False):
+                calls.append(('subscribe', url.split('?')[0]))
+
+            def get(self, url):
+                calls.append(('get', url))
+                return FakeMonitorSession.get(self, url)
+
+        monitor = Monitor(ConfigDB())
+        monitor.cdb.store_apic_config({'apic': {'user_name': 'admin', 'password': 'password',
+                                                'ip_address': '0.0.0.0', 'use_https': False}})
+        with mock.patch('inheritance.Session', RecordingSession):
+            monitor.connect_to_apic()
+        for contract_class in ('vzBrCP', 'vzCPIf'):
+            url = '/api/class/%s.json' % contract_class
+            self.assertLess(calls.index(('subscribe', url)), calls.index(('get', url)))
+
+    def test_single_subnet_change(self):
+        num_policies = self.num_tenants * (self.num_epgs + 1)
+        self.assertEqual(len(self.cdb.get_inheritance_policies()), num_policies)
+
+        start_time = time.time()
+        old_relations = self.monitor._process_events({})
+        full_time = time.time() - start_time
+        self.assertEqual(self.calculations, self.num_tenants * self.num_epgs)
+        self.assertEqual(len(old_relations), self.num_tenants * self.num_epgs)
+        self.assertEqual(len(self.monitor.apic.pushes), self.num_tenants)
+        self.assertEqual(len(self.monitor.apic.gets), 0)
+        for relations in old_relations.values():
+            self.assertEqual(relations, [('fvRsProv', 'contract')])
+
+        # Add a new subnet to an EPG in one of the tenants
+        self.calculations = 0
+        self.monitor.apic.pushes = []
+        self.monitor.apic.queue_event(self.subnet_subscription,
+                                      self._get_subnet_event('tenant0', 'child0', '11.0.0.0/24'))
+        start_time = time.time()
+        new_relations = self.monitor._process_events(old_relations)
+        incremental_time = time.time() - start_time
+        logging.info('Full calculation: %s seconds. Incremental calculation: %s seconds',
+                     full_time, incremental_time)
+
+        # Only the enabled policies in the same OutsideL3 are recalculated
+        self.assertEqual(self.calculations, self.num_epgs)
+        self.assertEqual(new_relations, old_relations)
+        self.assertEqual(len(self.monitor.apic.pushes), 0)
+
+    def test_contract_existence_from_events(self):
+        # Contract deleted from one tenant, e.g. the contract is really provided from tenant common
+        self.monitor.apic.queue_event(self.contract_subscription,
+                                      self._get_contract_event('tenant1', 'contract', status='deleted'))
+        self.monitor._process_events({})
+        pushed_contracts = self._get_pushed_contracts(self.monitor.apic.pushes)
+        self.assertEqual(len(pushed_contracts), self.num_tenants - 1)
+        self.assertNotIn(('tenant1', 'contract'), pushed_contracts)
+        self.assertIn(('tenant0', 'contract'), pushed_contracts)
+        self.assertEqual(len(self.monitor.apic.gets), 0)
+
+    def test_config_change_recalculates_all(self):
+        old_relations = self.monitor._process_events({})
+        self.calculations = 0
+        self.cdb.store_inheritance_policy({'epg': self._get_epg('tenant0', 'child0'),
+                                           'allowed': False, 'enabled': False})
+        new_relations = self.monitor._process_events(old_relations)
+        self.assertEqual(self.calculations, self.num_tenants * self.num_epgs - 1)
+        self.assertNotIn(('tenant0', 'l3out', 'l3out', 'child0'), new_relations)
+
+
 class BaseBasicL3Out(BaseTestCase):
     """
     Base class for basic Inheritance test cases enabled on OutsideEPGs
@@ -2468,13 +2656,22 @@ if __name__ == '__main__':
     if config_filename is None:
         config_filename = DEFAULT_INI_FILENAME
     credentials.set_config(config_filename)
-    if credentials.ip_address == '0.0.0.0':
-        print 'APIC credentials not given. Please ensure that there is a .ini file present and credentials are filled in.'
-        sys.exit()
 
     # Run the tests
+    offline = unittest.TestSuite()
+    offline.addTest(unittest.makeSuite(TestWithoutApicCommunication))
+    offline.addTest(unittest.makeSuite(TestMonitorWithFakeSession))
+
+    try:
+        has_credentials = credentials.ip_address != '0.0.0.0'
+    except ValueError:
+        has_credentials = False
+    if not has_credentials:
+        print 'APIC credentials not given. Running only the offline tests.'
+        unittest.main(defaultTest='offline', argv=sys.argv[:1] + unittest_args)
+
     live = unittest.TestSuite()
-    live.addTest(unittest.makeSuite(TestWithoutApicCommunication))
+    live.addTest(offline)
     live.addTest(unittest.makeSuite(TestBasicL3Out))
     live.addTest(unittest.makeSuite(TestContractEvents))
     live.addTest(unittest.makeSuite(TestSubnetEvents))
@@ -23,7 +23,13 @@ from acitoolkit.aciConcreteLib import ConcreteTunnel
 
 __author__ = 'edsall'
 
+import logging
 from operator import itemgetter
+import re
+import threading
+import time
+
+from six.moves.queue import Queue, Empty
 
 import acitoolkit as ACI
 
@@ -68,32 +74,179 @@ class LoginError(Exception):
     pass
 
 
+class ReportCache(object):
+    """
+    Thread safe cache of built reports keyed by switch id or tenant name.
+    Entries expire after ttl seconds and can be invalidated explicitly.
+    Clearing the cache starts a new generation and the reports of builds
+    started in an older generation are dropped instead of being stored.
+    """
+
+    def __init__(self, ttl=300):
+        """
+        Initializer
+
+        :param ttl: Number of seconds a report stays valid. None means forever.
+        """
+        self.ttl = ttl
+        self._records = {}
+        self._building = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _is_valid(self, key):
+        if key not in self._records:
+            return False
+        if self.ttl is None:
+            return True
+        timestamp, record = self._records[key]
+        return time.time() - timestamp < self.ttl
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._is_valid(key)
+
+    def get(self, key):
+        """
+        Get a cached report
+
+        :param key: switch id or tenant name
+        :return: report record or None if not cached or expired
+        """
+        with self._lock:
+            if self._is_valid(key):
+                return self._records[key][1]
+        return None
+
+    def set(self, key, record, generation=None):
+        """
+        Store a report in the cache
+
+        :param key: switch id or tenant name
+        :param record: report record
+        :param generation: Optional generation in which the report build was\
+                           started. The report is dropped if the cache has\
+                           been cleared since.
+        """
+        with self._lock:
+            if generation is None or generation == self._generation:
+                self._records[key] = (time.time(), record)
+
+    def get_or_build(self, key, build_fn):
+        """
+        Get a cached report and build it using build_fn if it is not cached.
+        Concurrent callers asking for the same key wait for the build in progress
+        rather than building the same report again.
+
+        :param key: switch id or tenant name
+        :param build_fn: function taking the key and returning the report record
+        :return: report record
+        """
+        with self._lock:
+            if self._is_valid(key):
+                return self._records[key][1]
+            key_lock = self._building.setdefault(key, threading.Lock())
+            generation = self._generation
+        with key_lock:
+            record = self.get(key)
+            if record is None:
+                record = build_fn(key)
+                self.set(key, record, generation)
+        return record
+
+    def invalidate(self, key):
+        """
+        Remove a report from the cache
+
+        :param key: switch id or tenant name
+        """
+        with self._lock:
+            self._records.pop(key, None)
+
+    def clear(self):
+        """
+        Remove all of the reports from the cache
+        """
+        with self._lock:
+            self._records = {}
+            self._generation += 1
+
+
+class ReportPrefetcher(threading.Thread):
+    """
+    Thread that periodically builds the reports of all of the switches so that
+    they can be served from the cache.
+    """
+
+    def __init__(self, rdb, max_workers=4, interval=60):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._rdb = rdb
+        self._max_workers = max_workers
+        self._interval = interval
+        self._exit = threading.Event()
+
+    def exit(self):
+        """
+        Indicate that the thread should exit.
+        """
+        self._exit.set()
+
+    def run(self):
+        while not self._exit.is_set():
+            try:
+                self._rdb.prefetch_switches(self._max_workers)
+            except LoginError:
+                logging.error('Could not prefetch switch reports due to LoginError')
+            except Exception:
+                logging.exception('Could not prefetch switch reports')
+            self._exit.wait(self._interval)
+
+
 class ReportDB(object):
     """
     This class holds all of the objects that a report can be generated for.
     """
-
-    def __init__(self):
+    # APIC classes whose changes invalidate the cached switch reports.  The
+    # endpoints and the TCAM rules are left out: subscribing downloads the
+    # whole fabric table of each class and their churn would invalidate
+    # nearly every report, so their reports are refreshed by the cache TTL.
+    switch_event_classes = ['eqptLC', 'eqptSupC', 'eqptFt', 'eqptPsu', 'l3Ctx', 'l2BD',
+                            'sviIf', 'pcAggrIf', 'vpcIf', 'tunnelIf']
+    # APIC classes whose changes invalidate the cached tenant reports
+    tenant_event_classes = ['fvTenant', 'fvCtx', 'fvBD', 'vzBrCP', 'vzTaboo', 'vzEntry',
+                            'fvAp', 'fvAEPg']
+
+    def __init__(self, cache_ttl=300):
         """
         Initializer
+
+        :param cache_ttl: Number of seconds a built report is served from the cache
         """
         self._session = None
+        self._session_lock = threading.Lock()
         self.resp = None
-        self.built_switches = {}
-        self.built_tenants = {}
+        self.built_switches = ReportCache(cache_ttl)
+        self.built_tenants = ReportCache(cache_ttl)
         self.args = None
         self.timeout = 2
         self.switches = {}
         self.all_switches = []
+        self._subscription_urls = []
+        self._prefetcher = None
 
     def clear_switch_info(self):
         """
         This will clear out the switch info to force a reload of the switch information from the APIC.
         :return:
         """
+        self.stop_prefetch()
+        with self._session_lock:
+            self._subscription_urls = []
+            self._session = None
         self.switches = {}
-        self.built_switches = {}
-        self._session = None
+        self.built_switches.clear()
+        self.built_tenants.clear()
 
     def get_switches(self):
 
@@ -303,20 +456,134 @@ class ReportDB(object):
         """
         session property will return an active session that has been logged in
         If a login had not previously occurred, it will proactively login first.
+        The session is created under a lock so that the prefetch workers and the
+        GUI requests share a single login.
         :return: Session
         """
-        if self._session is None:
-            if self.args is not None:
-                if self.args.login is not None:
-                    self._session = ACI.Session(self.args.url, self.args.login, self.args.password)
-                    resp = self.session.login(self.timeout)
-                else:
-                    raise LoginError
-            else:
+        with self._session_lock:
+            if self._session is not None:
+                return self._session
+            if self.args is None or self.args.login is None:
                 raise LoginError
+            session = self._create_session()
+            resp = session.login(self.timeout)
             if not resp.ok:
                 raise LoginError
-        return self._session
+            self._session = session
+        # Subscribing gets the current objects of every class so it is done
+        # without holding up the other threads waiting for the session
+        self._subscribe(session)
+        return session
+
+    def _create_session(self):
+        """
+        Create the session to the APIC of the login credentials
+
+        :return: Session
+        """
+        return ACI.Session(self.args.url, self.args.login, self.args.password)
+
+    def _subscribe(self, session):
+        """
+        Subscribe to the APIC classes that are used to invalidate the cached reports
+
+        :param session: Session to subscribe with
+        """
+        subscription_urls = []
+        for class_name in self.switch_event_classes + self.tenant_event_classes:
+            url = '/api/class/%s.json?subscription=yes' % class_name
+            resp = session.subscribe(url, only_new=True)
+            if resp is not None and resp.ok:
+                subscription_urls.append(url)
+        with self._session_lock:
+            # the credentials may have changed while subscribing
+            if self._session is session:
+                self._subscription_urls = subscription_urls
+
+    def process_events(self):
+        """
+        Drain the pending subscription events and invalidate the cached reports of
+        the switches and tenants that they belong to.
+        """
+        if self._session is None:
+            return
+        for url in self._subscription_urls:
+            while self._session.has_events(url):
+                event = self._session.get_event(url)
+                for item in event['imdata']:
+                    for class_name in item:
+                        dn = item[class_name]['attributes'].get('dn', '')
+                        self._invalidate_dn(dn)
+
+    def _invalidate_dn(self, dn):
+        """
+        Invalidate the cached report that the DN belongs to
+
+        :param dn: string containing the distinguished name of the changed object
+        """
+        match = re.search(r'/node-(\d+)/', dn)
+        if match:
+            self.built_switches.invalidate(match.group(1))
+        match = re.match(r'uni/tn-([^/]+)', dn)
+        if match:
+            self.built_tenants.invalidate(match.group(1))
+
+    def prefetch_switches(self, max_workers=4):
+        """
+        Build the reports of all of the switches that are not already cached using
+        at most max_workers concurrent threads.  A switch that fails to build is
+        logged and skipped so that the remaining switches are still built.
+
+        :param max_workers: Maximum number of switches built concurrently
+        """
+        self.get_switches()
+        self.process_events()
+        work_q = Queue()
+        for switch_id in self.switches:
+            if switch_id not in self.built_switches:
+                work_q.put(switch_id)
+
+        def worker():
+            while True:
+                try:
+                    switch_id = work_q.get_nowait()
+                except Empty:
+                    return
+                try:
+                    self.built_switches.get_or_build(switch_id, self.build_switch)
+                except Exception:
+                    logging.exception('Could not build report for switch %s', switch_id)
+
+        workers = []
+        for i in range(min(max_workers, work_q.qsize())):
+            thread = threading.Thread(target=worker)
+            thread.daemon = True
+            thread.start()
+            workers.append(thread)
+        for thread in workers:
+            thread.join()
+
+    def start_prefetch(self, max_workers=4, interval=60):
+        """
+        Start building the switch reports in the background
+
+        :param max_workers: Maximum number of switches built concurrently
+        :param interval: Number of seconds between prefetch passes
+        """
+        if self._prefetcher is not None and self._prefetcher.is_alive():
+            return
+        self._prefetcher = ReportPrefetcher(self, max_workers, interval)
+        self._prefetcher.start()
+
+    def stop_prefetch(self):
+        """
+        Stop building the switch reports in the background.  A prefetch pass that
+        is still running is not waited for; the reports it builds for a previous
+        APIC are dropped by the cache once clear_switch_info has cleared it.
+        """
+        if self._prefetcher is not None:
+            self._prefetcher.exit()
+            self._prefetcher = None
 
     def set_login_credentials(self, args, timeout=2):
         """
@@ -329,10 +596,27 @@ class ReportDB(object):
                          value in seconds to use for APIC communication.
                          Default value is 2.
         """
+        if self._same_credentials(args) and self.timeout == timeout:
+            # Keep the cached reports
+            return
         self.args = args
         self.timeout = timeout
         self.clear_switch_info()
 
+    def _same_credentials(self, args):
+        """
+        Check if args contains the same APIC credentials as the current ones
+
+        :param args: An instance containing the APIC credentials.
+        :return: True if the credentials are unchanged
+        """
+        if self.args is None or args is None:
+            return False
+        for attr in ('url', 'login', 'password'):
+            if getattr(self.args, attr, None) != getattr(args, attr, None):
+                return False
+        return True
+
     def _get_from_apic(self, url):
         """
         Internal wrapper function for communicating with the APIC
@@ -351,11 +635,8 @@ class ReportDB(object):
         :param report_id:
         :return:
         """
-        if switch_id not in self.built_switches:
-            switch_record = self.build_switch(switch_id)
-            self.built_switches[switch_id] = switch_record
-
-        return self.built_switches[switch_id][report_id]
+        self.process_events()
+        return self.built_switches.get_or_build(switch_id, self.build_switch)[report_id]
 
     def get_tenant_table(self, tenant_id, report_id):
         """
@@ -365,8 +646,5 @@ class ReportDB(object):
         :param report_id:
         :return:
         """
-
-        if tenant_id not in self.built_tenants:
-            tenant_record = self.build_tenant(tenant_id)
-            self.built_tenants[tenant_id] = tenant_record
-        return self.built_tenants[tenant_id][report_id]
+        self.process_events()
+        return self.built_tenants.get_or_build(tenant_id, self.build_tenant)[report_id]
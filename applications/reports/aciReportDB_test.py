@@ -0,0 +1,282 @@
+"""
+Test cases for the report cache and the switch report prefetching
+"""
+import threading
+import time
+import unittest
+
+import mock
+
+from aciReportDB import ReportCache, ReportDB, ReportPrefetcher
+
+
+class FakeResponse(object):
+    """
+    Response of the fake report session
+    """
+    def __init__(self, ok=True):
+        self.ok = ok
+
+
+class FakeReportSession(object):
+    """
+    Session that records the subscriptions and queues the events pushed by the test
+    """
+    def __init__(self, url, lock):
+        self.url = url
+        self.events = {}
+        self.lock = lock
+        self.subscribed_with_lock = []
+
+    def login(self, timeout=None):
+        return FakeResponse()
+
+    def subscribe(self, url, only_new=False):
+        self.subscribed_with_lock.append(self.lock.locked())
+        self.events[url] = []
+        return FakeResponse()
+
+    def has_events(self, url):
+        return len(self.events.get(url, [])) > 0
+
+    def get_event(self, url):
+        return self.events[url].pop(0)
+
+    def push_event(self, class_name, dn):
+        url = '/api/class/%s.json?subscription=yes' % class_name
+        self.events[url].append({'imdata': [{class_name: {'attributes': {'dn': dn}}}]})
+
+
+class Args(object):
+    """
+    APIC credentials
+    """
+    def __init__(self, url='http://apic1', login='admin', password='password'):
+        self.url = url
+        self.login = login
+        self.password = password
+
+
+class FakeReportDB(ReportDB):
+    """
+    ReportDB with a fake session and reports that record their builds
+    """
+    def __init__(self, *args, **kwargs):
+        super(FakeReportDB, self).__init__(*args, **kwargs)
+        self.sessions = []
+        self.builds = []
+        self.failing_switches = set()
+        self._builds_lock = threading.Lock()
+
+    def _create_session(self):
+        session = FakeReportSession(self.args.url, self._session_lock)
+        self.sessions.append(session)
+        return session
+
+    def get_switches(self):
+        if not self.switches:
+            self.switches = dict((switch_id, None) for switch_id in ('101', '102', '103'))
+        return sorted(self.switches)
+
+    def build_switch(self, switch_id=None):
+        with self._builds_lock:
+            self.builds.append(('switch', switch_id))
+        if switch_id in self.failing_switches:
+            raise ValueError('Bad reply')
+        return {'basic': [switch_id, self.session.url]}
+
+    def build_tenant(self, tenant_name=None):
+        with self._builds_lock:
+            self.builds.append(('tenant', tenant_name))
+        return {'epg': [tenant_name, self.session.url]}
+
+
+class TestReportCache(unittest.TestCase):
+    """
+    Tests for ReportCache
+    """
+    def test_ttl(self):
+        """
+        Test that the reports expire after the TTL
+        """
+        cache = ReportCache(ttl=10)
+        with mock.patch('aciReportDB.time.time', return_value=100):
+            cache.set('101', 'report')
+        with mock.patch('aciReportDB.time.time', return_value=109):
+            self.assertEqual(cache.get('101'), 'report')
+            self.assertIn('101', cache)
+        with mock.patch('aciReportDB.time.time', return_value=111):
+            self.assertIsNone(cache.get('101'))
+            self.assertNotIn('101', cache)
+            self.assertEqual(cache.get_or_build('101', lambda key: 'rebuilt'), 'rebuilt')
+
+    def test_no_ttl(self):
+        """
+        Test that the reports never expire without a TTL
+        """
+        cache = ReportCache(ttl=None)
+        with mock.patch('aciReportDB.time.time', return_value=100):
+            cache.set('101', 'report')
+        with mock.patch('aciReportDB.time.time', return_value=100000):
+            self.assertEqual(cache.get('101'), 'report')
+
+    def test_build_once(self):
+        """
+        Test that a cached report is not built again
+        """
+        cache = ReportCache()
+        builds = []
+
+        def build(key):
+            builds.append(key)
+            return 'report'
+        self.assertEqual(cache.get_or_build('101', build), 'report')
+        self.assertEqual(cache.get_or_build('101', build), 'report')
+        self.assertEqual(builds, ['101'])
+        cache.invalidate('101')
+        cache.get_or_build('101', build)
+        self.assertEqual(builds, ['101', '101'])
+
+    def test_clear_during_build(self):
+        """
+        Test that a report built while the cache is cleared is dropped
+        """
+        cache = ReportCache()
+
+        def build(key):
+            cache.clear()
+            return 'stale report'
+        self.assertEqual(cache.get_or_build('101', build), 'stale report')
+        self.assertIsNone(cache.get('101'))
+
+
+class TestReportDB(unittest.TestCase):
+    """
+    Tests for the cached and prefetched reports of ReportDB
+    """
+    def setUp(self):
+        self.rdb = FakeReportDB()
+        self.rdb.set_login_credentials(Args())
+
+    def test_invalidate_by_dn(self):
+        """
+        Test that the events invalidate only the reports of their switch or tenant
+        """
+        self.rdb.get_switches()
+        self.rdb.get_switch_table('101', 'basic')
+        self.rdb.get_switch_table('102', 'basic')
+        self.rdb.get_tenant_table('tenant1', 'epg')
+        self.rdb.get_tenant_table('tenant2', 'epg')
+        self.assertEqual(len(self.rdb.builds), 4)
+
+        session = self.rdb.session
+        session.push_event('l3Ctx', 'topology/pod-1/node-101/sys/ctx-[vxlan-2097152]')
+        session.push_event('fvBD', 'uni/tn-tenant1/BD-bd1')
+        del self.rdb.builds[:]
+        for switch_id in ('101', '102'):
+            self.assertEqual(self.rdb.get_switch_table(switch_id, 'basic')[0], switch_id)
+        for tenant_name in ('tenant1', 'tenant2'):
+            self.assertEqual(self.rdb.get_tenant_table(tenant_name, 'epg')[0], tenant_name)
+        self.assertEqual(self.rdb.builds, [('switch', '101'), ('tenant', 'tenant1')])
+
+    def test_subscriptions(self):
+        """
+        Test that the high churn classes are not subscribed and that the
+        subscriptions are made without holding the session lock
+        """
+        session = self.rdb.session
+        self.assertEqual(len(self.rdb._subscription_urls),
+                         len(self.rdb.switch_event_classes + self.rdb.tenant_event_classes))
+        for class_name in ('epmMacEp', 'epmIpEp', 'actrlRule', 'fvCEp'):
+            self.assertNotIn('/api/class/%s.json?subscription=yes' % class_name, session.events)
+        self.assertTrue(session.subscribed_with_lock)
+        self.assertFalse(any(session.subscribed_with_lock))
+
+    def test_same_credentials(self):
+        """
+        Test that entering the same credentials again keeps the cached reports
+        """
+        self.rdb.get_switches()
+        self.rdb.get_switch_table('101', 'basic')
+        self.rdb.set_login_credentials(Args())
+        self.rdb.get_switch_table('101', 'basic')
+        self.assertEqual(len(self.rdb.builds), 1)
+        self.assertEqual(len(self.rdb.sessions), 1)
+
+    def test_credential_change(self):
+        """
+        Test that changing the APIC resets the session and the cached reports
+        """
+        self.rdb.get_switches()
+        self.assertEqual(self.rdb.get_switch_table('101', 'basic'), ['101', 'http://apic1'])
+        self.rdb.get_tenant_table('tenant1', 'epg')
+        self.rdb.set_login_credentials(Args(url='http://apic2'))
+        self.assertEqual(self.rdb.switches, {})
+        self.assertNotIn('101', self.rdb.built_switches)
+        self.assertNotIn('tenant1', self.rdb.built_tenants)
+        self.rdb.get_switches()
+        self.assertEqual(self.rdb.get_switch_table('101', 'basic'), ['101', 'http://apic2'])
+        self.assertEqual(self.rdb.get_tenant_table('tenant1', 'epg'), ['tenant1', 'http://apic2'])
+        self.assertEqual([session.url for session in self.rdb.sessions], ['http://apic1', 'http://apic2'])
+
+    def test_session_created_once(self):
+        """
+        Test that concurrent threads share a single session
+        """
+        create_session = self.rdb._create_session
+
+        def slow_create_session():
+            time.sleep(0.05)
+            return create_session()
+        self.rdb._create_session = slow_create_session
+        sessions = []
+        threads = [threading.Thread(target=lambda: sessions.append(self.rdb.session)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.rdb.sessions), 1)
+        self.assertEqual(len(sessions), 4)
+        self.assertTrue(all(session is self.rdb.sessions[0] for session in sessions))
+
+    def test_prefetch(self):
+        """
+        Test that prefetching builds the uncached switches and skips the failures
+        """
+        self.rdb.get_switches()
+        self.rdb.get_switch_table('101', 'basic')
+        self.rdb.failing_switches.add('103')
+        self.rdb.prefetch_switches(max_workers=2)
+        self.assertEqual(sorted(self.rdb.builds), [('switch', '101'), ('switch', '102'), ('switch', '103')])
+        self.assertIn('102', self.rdb.built_switches)
+        self.assertNotIn('103', self.rdb.built_switches)
+
+        del self.rdb.builds[:]
+        self.rdb.failing_switches.clear()
+        self.rdb.prefetch_switches(max_workers=2)
+        self.assertEqual(self.rdb.builds, [('switch', '103')])
+
+    def test_prefetcher_survives_errors(self):
+        """
+        Test that the prefetcher keeps running after a failed pass
+        """
+        passes = []
+        done = threading.Event()
+
+        def prefetch_switches(max_workers):
+            passes.append(max_workers)
+            if len(passes) == 1:
+                raise KeyError('imdata')
+            done.set()
+        self.rdb.prefetch_switches = prefetch_switches
+        prefetcher = ReportPrefetcher(self.rdb, max_workers=2, interval=0)
+        prefetcher.start()
+        self.assertTrue(done.wait(5))
+        prefetcher.exit()
+        prefetcher.join(5)
+        self.assertFalse(prefetcher.is_alive())
+        self.assertGreaterEqual(len(passes), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
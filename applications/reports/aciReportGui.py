@@ -240,6 +240,8 @@ class CredentialsView(BaseView):
             session['password'] = form.password.data
             apic_args = APICArgs(session['ipaddr'], session['username'], session['secure'], session['password'])
             rdb.set_login_credentials(apic_args)
+            # Build the switch reports in the background so they are served from the cache
+            rdb.start_prefetch()
             return redirect(url_for('credentialsview.index'))
         elif reset_form.reset.data:
             session['ipaddr'] = None
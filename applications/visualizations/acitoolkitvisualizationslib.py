@@ -30,193 +30,148 @@
 try:
     import mysql.connector as mysql
 except ImportError:
-    import pymysql as mysql
+    try:
+        import pymysql as mysql
+    except ImportError:
+        mysql = None
 import json
 
 
-def regenerate_pie_data(MYSQL_USERID, MYSQL_PASSWORD, MYSQL_IP):
+class EndpointAggregate(object):
+    """
+    Endpoints of the endpoint tracker database grouped by tenant,
+    application profile and EPG.
+
+    The aggregate is loaded with a single grouped query and all of the
+    visualization datasets are generated from it.  Every page loads a
+    fresh aggregate so that it shows the endpoints currently in the
+    database.
+    """
+    def __init__(self):
+        self.tenants = {}
+
+    def add(self, mac, ip, tenant, app, epg, count=1):
+        """
+        Add an endpoint record
+
+        :param mac: String containing the endpoint MAC address
+        :param ip: String containing the endpoint IP address
+        :param tenant: String containing the tenant name
+        :param app: String containing the application profile name
+        :param epg: String containing the EPG name
+        :param count: Number of records of this endpoint
+        """
+        endpoints = self.tenants.setdefault(tenant, {}).setdefault(app, {}).setdefault(epg, {})
+        key = (mac, ip)
+        endpoints[key] = endpoints.get(key, 0) + count
+
+    def load(self, cnx):
+        """
+        Load the endpoints from the endpoints table
+
+        :param cnx: DB-API connection to the endpoint tracker database\
+                    i.e. MySQL or SQLite
+        """
+        c = cnx.cursor()
+        c.execute("""SELECT tenant, app, epg, mac, ip, COUNT(*) FROM endpoints
+                     GROUP BY tenant, app, epg, mac, ip;""")
+        for (tenant, app, epg, mac, ip, count) in c:
+            self.add(str(mac), ip, str(tenant), str(app), str(epg), count)
+        c.close()
+
+    def get_pie_data(self):
+        """
+        Get the number of endpoint records of each tenant
+
+        :returns: list of strings containing the CSV lines
+        """
+        data = ['tenant,endpoints']
+        for tenant in sorted(self.tenants):
+            count = 0
+            for app in self.tenants[tenant].values():
+                for endpoints in app.values():
+                    count += sum(endpoints.values())
+            data.append('%s,%s' % (tenant, count))
+        return data
+
+    def _get_tree(self, get_leaves):
+        tenants_json = []
+        for tenant in sorted(self.tenants):
+            apps_json = []
+            for app in sorted(self.tenants[tenant]):
+                epgs_json = []
+                for epg in sorted(self.tenants[tenant][app]):
+                    epgs_json.append({'name': epg,
+                                      'children': get_leaves(self.tenants[tenant][app][epg])})
+                apps_json.append({'name': app, 'children': epgs_json})
+            tenants_json.append({'name': tenant, 'children': apps_json})
+        return tenants_json
+
+    def get_radial_data(self):
+        """
+        Get the hierarchy of tenants, application profiles, EPGs and
+        endpoint MAC addresses
+
+        :returns: dictionary containing the root of the hierarchy
+        """
+        def get_leaves(endpoints):
+            macs = sorted(set(mac for mac, ip in endpoints))
+            return [{'name': mac, 'children': []} for mac in macs]
+        return {'name': 'Root', 'children': self._get_tree(get_leaves)}
+
+    def get_sunburst_data(self):
+        """
+        Get the hierarchy of tenants, application profiles, EPGs and
+        endpoints named by IP address, or by MAC address if they have no IP address
+
+        :returns: dictionary containing the root of the hierarchy
+        """
+        def get_leaves(endpoints):
+            leaves = []
+            for mac, ip in sorted(endpoints):
+                if ip == '0.0.0.0':
+                    leaves.append({'name': mac, 'size': 3000})
+                else:
+                    leaves.append({'name': ip, 'size': 3000})
+            return leaves
+        return {'name': 'root', 'children': self._get_tree(get_leaves)}
+
+
+def get_endpoint_aggregate(MYSQL_USERID, MYSQL_PASSWORD, MYSQL_IP):
     cnx = mysql.connect(user=MYSQL_USERID, password=MYSQL_PASSWORD,
-                        host=MYSQL_IP)
-    c = cnx.cursor()
-    c.execute('USE endpointtracker;')
-    c.execute("SELECT DISTINCT(tenant) FROM endpoints;")
-
-    tenants = []
-    for (tenant) in c:
-        tenants.append(tenant[0])
-
-    data = []
-    data.append('tenant,endpoints')
-    for tenant in tenants:
-        line = ''
-        c.execute("SELECT COUNT(*) FROM endpoints WHERE tenant='%s';" % tenant)
-        for count in c:
-            line = tenant + ',' + str(count[0])
-        data.append(line)
+                        host=MYSQL_IP, database='endpointtracker')
+    aggregate = EndpointAggregate()
+    aggregate.load(cnx)
+    cnx.close()
+    return aggregate
+
 
+def regenerate_pie_data(MYSQL_USERID, MYSQL_PASSWORD, MYSQL_IP, aggregate=None):
+    if aggregate is None:
+        aggregate = get_endpoint_aggregate(MYSQL_USERID, MYSQL_PASSWORD, MYSQL_IP)
     f = open('static/endpoint_tracker_pie.csv', 'w')
-    for line in data:
+    for line in aggregate.get_pie_data():
         f.write(line + '\n')
     f.close()
 
 
-def regenerate_radial_data(MYSQL_USERID, MYSQL_PASSWORD, MYSQL_IP):
-    def get_json_from_data(item, children):
-        children_json = []
-        for child in children:
-            children_json.append(get_json_from_data(child, children[child]))
-        resp = {'name': item, 'children': children_json}
-        return resp
-
-    def get_data_from_db():
-        cnx = mysql.connect(user=MYSQL_USERID,
-                            password=MYSQL_PASSWORD,
-                            host=MYSQL_IP)
-        c = cnx.cursor()
-        c.execute('USE endpointtracker;')
-        c.execute("SELECT DISTINCT(tenant) FROM endpoints;")
-
-        tenants = {}
-        for (tenant) in c:
-            tenants[str(tenant[0])] = {}
-
-        for tenant in tenants:
-            c.execute("""SELECT DISTINCT(app) FROM endpoints
-                         WHERE tenant='%s';""" % tenant)
-            for (app) in c:
-                tenants[tenant][str(app[0])] = {}
-
-        for tenant in tenants:
-            for app in tenants[tenant]:
-                c.execute("""SELECT DISTINCT(epg) FROM endpoints
-                             WHERE tenant='%s' AND app='%s';""" % (tenant,
-                                                                   app))
-                for (epg) in c:
-                    tenants[tenant][app][str(epg[0])] = {}
-
-        for tenant in tenants:
-            for app in tenants[tenant]:
-                for epg in tenants[tenant][app]:
-                    c.execute("""SELECT mac FROM endpoints
-                                 WHERE tenant='%s' AND app='%s'
-                                 AND epg = '%s';""" % (tenant, app, epg))
-                    for (mac) in c:
-                        tenants[tenant][app][epg][str(mac[0])] = {}
-        return tenants
-
-    tenants = get_data_from_db()
-    data = []
-    for tenant in tenants:
-        data.append(get_json_from_data(tenant, tenants[tenant]))
-    data = {'name': 'Root', 'children': data}
-
+def regenerate_radial_data(MYSQL_USERID, MYSQL_PASSWORD, MYSQL_IP, aggregate=None):
+    if aggregate is None:
+        aggregate = get_endpoint_aggregate(MYSQL_USERID, MYSQL_PASSWORD, MYSQL_IP)
     f = open('static/endpoint_radial.json', 'w')
-    data = json.dumps(data)
-    f.write(data)
+    json.dump(aggregate.get_radial_data(), f)
     f.close()
 
 
-def regenerate_sunburst_data(MYSQL_USERID, MYSQL_PASSWORD, MYSQL_IP):
-    cnx = mysql.connect(user=MYSQL_USERID, password=MYSQL_PASSWORD,
-                        host=MYSQL_IP,
-                        database='endpointtracker')
-    c = cnx.cursor()
-    c.execute('USE endpointtracker;')
-    query = """select distinct mac,ip,tenant,app,epg from endpoints;"""
-    c.execute(query)
-
-    endpoints = {}
-    for (mac, ip, tenant, app, epg) in c:
-        if tenant not in endpoints:
-            endpoints[tenant] = {}
-        if app not in endpoints[tenant]:
-            endpoints[tenant][app] = {}
-        if epg not in endpoints[tenant][app]:
-            endpoints[tenant][app][epg] = []
-        if ip == '0.0.0.0':
-            endpoints[tenant][app][epg].append(mac)
-        else:
-            endpoints[tenant][app][epg].append(ip)
-
+def regenerate_sunburst_data(MYSQL_USERID, MYSQL_PASSWORD, MYSQL_IP, aggregate=None):
+    if aggregate is None:
+        aggregate = get_endpoint_aggregate(MYSQL_USERID, MYSQL_PASSWORD, MYSQL_IP)
     f = open('static/sunburst.json', 'w')
-    f.write('{"name": "root", "children":[')
-    num_tenants = len(endpoints)
-    for tenant in endpoints:
-        num_tenants = num_tenants - 1
-        f.write('{"name": "%s", "children":[' % tenant)
-        num_apps = len(endpoints[tenant])
-        for app in endpoints[tenant]:
-            num_apps = num_apps - 1
-            f.write('{"name": "%s", "children":[' % app)
-            num_epgs = len(endpoints[tenant][app])
-            for epg in endpoints[tenant][app]:
-                num_epgs = num_epgs - 1
-                f.write('{"name": "%s", "children":[' % epg)
-                num_macs = len(endpoints[tenant][app][epg])
-                for mac in endpoints[tenant][app][epg]:
-                    num_macs = num_macs - 1
-                    f.write('{"name": "%s", "size": 3000}' % mac)
-                    if num_macs != 0:
-                        f.write(',')
-                f.write(']}')
-                if num_epgs != 0:
-                    f.write(',')
-            f.write(']}')
-            if num_apps != 0:
-                f.write(',')
-        f.write(']}')
-        if num_tenants != 0:
-            f.write(',')
-    f.write(']}')
-
-
-def regenerate_endpoint_epg_tree(MYSQL_USERID, MYSQL_PASSWORD, MYSQL_IP):
-    def get_json_from_data(item, children):
-        children_json = []
-        for child in children:
-            children_json.append(get_json_from_data(child, children[child]))
-        return {'name': item, 'children': children_json}
-
-    def get_data_from_db():
-        cnx = mysql.connect(user=MYSQL_USERID,
-                            password=MYSQL_PASSWORD,
-                            host=MYSQL_IP)
-        c = cnx.cursor()
-        c.execute('USE endpointtracker;')
-        c.execute("SELECT DISTINCT(tenant) FROM endpoints;")
-
-        tenants = {}
-        for (tenant) in c:
-            tenants[str(tenant[0])] = {}
-
-        for tenant in tenants:
-            c.execute("""SELECT DISTINCT(app) FROM endpoints
-                         WHERE tenant='%s';""" % tenant)
-            for (app) in c:
-                tenants[tenant][str(app[0])] = {}
-
-        for tenant in tenants:
-            for app in tenants[tenant]:
-                c.execute("""SELECT DISTINCT(epg) FROM endpoints
-                             WHERE tenant='%s' AND app='%s';""" % (tenant,
-                                                                   app))
-                for (epg) in c:
-                    tenants[tenant][app][str(epg[0])] = {}
-
-        for tenant in tenants:
-            for app in tenants[tenant]:
-                for epg in tenants[tenant][app]:
-                    c.execute("""SELECT mac FROM endpoints WHERE tenant='%s' AND
-                                 app='%s' AND epg = '%s';""" % (tenant,
-                                                                app,
-                                                                epg))
-                    for (mac) in c:
-                        tenants[tenant][app][epg][str(mac[0])] = {}
-        return tenants
-
-    tenants = get_data_from_db()
-    data = []
-    for tenant in tenants:
-        data.append(get_json_from_data(tenant, tenants[tenant]))
-    data = [{'name': 'Root', 'children': data}]
-    return data
+    json.dump(aggregate.get_sunburst_data(), f)
+    f.close()
+
+
+def regenerate_endpoint_epg_tree(MYSQL_USERID, MYSQL_PASSWORD, MYSQL_IP, aggregate=None):
+    if aggregate is None:
+        aggregate = get_endpoint_aggregate(MYSQL_USERID, MYSQL_PASSWORD, MYSQL_IP)
+    return [aggregate.get_radial_data()]
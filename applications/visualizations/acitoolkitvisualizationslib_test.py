@@ -0,0 +1,181 @@
+"""
+Test cases for the visualization datasets
+"""
+import sqlite3
+import unittest
+
+from acitoolkitvisualizationslib import EndpointAggregate
+
+NUM_TENANTS = 20
+NUM_APPS = 3
+NUM_EPGS = 5
+NUM_ENDPOINTS = 20
+
+
+def get_database():
+    """
+    Get an in-memory endpoint tracker database.  Every endpoint has a
+    second record as if it had moved once.
+    """
+    cnx = sqlite3.connect(':memory:')
+    cnx.execute('''CREATE TABLE endpoints (
+                       mac       CHAR(18) NOT NULL,
+                       ip        CHAR(16),
+                       tenant    CHAR(100) NOT NULL,
+                       app       CHAR(100) NOT NULL,
+                       epg       CHAR(100) NOT NULL,
+                       interface CHAR(100) NOT NULL,
+                       timestart TIMESTAMP NOT NULL,
+                       timestop  TIMESTAMP NULL);''')
+    rows = []
+    for tenant in range(NUM_TENANTS):
+        for app in range(NUM_APPS):
+            for epg in range(NUM_EPGS):
+                for endpoint in range(NUM_ENDPOINTS):
+                    mac = '00:00:%02X:%02X:%02X:%02X' % (tenant, app, epg, endpoint)
+                    ip = '10.%s.%s.%s' % (tenant, app * NUM_EPGS + epg, endpoint) if endpoint % 2 else '0.0.0.0'
+                    for interface in ('eth1/1', 'eth1/2'):
+                        rows.append((mac, ip, 'tenant%s' % tenant, 'app%s' % app, 'epg%s' % epg,
+                                     interface, '2015-01-01 00:00:00'))
+    cnx.executemany('INSERT INTO endpoints VALUES (?, ?, ?, ?, ?, ?, ?, NULL)', rows)
+    cnx.commit()
+    return cnx
+
+
+class CountingCursor(object):
+    """
+    Cursor that records the queries it executes
+    """
+    def __init__(self, cursor, queries):
+        self._cursor = cursor
+        self._queries = queries
+
+    def execute(self, query):
+        self._queries.append(query)
+        return self._cursor.execute(query)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class CountingConnection(object):
+    """
+    Connection whose cursors record the queries they execute
+    """
+    def __init__(self, cnx):
+        self._cnx = cnx
+        self.queries = []
+
+    def cursor(self):
+        return CountingCursor(self._cnx.cursor(), self.queries)
+
+
+def get_radial_data_per_level(cnx):
+    """
+    Get the radial hierarchy by querying every tenant, application
+    profile and EPG separately
+    """
+    c = cnx.cursor()
+    tenants = {}
+    c.execute("SELECT DISTINCT(tenant) FROM endpoints;")
+    for (tenant,) in c.fetchall():
+        tenants[str(tenant)] = {}
+    for tenant in tenants:
+        c.execute("SELECT DISTINCT(app) FROM endpoints WHERE tenant='%s';" % tenant)
+        for (app,) in c.fetchall():
+            tenants[tenant][str(app)] = {}
+        for app in tenants[tenant]:
+            c.execute("SELECT DISTINCT(epg) FROM endpoints WHERE tenant='%s' AND app='%s';" % (tenant, app))
+            for (epg,) in c.fetchall():
+                tenants[tenant][app][str(epg)] = {}
+            for epg in tenants[tenant][app]:
+                c.execute("SELECT mac FROM endpoints WHERE tenant='%s' AND app='%s' "
+                          "AND epg='%s';" % (tenant, app, epg))
+                for (mac,) in c.fetchall():
+                    tenants[tenant][app][epg][str(mac)] = {}
+    return tenants
+
+
+class TestEndpointAggregate(unittest.TestCase):
+    """
+    Test the visualization datasets generated from the endpoint aggregate
+    """
+    def setUp(self):
+        self.cnx = get_database()
+        self.aggregate = EndpointAggregate()
+        self.aggregate.load(self.cnx)
+
+    def tearDown(self):
+        self.cnx.close()
+
+    def test_pie_data(self):
+        """
+        Test the number of endpoint records of each tenant
+        """
+        data = self.aggregate.get_pie_data()
+        self.assertEqual(data[0], 'tenant,endpoints')
+        self.assertEqual(len(data), NUM_TENANTS + 1)
+        self.assertIn('tenant7,%s' % (NUM_APPS * NUM_EPGS * NUM_ENDPOINTS * 2), data)
+
+    def test_radial_data(self):
+        """
+        Test that the radial hierarchy matches the one queried level by level
+        """
+        expected = get_radial_data_per_level(self.cnx)
+        data = self.aggregate.get_radial_data()
+        self.assertEqual(data['name'], 'Root')
+        result = {}
+        for tenant in data['children']:
+            result[tenant['name']] = {}
+            for app in tenant['children']:
+                result[tenant['name']][app['name']] = {}
+                for epg in app['children']:
+                    macs = result[tenant['name']][app['name']][epg['name']] = {}
+                    for mac in epg['children']:
+                        self.assertEqual(mac['children'], [])
+                        macs[mac['name']] = {}
+        self.assertEqual(result, expected)
+
+    def test_sunburst_data(self):
+        """
+        Test that the endpoints are named by IP address when they have one
+        """
+        data = self.aggregate.get_sunburst_data()
+        epg = data['children'][0]['children'][0]['children'][0]
+        self.assertEqual(len(epg['children']), NUM_ENDPOINTS)
+        names = [leaf['name'] for leaf in epg['children']]
+        self.assertIn('00:00:00:00:00:00', names)
+        self.assertIn('10.0.0.1', names)
+        self.assertNotIn('0.0.0.0', names)
+
+    def test_add(self):
+        """
+        Test that the records added to a loaded aggregate are counted
+        """
+        self.aggregate.add('00:00:00:00:00:FF', '10.99.0.1', 'tenant0', 'app0', 'epg0')
+        self.aggregate.add('00:00:00:00:00:FE', '10.99.0.2', 'new', 'app', 'epg')
+        data = self.aggregate.get_pie_data()
+        self.assertIn('tenant0,%s' % (NUM_APPS * NUM_EPGS * NUM_ENDPOINTS * 2 + 1), data)
+        self.assertIn('new,1', data)
+
+    def test_single_query(self):
+        """
+        Test that loading the aggregate runs a single query
+        """
+        cnx = CountingConnection(self.cnx)
+        aggregate = EndpointAggregate()
+        aggregate.load(cnx)
+        self.assertEqual(len(cnx.queries), 1)
+        self.assertEqual(aggregate.get_radial_data(), self.aggregate.get_radial_data())
+
+        get_radial_data_per_level(cnx)
+        self.assertEqual(len(cnx.queries), 2 + NUM_TENANTS * (1 + NUM_APPS * (1 + NUM_EPGS)))
+
+if __name__ == '__main__':
+    unittest.main()
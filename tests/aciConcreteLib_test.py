@@ -11,7 +11,9 @@ from acitoolkit.aciConcreteLib import (
     ConcreteLoopback, ConcreteAccCtrlRule,
     ConcreteFilter, ConcreteFilterEntry, ConcreteEp,
     ConcretePortChannel, ConcreteTunnel, ConcreteOverlay,
-    ConcreteCdp, ConcreteCdpIf, ConcreteCdpAdjEp)
+    ConcreteCdp, ConcreteCdpIf, ConcreteCdpAdjEp, PolicyLookup)
+from acitoolkit.aciphysobject import WorkingData
+import re
 import unittest
 
 
@@ -536,6 +538,103 @@ class TestConcreteAccCtrlRule(unittest.TestCase):
                 Table))
 
 
+class FakePolicyResponse(object):
+    """
+    Fake response to the EPG and context queries
+    """
+    ok = True
+    text = ''
+
+    def __init__(self, imdata):
+        self._data = {'imdata': imdata}
+
+    def json(self):
+        return self._data
+
+
+class FakePolicySession(object):
+    """
+    Fake APIC holding contexts and EPGs
+    """
+    def __init__(self, num_contexts, num_epgs):
+        self.requests = []
+        self.objects = {'fvCtx': [], 'fvAEPg': []}
+        for index in range(num_contexts):
+            self.objects['fvCtx'].append({'fvCtx': {'attributes': {
+                'dn': 'uni/tn-tenant%s/ctx-ctx%s' % (index, index), 'name': 'ctx%s' % index,
+                'scope': str(2000000 + index), 'pcTag': '1', 'seg': str(2000000 + index)}}})
+        for index in range(num_epgs):
+            self.objects['fvAEPg'].append({'fvAEPg': {'attributes': {
+                'dn': 'uni/tn-tenant0/ap-app/epg-epg%s' % index, 'name': 'epg%s' % index,
+                'pcTag': str(16386 + index), 'scope': '2000000'}}})
+
+    def get(self, url):
+        self.requests.append(url)
+        apic_class = re.search(r'target-subtree-class=(\w+)', url).group(1)
+        return FakePolicyResponse(self.objects[apic_class])
+
+
+class TestPolicyLookup(unittest.TestCase):
+    """
+    Test resolving the EPGs and contexts of the access control rules
+    """
+    num_rules = 2000
+
+    def setUp(self):
+        self.session = FakePolicySession(10, 100)
+
+    def _get_working_data(self, policy_lookup=None, node_id='101'):
+        working_data = WorkingData(policy_lookup=policy_lookup)
+        working_data.session = self.session
+        working_data.rawjson = []
+        for index in range(self.num_rules):
+            working_data.rawjson.append({'actrlRule': {'attributes': {
+                'dn': 'topology/pod-1/node-%s/sys/actrl/scope-%s/rule-%s' % (node_id, 2000000 + index % 10, index),
+                'action': 'permit', 'dPcTag': str(16386 + index % 100) if index % 7 else 'any',
+                'sPcTag': str(16386 + (index + 1) % 100) if index % 5 else 'any', 'descr': '',
+                'direction': 'uni-dir', 'fltId': 'default', 'markDscp': 'unspecified', 'name': '',
+                'operSt': 'enabled', 'prio': 'fully_qual', 'qosGrp': 'unspecified',
+                'scopeId': str(2000000 + index % 11), 'type': 'tenant', 'status': '', 'modTs': 'never'}}})
+        working_data._index_objects()
+        return working_data
+
+    def test_get(self):
+        """
+        Test the EPG, tenant and context names of the rules
+        """
+        rules = ConcreteAccCtrlRule.get(self._get_working_data())
+        self.assertEqual(len(rules), self.num_rules)
+        self.assertEqual((rules[1].attr['tenant'], rules[1].attr['context']), ('tenant1', 'ctx1'))
+        self.assertEqual((rules[1].attr['s_epg'], rules[1].attr['d_epg']), ('epg2', 'epg1'))
+        self.assertEqual((rules[0].attr['s_epg'], rules[0].attr['d_epg']), ('any', 'any'))
+        self.assertEqual((rules[10].attr['tenant'], rules[10].attr['context']), ('', ''))
+        self.assertEqual(rules[1].attr['name'], 'tenant1_epg2_epg1_default')
+        self.assertEqual(rules[1].attr['node'], '101')
+
+    def test_shared_lookup(self):
+        """
+        Test that the EPGs and contexts are retrieved once for all of the switches
+        """
+        policy_lookup = PolicyLookup(self.session)
+        self.assertEqual(self.session.requests, [])
+        for node_id in range(101, 111):
+            rules = ConcreteAccCtrlRule.get(self._get_working_data(policy_lookup, str(node_id)))
+            self.assertEqual(rules[1].attr['d_epg'], 'epg1')
+        self.assertEqual(len(self.session.requests), 2)
+
+        ConcreteAccCtrlRule.get(self._get_working_data())
+        self.assertEqual(len(self.session.requests), 4)
+
+    def test_not_found(self):
+        """
+        Test the names of unknown pcTags and scopes
+        """
+        policy_lookup = PolicyLookup(self.session)
+        self.assertEqual(policy_lookup.get_epg_name('15'), '')
+        self.assertEqual(policy_lookup.get_context('1'), None)
+        self.assertEqual(policy_lookup.get_context('2000003'), ('tenant3', 'ctx3'))
+
+
 class TestConcreteFilter(unittest.TestCase):
     """
     Test the ConcreteFilter class
@@ -676,6 +775,87 @@ class TestConcreteEp(unittest.TestCase):
                 Table))
 
 
+class CountingWorkingData(WorkingData):
+    """
+    WorkingData that counts the records returned by its lookups
+    """
+    def __init__(self):
+        super(CountingWorkingData, self).__init__()
+        self.lookups = 0
+
+    def get_class(self, class_name):
+        result = super(CountingWorkingData, self).get_class(class_name)
+        self.lookups += len(result)
+        return result
+
+    def get_subtree(self, class_name, dname):
+        result = super(CountingWorkingData, self).get_subtree(class_name, dname)
+        self.lookups += len(result)
+        return result
+
+    def get_object(self, dname):
+        self.lookups += 1
+        return super(CountingWorkingData, self).get_object(dname)
+
+
+class TestConcreteEpGet(unittest.TestCase):
+    """
+    Test merging the MAC and IP endpoints of a switch
+    """
+    ctx_dn = 'topology/pod-1/node-101/sys/ctx-[vxlan-2097152]'
+
+    @staticmethod
+    def _add_ep(rawjson, apic_class, dn, addr):
+        rawjson.append({apic_class: {'attributes': {'dn': dn, 'addr': addr, 'name': '', 'flags': 'local',
+                                                    'ifId': 'eth1/1', 'createTs': 'never'}}})
+
+    def _get_working_data(self, num_macs, ips_per_mac=1, working_data_class=WorkingData):
+        rawjson = []
+        for index in range(num_macs):
+            bd_dn = self.ctx_dn + '/bd-[vxlan-%s]' % (15000000 + index % 10)
+            mac = '00:00:00:00:%02X:%02X' % (index // 256, index % 256)
+            mac_dn = bd_dn + '/db-ep/mac-' + mac
+            self._add_ep(rawjson, 'epmMacEp', mac_dn, mac)
+            for ip_index in range(ips_per_mac):
+                ip = '10.%s.%s.%s' % (ip_index, index // 256, index % 256)
+                ip_dn = bd_dn + '/db-ep/ip-[%s]' % ip
+                self._add_ep(rawjson, 'epmIpEp', ip_dn, ip)
+                rawjson.append({'epmRsMacEpToIpEpAtt': {'attributes': {
+                    'dn': mac_dn + '/rsmacEpToIpEpAtt-[%s]' % ip_dn, 'tDn': ip_dn}}})
+        self._add_ep(rawjson, 'epmIpEp', self.ctx_dn + '/bd-[vxlan-1]/db-ep/ip-[192.168.0.1]', '192.168.0.1')
+        working_data = working_data_class()
+        working_data.rawjson = rawjson
+        working_data._index_objects()
+        return working_data
+
+    def test_get(self):
+        """
+        Test that the IP endpoints are merged into the MAC endpoints
+        """
+        end_points = ConcreteEp.get(self._get_working_data(3, ips_per_mac=2))
+        names = sorted(end_point.name for end_point in end_points)
+        self.assertEqual(names, ['00:00:00:00:00:00_10.0.0.0', '00:00:00:00:00:00_10.1.0.0',
+                                 '00:00:00:00:00:01_10.0.0.1', '00:00:00:00:00:01_10.1.0.1',
+                                 '00:00:00:00:00:02_10.0.0.2', '00:00:00:00:00:02_10.1.0.2',
+                                 '192.168.0.1'])
+        first, second = [end_point for end_point in end_points if end_point.attr['mac'] == '00:00:00:00:00:01']
+        self.assertIsNot(first.attr, second.attr)
+        self.assertEqual(second.attr['bd_vnid'], '15000001')
+        self.assertEqual(second.attr['interface_id'], 'eth1/1')
+
+    def test_linear(self):
+        """
+        Test that the number of records looked up to merge the endpoints
+        grows linearly with the number of endpoints
+        """
+        lookups = []
+        for num_macs in (2000, 8000):
+            working_data = self._get_working_data(num_macs, working_data_class=CountingWorkingData)
+            end_points = ConcreteEp.get(working_data)
+            self.assertEqual(len(end_points), num_macs + 1)
+            lookups.append(working_data.lookups)
+        self.assertLessEqual(lookups[1], lookups[0] * 4)
+
 class TestConcretePortChannel(unittest.TestCase):
     """
     Test the ConcretePortChannel class
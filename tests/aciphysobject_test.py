@@ -30,7 +30,9 @@
 """
 Physical object tests
 """
-from acitoolkit import ConcreteOverlay, ConcreteTunnel
+from acitoolkit import (
+    ConcreteOverlay, ConcreteTunnel, CounterFamily, InterfaceStats, InterfaceStatsCollector
+)
 
 try:
     from credentials import URL, LOGIN, PASSWORD
@@ -43,9 +45,13 @@ from acitoolkit.acisession import Session
 from acitoolkit.acitoolkit import Search
 from acitoolkit.aciphysobject import (
     ExternalSwitch, Fantray, Interface, Linecard, Link, Node, PhysicalModel,
-    Pod, Powersupply, Supervisorcard, Systemcontroller, Cluster
+    Pod, Powersupply, Supervisorcard, Systemcontroller, Cluster, WorkingData
 )
 import json
+import mock
+import re
+import threading
+import time
 import unittest
 
 
@@ -334,6 +340,643 @@ class TestNode(unittest.TestCase):
         self.assertNotEqual(node1, node2)
 
 
+class FakeFabricResponse(object):
+    """
+    Fake response to the queries sent to the APIC
+    """
+    ok = True
+    text = ''
+
+    def __init__(self, imdata, total_count=None):
+        data = {'imdata': imdata}
+        if total_count is not None:
+            data['totalCount'] = str(total_count)
+        self._content = json.dumps(data).encode()
+
+    def json(self):
+        return json.loads(self._content.decode())
+
+
+class FakeFabricErrorResponse(object):
+    """
+    Fake response to a query that failed on the APIC
+    """
+    ok = False
+    text = '{"imdata": [{"error": {"attributes": {"code": "503", "text": "Service Unavailable"}}}]}'
+
+
+class FakeFabric(object):
+    """
+    Fabric of a controller and switches that answers the class and
+    subtree queries sent to the APIC
+    """
+    def __init__(self, num_switches):
+        self.num_switches = num_switches
+        self.requests = []
+        self.objects = []
+        self.add_node('1', 'controller')
+        for index in range(num_switches):
+            self.add_node(str(101 + index), 'leaf' if index % 4 else 'spine')
+
+    def add(self, apic_class, dn, **attributes):
+        attributes['dn'] = dn
+        self.objects.append({apic_class: {'attributes': attributes}})
+
+    def add_node(self, node_id, role):
+        node_dn = 'topology/pod-1/node-%s' % node_id
+        self.add('fabricNode', node_dn, name='node-%s' % node_id, role=role, serial='SN%s' % node_id,
+                 model='N9K', vendor='Cisco', fabricSt='active', modTs='never')
+        self.add('topSystem', node_dn + '/sys', address='10.0.0.%s' % node_id, fabricMAC='00:00:00:00:00:01',
+                 state='in-service', mode='unspecified', oobMgmtAddr='192.168.0.%s' % node_id)
+        if role == 'controller':
+            return
+        self.add('eqptCh', node_dn + '/sys/ch', operSt='online', operStQual='', descr='chassis')
+        self.add('firmwareCardRunning', node_dn + '/sys/ch/supslot-1/sup/running', version='n9000-11.2')
+        self.add('fabricNodeHealth5min', node_dn + '/sys/CDfabricNodeHealth5min', healthLast=node_id)
+        self.add('vpcInst', node_dn + '/sys/vpc/inst', adminSt='disabled')
+        for slot in range(1, 3):
+            self.add('eqptPsuSlot', node_dn + '/sys/ch/psuslot-%s' % slot,
+                     operSt='inserted' if slot == 1 else 'empty')
+        for port in range(1, 49):
+            self.add('l1PhysIf', node_dn + '/sys/phys-[eth1/%s]' % port)
+
+    def get(self, url):
+        self.requests.append(url)
+        match = re.match(r'/api/node/class/(\w+)\.json', url)
+        if match:
+            apic_classes = [match.group(1)]
+            node_dn = None
+        else:
+            if 'rsp-subtree-class=fabricNodeHealth5min' in url:
+                return FakeFabricResponse([])
+            node_dn = re.match(r'/api/mo/(.*)\.json', url).group(1)
+            apic_classes = re.search(r'target-subtree-class=([\w,]+)', url).group(1).split(',')
+        imdata = []
+        for obj in self.objects:
+            apic_class = list(obj.keys())[0]
+            dn = obj[apic_class]['attributes']['dn']
+            if apic_class in apic_classes and (node_dn is None or dn == node_dn or dn.startswith(node_dn + '/')):
+                imdata.append(obj)
+        return FakeFabricResponse(imdata)
+
+
+class TestNodeGet(unittest.TestCase):
+    """
+    Test getting the inventory of all of the nodes
+    """
+    num_switches = 40
+
+    def setUp(self):
+        self.session = Session('https://myapic.mydomain.com', 'admin', 'password')
+        self.fabric = FakeFabric(self.num_switches)
+        self.requests = self.fabric.requests
+        self.session.get = self.fabric.get
+
+    def test_get(self):
+        """
+        Test that the nodes are built from one query per APIC class
+        """
+        nodes = Node.get(self.session)
+        self.assertEqual(len(nodes), self.num_switches + 1)
+        self.assertEqual(len(self.requests), len(Node._get_apic_classes()) + 1)
+        self.assertEqual(nodes[0].role, 'controller')
+        self.assertEqual(nodes[0].ipAddress, '10.0.0.1')
+        leaf = nodes[2]
+        self.assertEqual(leaf.node, '102')
+        self.assertEqual(leaf.role, 'leaf')
+        self.assertEqual(leaf.firmware, 'n9000-11.2')
+        self.assertEqual(leaf.health, '102')
+        self.assertEqual(leaf.num_ports, '48')
+        self.assertEqual(leaf.num_ps_slots, '2')
+        self.assertEqual(leaf.num_ps_modules, '1')
+        self.assertEqual(leaf.oper_st, 'online')
+        self.assertEqual(leaf.vpc_info, {'admin_state': 'disabled', 'oper_state': 'inactive'})
+
+    def test_same_as_single_node(self):
+        """
+        Test that the nodes are the same as the ones queried one at a time
+        """
+        nodes = Node.get(self.session)
+        for node in nodes[1:6]:
+            single_node = Node.get(self.session, node_id=node.node)[0]
+            for attribute in ('name', 'role', 'serial', 'ipAddress', 'oper_st', 'firmware', 'num_ports',
+                              'num_ps_slots', 'num_ps_modules', 'vpc_info'):
+                self.assertEqual(getattr(node, attribute), getattr(single_node, attribute))
+
+    def test_request_count(self):
+        """
+        Test that the number of requests does not depend on the number of nodes
+        """
+        Node.get(self.session)
+        request_count = len(self.requests)
+        for index in range(self.num_switches):
+            self.fabric.add_node(str(201 + index), 'leaf')
+        del self.requests[:]
+        nodes = Node.get(self.session)
+        self.assertEqual(len(nodes), 2 * self.num_switches + 1)
+        self.assertEqual(len(self.requests), request_count)
+
+    def test_order_by(self):
+        """
+        Test that the class queries are sorted by DN
+        """
+        Node.get(self.session)
+        for url in self.requests:
+            apic_class = re.match(r'/api/node/class/(\w+)\.json', url).group(1)
+            self.assertIn('order-by=%s.dn&' % apic_class, url)
+
+    def test_failed_page(self):
+        """
+        Test that a failed class query raises an error instead of returning part of the nodes
+        """
+        get = self.session.get
+
+        def get_with_error(url):
+            if url.startswith('/api/node/class/topSystem.json'):
+                self.requests.append(url)
+                return FakeFabricErrorResponse()
+            return get(url)
+        self.session.get = get_with_error
+        self.assertRaises(ValueError, Node.get, self.session)
+
+    def test_newline_in_reply(self):
+        """
+        Test that the newlines the APIC puts in the replies are removed
+        """
+        get = self.session.get
+
+        def get_with_newline(url):
+            response = get(url)
+            response._content = response._content.replace(b'"modTs": "never"', b'"modTs": "ne\nver"')
+            return response
+        self.session.get = get_with_newline
+        nodes = Node.get(self.session)
+        self.assertEqual(len(nodes), self.num_switches + 1)
+
+
+class TestPopulateNodes(unittest.TestCase):
+    """
+    Test populating the nodes of the fabric concurrently
+    """
+    def setUp(self):
+        self.fabric = FakeFabric(num_switches=40)
+        self.fabric.add('fabricPod', 'topology/pod-1', id='1')
+        for node_id in range(101, 101 + self.fabric.num_switches):
+            self.fabric.add('eqptPsu', 'topology/pod-1/node-%s/sys/ch/psuslot-1/psu' % node_id,
+                            ser='PSU%s' % node_id, model='PSU', descr='', operSt='online', fanOpSt='ok',
+                            vSrc='ac', hwVer='1', rev='A0', status='', modTs='never')
+        self.session = Session('https://myapic.mydomain.com', 'admin', 'password')
+        self.session.get = self._get
+        self.failed_node = None
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.gate_size = None
+        self.gate = threading.Condition()
+        self.gate_deadline = None
+
+    def _get(self, url):
+        if url.startswith('/api/mo/'):
+            if self.gate_size is not None:
+                with self.gate:
+                    self.in_flight += 1
+                    self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                    self.gate.notify_all()
+                    # hold the calls until gate_size of them are in flight at once
+                    if self.gate_deadline is None:
+                        self.gate_deadline = time.time() + 5
+                    while self.max_in_flight < self.gate_size and time.time() < self.gate_deadline:
+                        self.gate.wait(self.gate_deadline - time.time())
+                    self.in_flight -= 1
+            if self.failed_node is not None and '/node-%s/' % self.failed_node in url:
+                raise ValueError('Connection lost')
+        return self.fabric.get(url)
+
+    @staticmethod
+    def _get_node_children(physical_model):
+        result = {}
+        for pod in physical_model.get_children():
+            for node in pod.get_children(child_type=Node):
+                result[node.node] = sorted(str(child) for child in node.get_children())
+        return result
+
+    def test_same_as_sequential(self):
+        """
+        Test that the nodes are the same as the ones populated one after another
+        """
+        sequential = PhysicalModel.get_deep(self.session, max_workers=1)[0]
+        concurrent = PhysicalModel.get_deep(self.session, max_workers=8)[0]
+        self.assertEqual(self._get_node_children(concurrent), self._get_node_children(sequential))
+        self.assertEqual(len(self._get_node_children(concurrent)['102']), 1)
+
+    def test_failure_isolation(self):
+        """
+        Test that a node that cannot be populated does not stop the others
+        and is reported to the progress callback
+        """
+        self.failed_node = '105'
+        progress = []
+        physical_model = PhysicalModel.get_deep(self.session, progress_callback=lambda *args: progress.append(args))[0]
+        self.assertEqual(len(progress), self.fabric.num_switches + 1)
+        self.assertEqual([completed for (node, completed, total, error) in progress],
+                         list(range(1, self.fabric.num_switches + 2)))
+        failures = [(node.node, str(error)) for (node, completed, total, error) in progress if error is not None]
+        self.assertEqual(failures, [('105', 'Connection lost')])
+        node_children = self._get_node_children(physical_model)
+        self.assertEqual(node_children['105'], [])
+        self.assertEqual(len(node_children['106']), 1)
+
+    def test_concurrency(self):
+        """
+        Test that max_workers calls to the switches are in flight at once
+        and never more
+        """
+        self.gate_size = 8
+        PhysicalModel.get_deep(self.session, max_workers=8)
+        self.assertEqual(self.max_in_flight, 8)
+
+class TestInterfaceGet(unittest.TestCase):
+    """
+    Test getting the physical interfaces with their CDP and LLDP policies
+    """
+    num_switches = 4
+    num_ports = 48
+
+    def setUp(self):
+        self.session = Session('https://myapic.mydomain.com', 'admin', 'password')
+        self.requests = []
+        self.session.get = self._get
+        self.objects = [
+            {'cdpIfPol': {'attributes': {'dn': 'uni/infra/cdpIfP-CDP_enabled', 'name': 'CDP_enabled',
+                                         'adminSt': 'enabled'}}},
+            {'cdpIfPol': {'attributes': {'dn': 'uni/infra/cdpIfP-CDP_disabled', 'name': 'CDP_disabled',
+                                         'adminSt': 'disabled'}}},
+            {'lldpIfPol': {'attributes': {'dn': 'uni/infra/lldpIfP-default', 'name': 'default',
+                                          'adminTxSt': 'enabled'}}}]
+        for node in range(101, 101 + self.num_switches):
+            self._add_ports(node, 1, self.num_ports)
+
+    def _add_ports(self, node, first_port, last_port):
+        for port in range(first_port, last_port + 1):
+            dn = 'topology/pod-1/node-%s/sys/phys-[eth1/%s]' % (node, port)
+            self.objects.append({'l1PhysIf': {'attributes': {
+                'dn': dn, 'portT': 'leaf', 'adminSt': 'up', 'speed': 'inherit', 'mtu': '9000', 'id': 'eth1/%s' % port,
+                'monPolDn': '', 'name': '', 'descr': '', 'usage': 'discovery'}}})
+            self.objects.append({'ethpmPhysIf': {'attributes': {'dn': dn + '/phys', 'operSt': 'up',
+                                                                'operSpeed': '10G'}}})
+            cdp_policy = 'CDP_enabled' if port % 2 else 'CDP_disabled'
+            self.objects.append({'l1RsCdpIfPolCons': {'attributes': {
+                'dn': dn + '/rscdpIfPolCons', 'tDn': 'uni/infra/cdpIfP-' + cdp_policy}}})
+            if port % 3 == 0:
+                self.objects.append({'l1RsLldpIfPolCons': {'attributes': {
+                    'dn': dn + '/rslldpIfPolCons', 'tDn': 'uni/infra/lldpIfP-default'}}})
+
+    def _get(self, url):
+        self.requests.append(url)
+        match = re.match(r'/api/node/class/([\w,]+)\.json', url)
+        if match:
+            apic_classes = match.group(1).split(',')
+            dn = None
+        else:
+            dn = re.match(r'/api/mo/(.*)\.json', url).group(1)
+            apic_classes = None
+        subtree_classes = re.search(r'target-subtree-class=([\w,]+)', url)
+        if subtree_classes:
+            apic_classes = subtree_classes.group(1).split(',')
+        imdata = []
+        for obj in self.objects:
+            apic_class = list(obj.keys())[0]
+            obj_dn = obj[apic_class]['attributes']['dn']
+            if apic_classes is not None and apic_class not in apic_classes:
+                continue
+            if dn is not None and obj_dn != dn and not obj_dn.startswith(dn + '/'):
+                continue
+            imdata.append(obj)
+        return FakeFabricResponse(imdata)
+
+    def test_get(self):
+        """
+        Test the CDP and LLDP configuration of the interfaces of the fabric
+        """
+        interfaces = Interface.get(self.session)
+        self.assertEqual(len(interfaces), self.num_switches * self.num_ports)
+        self.assertEqual(len(self.requests), 4)
+        by_name = dict((intf.if_name, intf) for intf in interfaces)
+        self.assertTrue(by_name['eth 1/102/1/1'].is_cdp_enabled())
+        self.assertTrue(by_name['eth 1/102/1/2'].is_cdp_disabled())
+        self.assertTrue(by_name['eth 1/102/1/3'].is_lldp_enabled())
+        self.assertFalse(by_name['eth 1/102/1/4'].is_lldp_enabled())
+        self.assertFalse(by_name['eth 1/102/1/4'].is_lldp_disabled())
+
+    def test_get_node(self):
+        """
+        Test that only the relations of the node are retrieved
+        """
+        interfaces = Interface.get(self.session, '1', '103')
+        self.assertEqual(len(interfaces), self.num_ports)
+        self.assertEqual(len(self.requests), 4)
+        self.assertIn('/api/mo/topology/pod-1/node-103/sys.json?query-target=subtree&'
+                      'target-subtree-class=l1RsCdpIfPolCons,l1RsLldpIfPolCons', self.requests)
+        self.assertTrue(interfaces[0].is_cdp_enabled())
+
+        interface = Interface.get(self.session, '1', '103', '1', '3')[0]
+        self.assertTrue(interface.is_cdp_enabled())
+        self.assertTrue(interface.is_lldp_enabled())
+
+    def test_linear(self):
+        """
+        Test that the number of interface comparisons and DN parses needed
+        to apply the relations grows linearly with the number of interfaces
+        """
+        calls = []
+        eq = Interface.__eq__
+        parse_physical_dn = Interface._parse_physical_dn
+
+        def counting_eq(intf, other):
+            calls.append('eq')
+            return eq(intf, other)
+
+        def counting_parse_physical_dn(dn):
+            calls.append('parse')
+            return parse_physical_dn(dn)
+        counts = []
+        for num_switches in (10, 40):
+            self.objects = self.objects[:3]
+            for node in range(101, 101 + num_switches):
+                self._add_ports(node, 1, self.num_ports)
+            interfaces = Interface.get(self.session)
+            del calls[:]
+            with mock.patch.object(Interface, '__eq__', counting_eq), \
+                    mock.patch.object(Interface, '_parse_physical_dn', staticmethod(counting_parse_physical_dn)):
+                Interface._get_discoveryprot_relations(self.session, interfaces,
+                                                       Interface._get_discoveryprot_policies(self.session),
+                                                       '/api/node/class/l1PhysIf.json?query-target=subtree&'
+                                                       'target-subtree-class=l1RsCdpIfPolCons,l1RsLldpIfPolCons')
+            self.assertGreater(len(calls), 0)
+            counts.append(len(calls))
+        self.assertLessEqual(counts[1], counts[0] * 4)
+
+class TestInterfaceStats(unittest.TestCase):
+    """
+    Test decoding the interface counters
+    """
+    def setUp(self):
+        self.counter_families = InterfaceStats.counter_families[:]
+        self.float_fields = set(InterfaceStats._float_fields)
+
+    def tearDown(self):
+        InterfaceStats.counter_families[:] = self.counter_families
+        InterfaceStats._float_fields.intersection_update(self.float_fields)
+        InterfaceStats._counter_parsers.clear()
+
+    @staticmethod
+    def _get_data(*children):
+        return {'l1PhysIf': {'attributes': {'dn': 'topology/pod-1/node-101/sys/phys-[eth1/1]'},
+                             'children': list(children)}}
+
+    @staticmethod
+    def _get_counter(apic_class, index=None, **counters):
+        attributes = {'repIntvStart': 'start', 'repIntvEnd': 'end'}
+        if index is None:
+            attributes['rn'] = 'CD' + apic_class
+        else:
+            attributes['rn'] = 'HD%s-%s' % (apic_class, index)
+            attributes['index'] = str(index)
+        attributes.update(counters)
+        return {apic_class: {'attributes': attributes}}
+
+    def test_process_data(self):
+        """
+        Test that the counters are decoded with the types of their family
+        """
+        storm = dict(('dropBytes' + suffix, '7') for suffix in ('Avg', 'Cum', 'Max', 'Min', 'Per'))
+        storm.update(('dropBytes' + suffix, '1.5') for suffix in ('Rate', 'RateAvg', 'RateMax', 'RateMin'))
+        data = self._get_data(self._get_counter('eqptIngrStorm5min', **storm),
+                              self._get_counter('eqptIngrStormHist15min', 2, **storm))
+        result = InterfaceStats._process_data(data)
+        self.assertEqual(sorted(result['ingrStorm'].keys()), ['15min', '5min'])
+        current = result['ingrStorm']['5min'][0]
+        self.assertEqual(current['dropBytesCum'], 7)
+        self.assertEqual(current['dropBytesRateMax'], 1.5)
+        self.assertEqual(current['intervalEnd'], 'end')
+        self.assertEqual(len(current), 11)
+        self.assertEqual(result['ingrStorm']['15min'][3], current)
+
+    def test_add_counter_family(self):
+        """
+        Test decoding a counter family added to the schema
+        """
+        data = self._get_data(self._get_counter('eqptIngrUnkFrames5min', unknownCum='3', unknownRate='0.5'))
+        self.assertEqual(InterfaceStats._process_data(data)['eqptIngrUnkFrames5min']['5min'][0],
+                         {'intervalEnd': 'end', 'intervalStart': 'start'})
+
+        InterfaceStats.add_counter_family(CounterFamily('ingrUnkFrames', 'IngrUnkFrames',
+                                                        ('unknownCum',), ('unknownRate',)))
+        result = InterfaceStats._process_data(data)
+        self.assertEqual(result['ingrUnkFrames']['5min'][0],
+                         {'unknownCum': 3, 'unknownRate': 0.5, 'intervalEnd': 'end', 'intervalStart': 'start'})
+
+        stats = InterfaceStats(None, 'topology/pod-1/node-101/sys/phys-[eth1/1]')
+        stats.result = result
+        self.assertEqual(stats.retrieve('ingrUnkFrames', '5min', 0, 'unknownCum'), 3)
+        self.assertEqual(stats.retrieve('ingrUnkFrames', '1h', 0, 'unknownRate'), 0.0)
+        self.assertIsInstance(stats.retrieve('ingrUnkFrames', '1h', 0, 'unknownRate'), float)
+        self.assertIsInstance(stats.retrieve('egrTotal', '1h', 0, 'bytesRateAvg'), float)
+        self.assertIsInstance(stats.retrieve('egrTotal', '1h', 0, 'bytesCum'), int)
+
+
+class TestInterfaceStatsCollector(unittest.TestCase):
+    """
+    Test collecting the interface counters of the fabric
+    """
+    num_ports = 250
+
+    def setUp(self):
+        self.requests = []
+        self.counters = {}
+        self.interval_start = 'start'
+        self.extra_objects = []
+        self.session = Session('http://1.1.1.1', 'admin', 'password')
+        self.session.get = self._get
+        self.fields = set()
+        for counter_family in InterfaceStats.counter_families:
+            if counter_family.name in ('egrTotal', 'ingrTotal'):
+                self.fields.update(counter_family.int_fields + counter_family.float_fields)
+
+    def _get(self, url):
+        self.requests.append(url)
+        page = int(re.search(r'page=(\d+)', url).group(1))
+        page_size = int(re.search(r'page-size=(\d+)', url).group(1))
+        imdata = []
+        for apic_class in url.split('/api/node/class/')[1].split('.json')[0].split(','):
+            for index in range(self.num_ports):
+                port_dn = 'topology/pod-1/node-%s/sys/phys-[eth1/%s]' % (101 + index // 50, index % 50 + 1)
+                counter = self.counters.get((index, apic_class), 0)
+                attributes = dict((field, '0') for field in self.fields)
+                attributes.update({'dn': port_dn + '/CD' + apic_class,
+                                   'repIntvStart': self.interval_start,
+                                   'repIntvEnd': 'end',
+                                   'bytesCum': str(counter * 100),
+                                   'pktsCum': str(counter)})
+                imdata.append({apic_class: {'attributes': attributes}})
+        imdata.extend(self.extra_objects)
+        return FakeFabricResponse(imdata[page * page_size:(page + 1) * page_size], len(imdata))
+
+    def _set_counters(self, value):
+        for index in range(self.num_ports):
+            for apic_class in ('eqptEgrTotal5min', 'eqptIngrTotal5min'):
+                self.counters[(index, apic_class)] = value
+
+    def test_rates(self):
+        """
+        Test the rates computed from the cumulative counters
+        """
+        collector = InterfaceStatsCollector(self.session, page_size=200)
+        self._set_counters(10)
+        self.assertEqual(collector.poll(timestamp=100), self.num_ports * 2)
+        self.assertEqual(len(self.requests), 4)
+        self.assertIn('/api/node/class/eqptEgrTotal5min.json?order-by=eqptEgrTotal5min.dn&page=1&page-size=200',
+                      self.requests)
+        self.assertIn('/api/node/class/eqptIngrTotal5min.json?order-by=eqptIngrTotal5min.dn&page=0&page-size=200',
+                      self.requests)
+        self.assertEqual(len(collector.get_ports()), self.num_ports)
+        self.assertIsNone(collector.get_rate('1/101/1/1', 'egrTotal', 'bytes'))
+
+        self._set_counters(40)
+        collector.poll(timestamp=110)
+        self.assertEqual(collector.get_rate('1/101/1/1', 'egrTotal', 'bytes'), 300.0)
+        self.assertEqual(collector.get_rate('1/105/1/50', 'ingrTotal', 'pkts'), 3.0)
+        sample = collector.get_history('1/105/1/50', 'ingrTotal')[-1]
+        self.assertEqual(sample.counters['pktsCum'], 40)
+        self.assertEqual(sample.deltas['pkts'], 30)
+        self.assertIsNone(collector.get_rate('1/106/1/1', 'egrTotal', 'bytes'))
+
+    def test_other_dns(self):
+        """
+        Test that the counters of the port channels and the DNs that
+        cannot be parsed are skipped without stopping the poll
+        """
+        attributes = dict((field, '0') for field in self.fields)
+        for dn in ('topology/pod-1/node-101/sys/aggr-[po1]/CDeqptEgrTotal5min',
+                   'topology/pod-1/node-101/sys/phys-[eth1',
+                   'topology/pod-1/node-101/sys/phys-[eth1/60]/CDeqptEgrTotal5min'):
+            self.extra_objects.append({'eqptEgrTotal5min': {'attributes': dict(attributes, dn=dn)}})
+        self.extra_objects[2]['eqptEgrTotal5min']['attributes']['bytesCum'] = ''
+        collector = InterfaceStatsCollector(self.session)
+        self.assertEqual(collector.poll(timestamp=0), self.num_ports * 2)
+        self.assertEqual(len(collector.get_ports()), self.num_ports)
+
+    def test_reset(self):
+        """
+        Test that only a decrease of a cumulative counter is a reset and
+        that a new interval is not
+        """
+        collector = InterfaceStatsCollector(self.session)
+        self._set_counters(50)
+        collector.poll(timestamp=0)
+        self.interval_start = 'next'
+        self._set_counters(60)
+        collector.poll(timestamp=10)
+        self.assertEqual(collector.get_history('1/101/1/1', 'egrTotal')[-1].deltas['pkts'], 10)
+        self.assertEqual(collector.get_rate('1/101/1/1', 'egrTotal', 'pkts'), 1.0)
+
+        self._set_counters(20)
+        collector.poll(timestamp=20)
+        self.assertEqual(collector.get_history('1/101/1/1', 'egrTotal')[-1].deltas['pkts'], 20)
+        self.assertEqual(collector.get_rate('1/101/1/1', 'egrTotal', 'pkts'), 2.0)
+
+    def test_failed_page(self):
+        """
+        Test that a failed page raises an error instead of recording part of the fabric
+        """
+        get = self.session.get
+
+        def get_with_error(url):
+            if 'page=1&' in url:
+                self.requests.append(url)
+                return FakeFabricErrorResponse()
+            return get(url)
+        self.session.get = get_with_error
+        collector = InterfaceStatsCollector(self.session, page_size=200)
+        self.assertRaises(ValueError, collector.poll, timestamp=0)
+        self.assertEqual(collector.get_ports(), [])
+
+    def test_history(self):
+        """
+        Test that the history of each port is bounded
+        """
+        collector = InterfaceStatsCollector(self.session, counter_families=('egrTotal',), history=5)
+        for index in range(12):
+            self._set_counters(index)
+            collector.poll(timestamp=index)
+        history = collector.get_history('1/103/1/7', 'egrTotal')
+        self.assertEqual([sample.timestamp for sample in history], [7, 8, 9, 10, 11])
+        self.assertEqual(history[-1].rates, {'bytes': 100.0, 'pkts': 1.0})
+        self.assertEqual(collector.get_history('1/103/1/7', 'ingrTotal'), [])
+        self.assertEqual(len(self.requests), 12)
+
+
+class TestWorkingData(unittest.TestCase):
+    """
+    Test the lookups of the objects of a switch
+    """
+    num_endpoints = 10000
+
+    def setUp(self):
+        rawjson = []
+        node_dn = 'topology/pod-1/node-101/sys'
+        for index in range(self.num_endpoints):
+            ep_dn = node_dn + '/ctx-[vxlan-%s]/db-ep/mac-00:00:00:00:%02X:%02X' % (index % 10, index // 256,
+                                                                                  index % 256)
+            rawjson.append({'epmMacEp': {'attributes': {'dn': ep_dn}}})
+            rawjson.append({'epmRsMacEpToIpEpAtt': {'attributes': {'dn': ep_dn + '/rsmacEpToIpEpAtt-[ip]'}}})
+        rawjson.append({'epmRsMacEpToIpEpAtt': {'attributes': {'dn': node_dn + '/ctx-[vxlan-1]0/rs'}}})
+        self.working_data = WorkingData()
+        self.working_data.rawjson = rawjson
+        self.working_data._index_objects()
+
+    def _get_subtree_by_scan(self, class_name, dname):
+        return [record for record in self.working_data.get_class(class_name)
+                if record[class_name]['attributes']['dn'].startswith(dname + '/')]
+
+    def test_get_subtree(self):
+        """
+        Test that the subtree is the same as the one found by comparing
+        every dn in the order of the class
+        """
+        for dname in ('topology/pod-1/node-101/sys/ctx-[vxlan-1]',
+                      'topology/pod-1/node-101/sys/ctx-[vxlan-1]/db-ep/mac-00:00:00:00:00:0B',
+                      'topology/pod-1/node-101',
+                      'topology/pod-1/node-10'):
+            result = self.working_data.get_subtree('epmRsMacEpToIpEpAtt', dname)
+            self.assertEqual(result, self._get_subtree_by_scan('epmRsMacEpToIpEpAtt', dname))
+        self.assertEqual(len(self.working_data.get_subtree('epmRsMacEpToIpEpAtt',
+                                                           'topology/pod-1/node-101/sys/ctx-[vxlan-1]')),
+                         self.num_endpoints // 10)
+        self.assertEqual(self.working_data.get_subtree('epmRsMacEpToIpEpAtt', 'topology/pod-1/node-10'), [])
+        self.assertEqual(self.working_data.get_subtree('unknownClass', 'topology/pod-1/node-101'), [])
+
+    def test_add(self):
+        """
+        Test that the objects indexed later are found in the subtree
+        """
+        dname = 'topology/pod-1/node-101/sys/ctx-[vxlan-1]'
+        self.working_data.rawjson = [{'epmRsMacEpToIpEpAtt': {'attributes': {'dn': dname + '/new'}}}]
+        self.working_data._index_objects()
+        result = self.working_data.get_subtree('epmRsMacEpToIpEpAtt', dname)
+        self.assertEqual(len(result), self.num_endpoints // 10 + 1)
+        self.assertEqual(result[-1]['epmRsMacEpToIpEpAtt']['attributes']['dn'], dname + '/new')
+
+    def test_get_subtree_of_endpoints(self):
+        """
+        Test that the subtrees of the MAC endpoints are the same as the
+        ones found by comparing every dn
+        """
+        for endpoint in self.working_data.get_class('epmMacEp')[::50]:
+            dname = endpoint['epmMacEp']['attributes']['dn']
+            result = self.working_data.get_subtree('epmRsMacEpToIpEpAtt', dname)
+            self.assertEqual(len(result), 1)
+            self.assertEqual(result, self._get_subtree_by_scan('epmRsMacEpToIpEpAtt', dname))
+
 class TestLink(unittest.TestCase):
     def test_parameters(self):
         pod = Pod('1')
@@ -1403,6 +2046,12 @@ if __name__ == '__main__':
 
     offline.addTest(unittest.makeSuite(TestPod))
     offline.addTest(unittest.makeSuite(TestNode))
+    offline.addTest(unittest.makeSuite(TestNodeGet))
+    offline.addTest(unittest.makeSuite(TestPopulateNodes))
+    offline.addTest(unittest.makeSuite(TestWorkingData))
+    offline.addTest(unittest.makeSuite(TestInterfaceGet))
+    offline.addTest(unittest.makeSuite(TestInterfaceStats))
+    offline.addTest(unittest.makeSuite(TestInterfaceStatsCollector))
     offline.addTest(unittest.makeSuite(TestLink))
     offline.addTest(unittest.makeSuite(TestFan))
     offline.addTest(unittest.makeSuite(TestPowerSupply))
@@ -2,7 +2,10 @@
 """
 import unittest
 import argparse
+import os
+import shutil
 import sys
+import tempfile
 from acitoolkit import FakeSession
 from os import listdir
 import json
@@ -133,6 +136,119 @@ class TestFakeApic(unittest.TestCase):
         self.session.unsubscribe(url)
 
 
+class TestFakeApicIndex(unittest.TestCase):
+    """
+    Tests for the indexes of the Fake APIC
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        epgs = [{'fvAEPg': {'attributes': {'rn': 'epg-epg%s' % index, 'name': 'epg%s' % index},
+                            'children': [{'fvRsBd': {'attributes': {'rn': 'rsbd', 'tnFvBDName': 'bd'}}}]}}
+                for index in range(3)]
+        tenant = {'fvTenant': {'attributes': {'dn': 'uni/tn-tenant', 'name': 'tenant'},
+                               'children': [{'fvAp': {'attributes': {'rn': 'ap-app', 'name': 'app'},
+                                                      'children': epgs}},
+                                            {'fvBD': {'attributes': {'rn': 'BD-bd', 'name': 'bd'},
+                                                      'children': [{'fvSubnet': {'attributes': {
+                                                          'rn': 'subnet-[10.0.0.1/24]', 'ip': '10.0.0.1/24'}}}]}}]}}
+        self.tenant_file = os.path.join(self.tmp_dir, '1-tenant.json')
+        with open(self.tenant_file, 'w') as f:
+            json.dump({'imdata': [tenant]}, f)
+        subnets = [{'fvSubnet': {'attributes': {'dn': 'uni/tn-tenant/BD-bd/subnet-[10.1.%s.1/24]' % index}}}
+                   for index in range(2)]
+        subnets.append({'fvSubnet': {'attributes': {'dn': 'uni/tn-tenant2/BD-bd/subnet-[10.2.0.1/24]'}}})
+        with open(os.path.join(self.tmp_dir, '2-subnets.json'), 'w') as f:
+            json.dump({'imdata': subnets}, f)
+        with open(os.path.join(self.tmp_dir, '3-error.json'), 'w') as f:
+            json.dump({'imdata': [{'error': {'attributes': {'text': 'timeout'}}}]}, f)
+        self.filenames = sorted(os.path.join(self.tmp_dir, filename) for filename in listdir(self.tmp_dir))
+        with open(self.tenant_file) as f:
+            self.tenant_json = f.read()
+        self.session = FakeSession(self.filenames)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _get_dns(self, query):
+        data = self.session.get(query).json()['imdata']
+        return [list(obj.values())[0]['attributes']['dn'] for obj in data]
+
+    def test_load(self):
+        """
+        Test that the snapshot files are not modified when loaded
+        """
+        with open(self.tenant_file) as f:
+            self.assertEqual(f.read(), self.tenant_json)
+        self.assertEqual(len(self.session.db), 2)
+
+    def test_class_query(self):
+        """
+        Test class queries including several classes
+        """
+        self.assertEqual(len(self._get_dns('/api/class/fvSubnet.json')), 4)
+        self.assertEqual(len(self._get_dns('/api/node/class/fvAEPg,fvBD,fvBadClass.json')), 4)
+        self.assertEqual(len(self._get_dns('/api/node/class/fvBD.json?query-target=children&'
+                                           'target-subtree-class=fvSubnet')), 3)
+        self.assertEqual(len(self._get_dns('/api/node/class/fvAp.json?query-target=subtree')), 7)
+
+    def test_dn_query(self):
+        """
+        Test the self, children and subtree queries of a dn
+        """
+        self.assertEqual(self._get_dns('/api/mo/uni/tn-tenant/BD-bd.json'), ['uni/tn-tenant/BD-bd'])
+        self.assertEqual(self._get_dns('/api/mo/uni/tn-tenant/BD-bd.json?query-target=children'),
+                         ['uni/tn-tenant/BD-bd/subnet-[10.0.0.1/24]',
+                          'uni/tn-tenant/BD-bd/subnet-[10.1.0.1/24]',
+                          'uni/tn-tenant/BD-bd/subnet-[10.1.1.1/24]'])
+        self.assertEqual(self._get_dns('/api/mo/uni/tn-tenant.json?query-target=children'),
+                         ['uni/tn-tenant/ap-app', 'uni/tn-tenant/BD-bd'])
+        self.assertEqual(self._get_dns('/api/mo/uni/tn-tenant.json?query-target=subtree&'
+                                       'target-subtree-class=fvAEPg,fvBD'),
+                         ['uni/tn-tenant/ap-app/epg-epg%s' % index for index in range(3)] +
+                         ['uni/tn-tenant/BD-bd'])
+        self.assertEqual(len(self._get_dns('/api/mo/uni/tn-tenant.json?query-target=subtree')), 12)
+        self.assertEqual(self._get_dns('/api/mo/uni/tn-tenant/BD-bd/subnet-[10.0.0.1/24].json?'
+                                       'query-target=subtree'),
+                         ['uni/tn-tenant/BD-bd/subnet-[10.0.0.1/24]'])
+        self.assertEqual(self._get_dns('/api/mo/uni/tn-tenant/ap.json?query-target=subtree'), [])
+
+    def test_rsp_subtree(self):
+        """
+        Test that the responses share the loaded objects
+        """
+        query = '/api/mo/uni/tn-tenant/ap-app.json?query-target=children&rsp-subtree=children'
+        epgs = self.session.get(query).json()['imdata']
+        self.assertEqual(len(epgs), 3)
+        self.assertEqual(list(epgs[0]['fvAEPg']['children'][0].keys()), ['fvRsBd'])
+        self.assertNotIn('children', epgs[0]['fvAEPg']['children'][0]['fvRsBd'])
+
+        tenant = self.session.db[0]['imdata'][0]
+        data = self.session.get('/api/mo/uni/tn-tenant.json?rsp-subtree=full').json()['imdata']
+        self.assertIs(data[0], tenant)
+        data = self.session.get('/api/mo/uni/tn-tenant.json').json()['imdata']
+        self.assertNotIn('children', data[0]['fvTenant'])
+        self.assertIn('children', tenant['fvTenant'])
+
+    def test_page(self):
+        """
+        Test the paged class queries
+        """
+        resp = self.session.get('/api/class/fvSubnet.json?page=1&page-size=3')
+        self.assertEqual(resp.json()['totalCount'], '4')
+        self.assertEqual(self._get_dns('/api/class/fvSubnet.json?page=1&page-size=3'),
+                         ['uni/tn-tenant2/BD-bd/subnet-[10.2.0.1/24]'])
+        self.assertEqual(json.loads(resp.text)['imdata'], resp.json()['imdata'])
+        self.assertIsInstance(resp._content, bytes)
+
+    def test_fill_data(self):
+        """
+        Test adding objects after the first queries
+        """
+        self.assertEqual(len(self._get_dns('/api/mo/uni/tn-tenant2.json?query-target=subtree')), 1)
+        self.session._fill_data([{'fvBD': {'attributes': {'dn': 'uni/tn-tenant2/BD-bd'}}}], None)
+        self.assertEqual(len(self._get_dns('/api/mo/uni/tn-tenant2.json?query-target=subtree')), 2)
+
+
 if __name__ == '__main__':
     global filenames
 
@@ -149,4 +265,5 @@ if __name__ == '__main__':
     # Run the tests
     fake = unittest.TestSuite()
     fake.addTest(unittest.makeSuite(TestFakeApic))
+    fake.addTest(unittest.makeSuite(TestFakeApicIndex))
     unittest.main(defaultTest='fake', argv=sys.argv[:1] + unittest_args)
@@ -38,15 +38,21 @@ from acitoolkit import (
     PortChannel, Subnet, Taboo, Tenant, VmmDomain, LogicalModel, OutsideNetwork,
     AttributeCriterion, OutsideL2, TunnelInterface, FexInterface, VMM,
     OutsideL2EPG, AnyEPG, InputTerminal, OutputTerminal, AcitoolkitGraphBuilder,
-    Interface, Linecard, Node, Fabric, Table, Session, HealthScore)
+    Interface, Linecard, Node, Fabric, Table, Session, HealthScore,
+    HealthScoreIndex, FakeSession, FaultStore)
+from acitoolkit.acitoolkit import build_object_dictionary
+from acitoolkit.acibaseobject import _is_json_streamed
 import os.path
 import unittest
 import string
 import random
 import time
 import json
+import re
 import sys
 
+import mock
+
 try:
     from credentials import URL, LOGIN, PASSWORD, CERT_NAME, KEY
 except ImportError:
@@ -350,6 +356,69 @@ class TestBaseACIObject(unittest.TestCase):
         self.assertEqual(test_dic[obj1], 10)
         self.assertEqual(test_dic[obj2], 10)
 
+    def test_hashing_after_name_change(self):
+        """
+        Test that the hash follows a change of name of the object or
+        of one of its ancestors
+        """
+        tenant = Tenant('tenant')
+        app = AppProfile('app', tenant)
+        epg1 = EPG('epg', app)
+        epg2 = EPG('epg', AppProfile('app', Tenant('tenant')))
+        self.assertEqual(epg1, epg2)
+        self.assertEqual(hash(epg1), hash(epg2))
+        tenant.name = 'tenant2'
+        self.assertNotEqual(epg1, epg2)
+        self.assertNotIn(epg1, set([epg2]))
+        epg2.get_parent().get_parent().name = 'tenant2'
+        self.assertEqual(epg1, epg2)
+        self.assertIn(epg1, set([epg2]))
+        epg2.name = 'epg2'
+        self.assertNotEqual(epg1, epg2)
+
+    def test_hashing_after_set_parent(self):
+        """
+        Test that the hash follows a change of parent of the object
+        """
+        app1 = AppProfile('app', Tenant('tenant1'))
+        app2 = AppProfile('app', Tenant('tenant2'))
+        epg1 = EPG('epg', app1)
+        epg2 = EPG('epg', app2)
+        self.assertNotEqual(epg1, epg2)
+        epg2.set_parent(app1)
+        self.assertEqual(epg1, epg2)
+        self.assertEqual(hash(epg1), hash(epg2))
+
+    def test_identity_key_cached(self):
+        """
+        Test that the identity key is computed once and discarded when
+        the name or the parent of the object or of an ancestor changes
+        """
+        tenant = Tenant('tenant')
+        app = AppProfile('app', tenant)
+        epgs = [EPG('epg-%s' % index, app) for index in range(10)]
+        with mock.patch('acitoolkit.acibaseobject.hash', create=True, side_effect=hash) as mock_hash:
+            for i in range(3):
+                self.assertEqual(len(set(epgs)), 10)
+                self.assertIn(epgs[3], set(epgs))
+            # One key for each EPG, the application profile and the tenant
+            self.assertEqual(mock_hash.call_count, 12)
+
+            epgs[0].descr = 'description'
+            hash(epgs[0])
+            self.assertEqual(mock_hash.call_count, 12)
+
+            app.name = 'app2'
+            self.assertIn('_identity', tenant.__dict__)
+            self.assertNotIn('_identity', app.__dict__)
+            self.assertFalse(any('_identity' in epg.__dict__ for epg in epgs))
+            self.assertEqual(len(set(epgs)), 10)
+            self.assertEqual(mock_hash.call_count, 23)
+
+            epgs[1].set_parent(AppProfile('app', tenant))
+            self.assertNotIn('_identity', epgs[1].__dict__)
+            self.assertIn('_identity', epgs[2].__dict__)
+
 
 class TestTenant(unittest.TestCase):
     """
@@ -389,6 +458,63 @@ class TestTenant(unittest.TestCase):
         tenants = [Tenant('tenant1'), Tenant('tenant2'), Tenant('tenant3')]
         self.assertTrue(isinstance(Tenant.get_table(tenants)[0], Table))
 
+    def test_build_object_dictionary(self):
+        """
+        Test indexing the objects of a tenant by class
+        """
+        tenant = Tenant('tenant')
+        app = AppProfile('app', tenant)
+        epg1 = EPG('epg1', app)
+        epg2 = EPG('epg2', app)
+        bd = BridgeDomain('bd', tenant)
+        obj_dict = build_object_dictionary([tenant])
+        self.assertEqual(obj_dict[Tenant], set([tenant]))
+        self.assertEqual(obj_dict[AppProfile], set([app]))
+        self.assertEqual(obj_dict[EPG], set([epg1, epg2]))
+        self.assertEqual(obj_dict[BridgeDomain], set([bd]))
+
+        tenant2 = Tenant('tenant2')
+        build_object_dictionary([tenant2], obj_dict)
+        self.assertEqual(obj_dict[Tenant], set([tenant, tenant2]))
+
+    def test_build_object_dictionary_deep(self):
+        """
+        Test indexing an object tree deeper than the recursion limit
+        """
+        root = MockACIObject('mock')
+        obj = root
+        for index in range(sys.getrecursionlimit() + 100):
+            obj = MockACIObject('mock-%s' % index, obj)
+        obj_dict = build_object_dictionary([root])
+        self.assertEqual(len(obj_dict[MockACIObject]), sys.getrecursionlimit() + 101)
+
+    def test_build_object_dictionary_same_as_recursive(self):
+        """
+        Test that the iterative index of a tenant equals the recursive one
+        """
+        def build_recursive(objs):
+            result = {}
+            for obj in objs:
+                result.setdefault(obj.__class__, set()).add(obj)
+                for child_class, children in build_recursive(obj.get_children()).items():
+                    result[child_class] = result.get(child_class, set()) | children
+            return result
+
+        tenant = Tenant('tenant')
+        context = Context('ctx', tenant)
+        for app_index in range(10):
+            app = AppProfile('app-%s' % app_index, tenant)
+            for epg_index in range(10):
+                epg = EPG('epg-%s' % epg_index, app)
+                bd = BridgeDomain('bd-%s' % epg_index, tenant)
+                bd.add_context(context)
+                epg.add_bd(bd)
+                Endpoint('ep', epg)
+        obj_dict = build_object_dictionary([tenant])
+        self.assertEqual(obj_dict, build_recursive([tenant]))
+        self.assertEqual(len(obj_dict[EPG]), 100)
+        self.assertEqual(len(obj_dict[BridgeDomain]), 10)
+
     def test_bad_parent(self):
         fabric = Fabric()
         tenant = Tenant('mytenant', parent=fabric)
@@ -403,6 +529,499 @@ class TestSession(unittest.TestCase):
         session = Session('https://myapic.mydomain.com', 'admin', 'password')
         self.assertTrue(isinstance(session, Session))
 
+    def _get_session(self):
+        session = Session('https://myapic.mydomain.com', 'admin', 'password')
+        self.addCleanup(session.subscription_thread.exit)
+        self.addCleanup(session.subscription_thread._subscriptions.clear)
+        return session
+
+    def test_wait_for_events(self):
+        session = self._get_session()
+        url = '/api/class/fvTenant.json?subscription=yes'
+        session.subscription_thread._subscriptions[url] = '1234'
+        self.assertFalse(session.wait_for_events(timeout=0.01))
+        event = {'subscriptionId': ['1234'],
+                 'imdata': [{'fvTenant': {'attributes': {'dn': 'uni/tn-test', 'status': 'created'}}}]}
+        session.subscription_thread._event_q.put(json.dumps(event))
+        self.assertTrue(session.wait_for_events(timeout=0.01))
+        self.assertTrue(session.has_events(url))
+        self.assertTrue(session.wait_for_events(timeout=0.01))
+        self.assertEqual(session.get_event(url), event)
+        self.assertFalse(session.wait_for_events(timeout=0.01))
+
+    def test_wait_for_events_unmatched(self):
+        session = self._get_session()
+        url = '/api/class/fvTenant.json?subscription=yes'
+        session.subscription_thread._subscriptions[url] = '1234'
+        event = {'subscriptionId': ['5678'],
+                 'imdata': [{'fvTenant': {'attributes': {'dn': 'uni/tn-test', 'status': 'created'}}}]}
+        session.subscription_thread._event_q.put(json.dumps(event))
+        self.assertFalse(session.wait_for_events(timeout=0.01))
+        self.assertFalse(session.wait_for_events(timeout=0.01))
+        event['subscriptionId'] = ['1234']
+        session.subscription_thread._event_q.put(json.dumps(event))
+        self.assertTrue(session.wait_for_events(timeout=0.01))
+
+
+class FakeSubscriptionResponse(object):
+    """
+    Fake response to the subscription requests sent to the APIC
+    """
+    ok = True
+
+    def __init__(self, subscription_id):
+        self.text = json.dumps({'subscriptionId': subscription_id, 'imdata': []})
+
+
+class TestSubtreeFaults(unittest.TestCase):
+    """
+    Test subscribing to the faults of a subtree with a single subscription
+    """
+    def setUp(self):
+        self.sessions = []
+        self.session = self._get_session()
+        self.requests = []
+        self.tenant = Tenant('tenant')
+        for app_index in range(10):
+            app = AppProfile('app-%s' % app_index, self.tenant)
+            for epg_index in range(100):
+                EPG('epg-%s' % epg_index, app)
+
+    def tearDown(self):
+        for session in self.sessions:
+            session.subscription_thread._subscriptions = {}
+            session.subscription_thread.exit()
+
+    def _get_session(self):
+        session = Session('https://myapic.mydomain.com', 'admin', 'password')
+        session.get = self._get
+        self.sessions.append(session)
+        return session
+
+    def _get(self, url):
+        self.requests.append(url)
+        return FakeSubscriptionResponse(str(len(self.requests)))
+
+    def _send_fault(self, url, dn):
+        subscription_id = self.session.subscription_thread._subscriptions[url]
+        event = {'subscriptionId': [subscription_id],
+                 'imdata': [{'faultInst': {'attributes': {'dn': dn, 'code': 'F0467', 'status': 'created'}}}]}
+        self.session.subscription_thread._event_q.put(json.dumps(event))
+
+    def test_subscription_count(self):
+        """
+        Test that a single subscription is sent and refreshed for the subtree
+        """
+        self.tenant.subscribe_to_fault_instances_subtree(self.session, deep=True)
+        self.assertEqual(len(self.requests), 1011)
+        self.requests = []
+        self.session.subscription_thread.refresh_subscriptions()
+        self.assertEqual(len(self.requests), 1011)
+
+        self.session = self._get_session()
+        self.requests = []
+        self.tenant.subscribe_to_fault_instances_subtree(self.session, deep=True, single_subscription=True)
+        self.assertEqual(len(self.requests), 1)
+        self.assertIn('faultInst', self.requests[0])
+        self.assertIn('uni/tn-tenant/', self.requests[0])
+        self.requests = []
+        self.session.subscription_thread.refresh_subscriptions()
+        self.assertEqual(len(self.requests), 1)
+
+    def test_demultiplex_faults(self):
+        """
+        Test that the faults are handed to the objects that own them
+        """
+        self.tenant.subscribe_to_fault_instances_subtree(self.session, deep=True, single_subscription=True)
+        url = self.tenant._subtree_fault_index.url
+        self.assertFalse(self.tenant._instance_has_subtree_faults(self.session))
+        self._send_fault(url, 'uni/tn-tenant/ap-app-3/epg-epg-42/fault-F0467')
+        self._send_fault(url, 'uni/tn-tenant/ap-app-3/epg-epg-42/'
+                              'rspathAtt-[topology/pod-1/paths-101/pathep-[eth1/1]]/fault-F0467')
+        self._send_fault(url, 'uni/tn-tenant/ap-app-5/fault-F0123')
+        self._send_fault(url, 'uni/tn-tenant/fault-F0999')
+        self.assertTrue(self.tenant._instance_has_subtree_faults(self.session))
+        faults = dict((obj.name, len(obj_faults))
+                      for obj, obj_faults in self.tenant.get_subtree_faults_by_object(self.session))
+        self.assertEqual(faults, {'epg-42': 2, 'app-5': 1, 'tenant': 1})
+        self.assertFalse(self.tenant._instance_has_subtree_faults(self.session))
+
+        self._send_fault(url, 'uni/tn-tenant/ap-app-1/epg-epg-1/fault-F0467')
+        fault_objs = self.tenant._instance_get_subtree_faults(self.session, [])
+        self.assertEqual(len(fault_objs), 1)
+        self.assertEqual(fault_objs[0]['faultInst']['attributes']['code'], 'F0467')
+
+
+class TestHealthScoreIndex(unittest.TestCase):
+    """
+    Test the HealthScoreIndex against the fake APIC
+    """
+    def setUp(self):
+        self.session = FakeSession()
+        self.requests = []
+        get = self.session.get
+
+        def counting_get(url):
+            self.requests.append(url)
+            return get(url)
+        self.session.get = counting_get
+        epgs = []
+        for index in range(1000):
+            health = {'healthInst': {'attributes': {'rn': 'health', 'cur': str(index % 100),
+                                                    'prev': '100', 'chng': '0', 'updTs': 'never'}}}
+            epgs.append({'fvAEPg': {'attributes': {'rn': 'epg-%s' % index},
+                                    'children': [health]}})
+        tenant = {'fvTenant': {'attributes': {'dn': 'uni/tn-tenant'},
+                               'children': [{'fvAp': {'attributes': {'rn': 'ap-app'},
+                                                      'children': epgs}}]}}
+        self.session._fill_data([tenant], None)
+        self.dns = ['uni/tn-tenant/ap-app/epg-%s' % index for index in range(1000)]
+
+    def test_load(self):
+        """
+        Test loading the health scores and looking them up by DN
+        """
+        index = HealthScoreIndex()
+        self.assertEqual(index.load(self.session), 1000)
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(index.get(self.dns[42]).cur, '42')
+        self.assertEqual(index.get(u'uni/tn-tenant/ap-app/epg-43').cur, '43')
+        self.assertIsNone(index.get('uni/tn-tenant/ap-other'))
+
+    def test_load_pages(self):
+        """
+        Test loading the health scores sorted by DN in several pages
+        """
+        index = HealthScoreIndex(page_size=300)
+        self.assertEqual(index.load(self.session), 1000)
+        self.assertEqual(len(self.requests), 4)
+        for url in self.requests:
+            self.assertIn('order-by=healthInst.dn&', url)
+        self.assertEqual(index.get(self.dns[999]).cur, '99')
+
+    def test_failed_page(self):
+        """
+        Test that a failed page raises an error and keeps the scores loaded before
+        """
+        index = HealthScoreIndex(page_size=300)
+        index.load(self.session)
+        get = self.session.get
+
+        def get_with_error(url):
+            if 'page=2&' in url:
+                return FakeErrorResponse()
+            return get(url)
+        self.session.get = get_with_error
+        self.assertRaises(ValueError, index.load, self.session)
+        self.assertEqual(len(index), 1000)
+        self.assertEqual(index.get(self.dns[42]).cur, '42')
+
+    def test_queries(self):
+        """
+        Test the threshold and lowest health score queries
+        """
+        index = HealthScoreIndex()
+        index.load(self.session)
+        unhealthy = index.get_unhealthy(2)
+        self.assertEqual(len(unhealthy), 20)
+        self.assertEqual([score.cur for dn, score in unhealthy[:10]], ['0'] * 10)
+        lowest = index.get_lowest(3)
+        self.assertEqual([dn for dn, score in lowest], [self.dns[0], self.dns[100], self.dns[200]])
+
+    def test_events(self):
+        """
+        Test that the subscription events update the index
+        """
+        index = HealthScoreIndex()
+        index.load(self.session)
+        events = [{'imdata': [{'healthInst': {'attributes': {'dn': self.dns[5] + '/health', 'cur': '99',
+                                                             'status': 'modified'}}}]},
+                  {'imdata': [{'healthInst': {'attributes': {'dn': self.dns[6] + '/health',
+                                                             'status': 'deleted'}}}]}]
+        self.session.has_events = lambda url: len(events) > 0
+        self.session.get_event = lambda url: events.pop(0)
+        self.assertEqual(index.process_events(self.session), 2)
+        self.assertEqual(index.get(self.dns[5]).cur, '99')
+        self.assertEqual(index.get(self.dns[5]).prev, '100')
+        self.assertNotIn(self.dns[6], index)
+
+    def test_bulk_requests(self):
+        """
+        Test getting the health of every EPG one by one and in bulk
+        """
+        per_object = [HealthScore.get_by_dn(self.session, dn).cur for dn in self.dns]
+        self.assertEqual(len(self.requests), len(self.dns))
+
+        self.requests = []
+        index = HealthScoreIndex()
+        index.load(self.session)
+        bulk = [index.get(dn).cur for dn in self.dns]
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(per_object, bulk)
+
+
+class FakeClassQueryResponse(object):
+    """
+    Fake response to the class queries sent to the APIC
+    """
+    ok = True
+
+    def __init__(self, imdata, total_count):
+        self._data = {'imdata': imdata, 'totalCount': str(total_count)}
+
+    def json(self):
+        return self._data
+
+
+class FakeErrorResponse(object):
+    """
+    Fake response to a query that failed on the APIC
+    """
+    ok = False
+    text = '{"imdata": [{"error": {"attributes": {"code": "503", "text": "Service Unavailable"}}}]}'
+
+
+class TestGetAll(unittest.TestCase):
+    """
+    Test getting the objects of all of the tenants with a class query
+    """
+    def setUp(self):
+        self.session = Session('https://myapic.mydomain.com', 'admin', 'password')
+        self.requests = []
+        self.session.get = self._get
+        self.objects = []
+        for tenant_index in range(50):
+            tenant_dn = 'uni/tn-tenant%s' % tenant_index
+            for name, apic_class, rn in (('bd', 'fvBD', 'BD-bd'), ('ctx', 'fvCtx', 'ctx-ctx'),
+                                         ('contract', 'vzBrCP', 'brc-contract')):
+                self.objects.append({apic_class: {'attributes': {'dn': '%s/%s' % (tenant_dn, rn), 'name': name}}})
+            for app_index in range(4):
+                app_dn = '%s/ap-app%s' % (tenant_dn, app_index)
+                for epg_index in range(5):
+                    self.objects.append({'fvAEPg': {'attributes': {'dn': '%s/epg-epg%s' % (app_dn, epg_index),
+                                                                   'name': 'epg%s' % epg_index,
+                                                                   'descr': 'EPG %s' % epg_index}}})
+                self.objects.append({'fvAp': {'attributes': {'dn': app_dn, 'name': 'app%s' % app_index,
+                                                             'descr': 'App %s' % app_index}}})
+
+    def _get(self, url):
+        self.requests.append(url)
+        page = int(re.search(r'page=(\d+)', url).group(1))
+        page_size = int(re.search(r'page-size=(\d+)', url).group(1))
+        apic_classes = re.search(r'/api/node/class/([^.]*)\.json', url).group(1).split(',')
+        objects = [obj for obj in self.objects if list(obj.keys())[0] in apic_classes]
+        return FakeClassQueryResponse(objects[page * page_size:(page + 1) * page_size], len(objects))
+
+    def test_get_all(self):
+        """
+        Test getting several classes with a single query
+        """
+        objs = BaseACIObject.get_all(self.session, [EPG, BridgeDomain, Context, Contract])
+        self.assertEqual(len(self.requests), 1)
+        self.assertTrue(self.requests[0].startswith('/api/node/class/'))
+        self.assertEqual(len(objs), 50 * 4 * 5 + 50 * 3)
+        epgs = [obj for obj in objs if isinstance(obj, EPG)]
+        self.assertEqual(len(epgs), 1000)
+        self.assertEqual(epgs[0].name, 'epg0')
+        self.assertEqual(epgs[0].descr, 'EPG 0')
+        self.assertEqual(epgs[0].dn, 'uni/tn-tenant0/ap-app0/epg-epg0')
+        app = epgs[0].get_parent()
+        self.assertIsInstance(app, AppProfile)
+        self.assertEqual(app.name, 'app0')
+        self.assertIs(epgs[4].get_parent(), app)
+        self.assertIsNot(epgs[5].get_parent(), app)
+        self.assertEqual(len(app.get_children()), 5)
+        tenant = app.get_parent()
+        self.assertIsInstance(tenant, Tenant)
+        self.assertEqual(tenant.name, 'tenant0')
+        bds = [obj for obj in objs if isinstance(obj, BridgeDomain)]
+        self.assertIs(bds[0].get_parent(), tenant)
+        self.assertEqual(len(tenant.get_children(only_class=AppProfile)), 4)
+
+    def test_requested_parent(self):
+        """
+        Test that a requested parent class is populated from the APIC and
+        shared with its children
+        """
+        objs = BaseACIObject.get_all(self.session, [AppProfile, EPG])
+        apps = [obj for obj in objs if isinstance(obj, AppProfile)]
+        self.assertEqual(len(apps), 200)
+        self.assertEqual(apps[0].descr, 'App 0')
+        self.assertEqual(len(apps[0].get_children()), 5)
+        epgs = [obj for obj in objs if isinstance(obj, EPG)]
+        self.assertIs(epgs[0].get_parent(), apps[0])
+
+    def test_pagination(self):
+        """
+        Test that every page is requested
+        """
+        objs = BaseACIObject.get_all(self.session, EPG, page_size=300)
+        self.assertEqual(len(objs), 1000)
+        self.assertEqual(len(self.requests), 4)
+        self.assertEqual(len(set(obj.dn for obj in objs)), 1000)
+
+    def test_request_count(self):
+        """
+        Test the number of requests compared with getting the objects
+        of each tenant
+        """
+        tenants = [Tenant('tenant%s' % index) for index in range(50)]
+        self.session.get = lambda url: self.requests.append(url) or FakeClassQueryResponse([], 0)
+        for tenant in tenants:
+            for toolkit_class, apic_class in ((BridgeDomain, 'fvBD'), (Context, 'fvCtx'), (Contract, 'vzBrCP')):
+                BaseACIObject.get(self.session, toolkit_class, apic_class, tenant, tenant)
+        self.assertEqual(len(self.requests), 150)
+
+        self.session.get = self._get
+        self.requests = []
+        BaseACIObject.get_all(self.session, [BridgeDomain, Context, Contract])
+        self.assertEqual(len(self.requests), 1)
+
+    def test_order_by(self):
+        """
+        Test that the pages are requested sorted by DN
+        """
+        BaseACIObject.get_all(self.session, [EPG, BridgeDomain], page_size=300)
+        for url in self.requests:
+            order_by = re.search(r'order-by=([^&]*)', url).group(1)
+            self.assertEqual(sorted(order_by.split(',')), ['fvAEPg.dn', 'fvBD.dn'])
+
+    def test_failed_page(self):
+        """
+        Test that a failed page raises an error instead of returning part of the objects
+        """
+        def get(url):
+            if 'page=1&' in url:
+                self.requests.append(url)
+                return FakeErrorResponse()
+            return self._get(url)
+        self.session.get = get
+        self.assertRaises(ValueError, BaseACIObject.get_all, self.session, EPG, page_size=300)
+        self.assertEqual(len(self.requests), 2)
+
+
+class TestFaultStore(unittest.TestCase):
+    """
+    Test the indexed fault store.  These do not communicate with APIC
+    """
+    severities = ('critical', 'major', 'minor', 'warning')
+    domains = ('tenant', 'infra', 'access')
+
+    @staticmethod
+    def _get_event(dn, **attributes):
+        attributes['dn'] = dn
+        return {'imdata': [{'faultInst': {'attributes': attributes}}]}
+
+    def _get_raised_event(self, index, lifecycle='raised'):
+        dn = 'uni/tn-tenant%s/ap-app/epg-epg%s/fault-F%s' % (index % 10, index, index % 1000)
+        return self._get_event(dn, severity=self.severities[index % 4], domain=self.domains[index % 3],
+                               type='config', lc=lifecycle, code='F%s' % (index % 1000),
+                               descr='Fault %s' % index, status='created')
+
+    def test_add_and_query(self):
+        """
+        Test the queries by severity, domain, tenant and DN prefix
+        """
+        store = FaultStore()
+        for index in range(120):
+            store.add_event(self._get_raised_event(index))
+        self.assertEqual(len(store), 120)
+        self.assertEqual(len(store.get_faults()), 120)
+        self.assertEqual(len(store.get_faults(severity='critical')), 30)
+        self.assertEqual(len(store.get_faults(tenant='tenant0')), 12)
+        critical = store.get_faults(severity='critical', tenant='tenant0')
+        self.assertEqual(len(critical), 6)
+        for fault in critical:
+            self.assertEqual(fault.severity, 'critical')
+            self.assertTrue(fault.dn.startswith('uni/tn-tenant0/'))
+        self.assertEqual(len(store.get_faults(severity='critical', tenant='tenant1')), 0)
+        self.assertEqual(len(store.get_faults(dn_prefix='uni/tn-tenant4/ap-app/epg-epg4/')), 1)
+        self.assertEqual(len(store.get_faults(tenant='missing')), 0)
+        self.assertEqual(store.get_counts('domain'), {'tenant': 40, 'infra': 40, 'access': 40})
+
+    def test_lifecycle(self):
+        """
+        Test that modified events update the fault and its indexes and
+        that deleted events remove the fault
+        """
+        store = FaultStore()
+        event = self._get_raised_event(1, lifecycle='soaking')
+        dn = event['imdata'][0]['faultInst']['attributes']['dn']
+        store.add_event(event)
+        self.assertEqual(len(store.get_faults(lifecycle='soaking')), 1)
+        store.add_event(self._get_event(dn, lc='raised', status='modified'))
+        self.assertEqual(len(store.get_faults(lifecycle='soaking')), 0)
+        self.assertEqual(store.get(dn).lc, 'raised')
+        self.assertEqual(store.get(dn).severity, 'major')
+        store.add_event(self._get_event(dn, lc='retaining', severity='cleared', status='modified'))
+        self.assertEqual(len(store.get_faults(severity='major')), 0)
+        self.assertEqual(len(store.get_faults(lifecycle='retaining', severity='cleared')), 1)
+        store.add_event(self._get_event(dn, status='deleted'))
+        self.assertNotIn(dn, store)
+        self.assertEqual(len(store.get_faults(tenant='tenant1')), 0)
+        self.assertEqual(store.get_counts('lc'), {})
+
+    def test_dn_prefixes(self):
+        """
+        Test that slashes within the brackets of a DN do not split it
+        """
+        prefixes = FaultStore._get_dn_prefixes('topology/pod-1/node-101/sys/phys-[eth1/1]/fault-F1394')
+        self.assertEqual(prefixes, ['topology', 'topology/pod-1', 'topology/pod-1/node-101',
+                                    'topology/pod-1/node-101/sys',
+                                    'topology/pod-1/node-101/sys/phys-[eth1/1]'])
+
+    def test_process_events(self):
+        """
+        Test that the pending subscription events are applied to the store
+        """
+        store = FaultStore()
+        events = [self._get_raised_event(index) for index in range(5)]
+        session = FakeSession()
+        session.has_events = lambda url: len(events) > 0
+        session.get_event = lambda url: events.pop(0)
+        self.assertEqual(store.process_events(session), 5)
+        self.assertEqual(len(store), 5)
+
+    def test_replay(self):
+        """
+        Test replaying the lifecycle events of many faults and that the
+        indexed queries return the same faults as a scan of the store
+        """
+        num_faults = 2000
+        raised_events = [self._get_raised_event(index, lifecycle='soaking') for index in range(num_faults)]
+        dns = [event['imdata'][0]['faultInst']['attributes']['dn'] for event in raised_events]
+        store = FaultStore()
+        for event in raised_events:
+            store.add_event(event)
+        for dn in dns:
+            store.add_event(self._get_event(dn, lc='raised', status='modified'))
+        self.assertEqual(store.get_counts('lc'), {'raised': num_faults})
+        for dn in dns:
+            store.add_event(self._get_event(dn, lc='retaining', severity='cleared', status='modified'))
+        self.assertEqual(store.get_counts('severity'), {'cleared': num_faults})
+        for dn in dns:
+            store.add_event(self._get_event(dn, status='deleted'))
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.get_counts('severity'), {})
+        for index in range(num_faults):
+            store.add_event(self._get_raised_event(index))
+        self.assertEqual(len(store), num_faults)
+
+        critical = store.get_faults(severity='critical', tenant='tenant2')
+        expected = [dn for index, dn in enumerate(dns) if index % 10 == 2 and index % 4 == 0]
+        self.assertEqual(sorted(fault.dn for fault in critical), sorted(expected))
+        for query in ({'severity': 'major', 'domain': 'infra'},
+                      {'tenant': 'tenant3', 'lifecycle': 'raised'},
+                      {'dn_prefix': 'uni/tn-tenant5/ap-app/', 'severity': 'warning'}):
+            prefix = query.get('dn_prefix', 'uni/tn-%s/' % query['tenant'] if 'tenant' in query else '')
+            scanned = [fault.dn for fault in store.get_faults()
+                       if fault.severity == query.get('severity', fault.severity) and
+                       fault.domain == query.get('domain', fault.domain) and
+                       fault.lc == query.get('lifecycle', fault.lc) and fault.dn.startswith(prefix)]
+            indexed = [fault.dn for fault in store.get_faults(**query)]
+            self.assertTrue(indexed)
+            self.assertEqual(sorted(indexed), sorted(scanned))
+
 
 class TestAppProfile(unittest.TestCase):
     """
@@ -2521,6 +3140,86 @@ class TestJson(unittest.TestCase):
 
         self.assertTrue(output == expected_json,
                         'Did not see expected JSON returned')
+        self.assertEqual(tenant.write_json(sort_keys=True), expected_json)
+
+    @staticmethod
+    def _get_large_tenant(num_epgs):
+        """
+        Build a tenant with an application profile, bridge domain
+        and contracts for every 100 EPGs
+        """
+        tenant = Tenant('cisco')
+        context = Context('ctx', tenant)
+        for app_index in range(num_epgs // 100):
+            app = AppProfile('app-%s' % app_index, tenant)
+            bd = BridgeDomain('bd-%s' % app_index, tenant)
+            bd.add_context(context)
+            contract = Contract('contract-%s' % app_index, tenant)
+            for epg_index in range(100):
+                epg = EPG('epg-%s' % epg_index, app)
+                epg.add_bd(bd)
+                epg.provide(contract)
+        return tenant
+
+    def test_write_json(self):
+        """
+        Test that the streamed JSON is the same as the JSON dictionary
+        """
+        tenant = self._get_large_tenant(200)
+        Subnet('subnet', tenant.get_children(BridgeDomain)[0]).set_addr('10.1.1.1/24')
+        expected_json = json.dumps(tenant.get_json(), sort_keys=True)
+        self.assertEqual(tenant.write_json(sort_keys=True), expected_json)
+        self.assertEqual(json.loads(tenant.write_json()), json.loads(expected_json))
+
+    def test_write_json_large(self):
+        """
+        Test the streamed JSON of a tenant with 10k EPGs
+        """
+        tenant = self._get_large_tenant(10000)
+        self.assertEqual(tenant.write_json(sort_keys=True), json.dumps(tenant.get_json(), sort_keys=True))
+
+    def test_write_json_children_inspected(self):
+        """
+        Test that a get_json inspecting and extending its children JSON
+        streams the same JSON as the JSON dictionary
+        """
+        class InspectingObject(BaseACIObject):
+            def get_json(self):
+                resp = super(InspectingObject, self).get_json('mockInspecting', attributes={'name': self.name})
+                children = resp['mockInspecting']['children']
+                resp['mockInspecting']['attributes']['numChildren'] = str(len(children))
+                if children:
+                    first = children[0]['mockInspecting']['attributes']['name']
+                    children.append({'mockLast': {'attributes': {'first': first}}})
+                return resp
+
+        root = InspectingObject('root')
+        for index in range(3):
+            child = InspectingObject('child-%s' % index, root)
+            for child_index in range(2):
+                InspectingObject('grandchild-%s' % child_index, child)
+        expected_json = json.dumps(root.get_json(), sort_keys=True)
+        self.assertIn('"numChildren": "3"', expected_json)
+        self.assertEqual(root.write_json(sort_keys=True), expected_json)
+        self.assertFalse(_is_json_streamed(root))
+
+    @unittest.skipIf(sys.version_info < (3, 4), 'tracemalloc is not available')
+    def test_write_json_memory(self):
+        """
+        Test that streaming the JSON uses less memory than building the
+        JSON dictionary
+        """
+        import tracemalloc
+        tenant = self._get_large_tenant(10000)
+        tracemalloc.start()
+        json.dumps(tenant.get_json(), sort_keys=True)
+        dumps_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        tracemalloc.start()
+        tenant.write_json(sort_keys=True)
+        write_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.assertLess(write_memory * 2, dumps_memory)
 
 
 class TestEPGDomain(unittest.TestCase):
@@ -5516,6 +6215,10 @@ if __name__ == '__main__':
     offline.addTest(unittest.makeSuite(TestBaseACIObject))
     offline.addTest(unittest.makeSuite(TestTenant))
     offline.addTest(unittest.makeSuite(TestSession))
+    offline.addTest(unittest.makeSuite(TestSubtreeFaults))
+    offline.addTest(unittest.makeSuite(TestHealthScoreIndex))
+    offline.addTest(unittest.makeSuite(TestFaultStore))
+    offline.addTest(unittest.makeSuite(TestGetAll))
     offline.addTest(unittest.makeSuite(TestAppProfile))
     offline.addTest(unittest.makeSuite(TestBridgeDomain))
     offline.addTest(unittest.makeSuite(TestL2Interface))